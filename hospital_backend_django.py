@@ -2,18 +2,80 @@
 # hospital_appointment/
 # ├── manage.py
 # ├── requirements.txt
+# ├── pytest.ini
 # ├── hospital_appointment/
 # │   ├── __init__.py
 # │   ├── settings.py
 # │   ├── urls.py
-# │   └── wsgi.py
+# │   ├── wsgi.py
+# │   └── asgi.py
+# ├── benchmarks/
+# │   ├── __init__.py
+# │   ├── data.py
+# │   ├── scenarios.py
+# │   ├── rendering.py
+# │   └── runner.py
 # └── appointments/
 #     ├── __init__.py
 #     ├── models.py
+#     ├── slot_calendar.py
+#     ├── events.py
 #     ├── serializers.py
+#     ├── directory_cache.py
+#     ├── availability.py
+#     ├── pagination.py
+#     ├── renderers.py
+#     ├── fieldsets.py
+#     ├── stats.py
+#     ├── waitlist.py
+#     ├── transitions.py
+#     ├── bulk.py
+#     ├── search.py
+#     ├── exports.py
+#     ├── metrics.py
+#     ├── jobs.py
+#     ├── notifications.py
+#     ├── archive.py
+#     ├── authentication.py
+#     ├── routing.py
+#     ├── importer.py
 #     ├── views.py
+#     ├── async_views.py
 #     ├── urls.py
-#     └── admin.py
+#     ├── admin.py
+#     ├── apps.py
+#     ├── signals.py
+#     ├── tests/
+#     │   ├── __init__.py
+#     │   ├── helpers.py
+#     │   ├── test_archive.py
+#     │   ├── test_authentication.py
+#     │   ├── test_benchmarks.py
+#     │   ├── test_booking.py
+#     │   ├── test_directory_cache.py
+#     │   ├── test_events.py
+#     │   ├── test_exports.py
+#     │   ├── test_fieldsets.py
+#     │   ├── test_importer.py
+#     │   ├── test_jobs.py
+#     │   ├── test_metrics.py
+#     │   ├── test_queries.py
+#     │   ├── test_routing.py
+#     │   ├── test_transitions.py
+#     │   └── test_waitlist.py
+#     └── management/commands/
+#         ├── archive_appointments.py
+#         ├── benchmark_connections.py
+#         ├── benchmark_queries.py
+#         ├── export_data.py
+#         ├── import_hospital_data.py
+#         ├── generate_slot_calendar.py
+#         ├── load_test_booking.py
+#         ├── load_test_reads.py
+#         ├── rebuild_dashboard_counters.py
+#         ├── rebuild_patient_search.py
+#         ├── run_benchmarks.py
+#         └── run_workers.py
 
 # ==================== requirements.txt ====================
 """
@@ -24,11 +86,16 @@ psycopg2-binary==2.9.9
 python-decouple==3.8
 djangorestframework-simplejwt==5.3.0
 Pillow==10.1.0
+uvicorn==0.24.0
+orjson==3.9.10
+pytest==7.4.3
+pytest-django==4.7.0
 """
 
 # ==================== hospital_appointment/settings.py ====================
 from pathlib import Path
 from datetime import timedelta
+from decouple import Csv, config
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -52,6 +119,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'appointments.metrics.RequestMetricsMiddleware',
+    'appointments.routing.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -81,19 +150,64 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'hospital_appointment.wsgi.application'
+ASGI_APPLICATION = 'hospital_appointment.asgi.application'
+
+
+def _max_age(value):
+    # Seconds to keep a connection open; 0 closes it after every request, "none" never does
+    return None if str(value).lower() == 'none' else int(value)
+
 
-# Database - PostgreSQL
+# Database - PostgreSQL; every value can be overridden from the environment or a .env file.
+# Set DB_ENGINE=django.db.backends.sqlite3 for local runs without Postgres.
+DB_ENGINE = config('DB_ENGINE', default='django.db.backends.postgresql')
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'hospital_db',
-        'USER': 'postgres',
-        'PASSWORD': 'your_password',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'ENGINE': DB_ENGINE,
+        'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3') if 'sqlite3' in DB_ENGINE else 'hospital_db'),
+        'USER': config('DB_USER', default='postgres'),
+        'PASSWORD': config('DB_PASSWORD', default='your_password'),
+        'HOST': config('DB_HOST', default='localhost'),
+        'PORT': config('DB_PORT', default='5432'),
+        # Reuse each worker's connection across requests instead of reconnecting per request,
+        # and check it is still alive before the first query of a request
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default='60', cast=_max_age),
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+        # Required behind PgBouncer in transaction mode; iterator() then reads in client-side chunks
+        'DISABLE_SERVER_SIDE_CURSORS': config('DB_DISABLE_SERVER_SIDE_CURSORS', default=False, cast=bool),
+        'OPTIONS': {},
     }
 }
 
+# Trigram lookups for the patient search endpoint
+if 'postgresql' in DB_ENGINE:
+    INSTALLED_APPS.append('django.contrib.postgres')
+
+# Django 4.2 has no built-in connection pool: to pool, put PgBouncer in front of
+# Postgres and point DB_HOST/DB_PORT at it.
+
+# Read replicas (appointments/routing.py): comma-separated host[:port] entries for
+# PostgreSQL, or database file paths for SQLite. Each becomes a replica_N alias with
+# the primary's credentials. Listing, detail, dashboard and available-doctor reads
+# use a replica; writes, and any read after a write in the same request, stay on the
+# primary. Cached doctor directory entries built from a lagging replica stay until
+# the next invalidation or DOCTOR_DIRECTORY_CACHE_TIMEOUT. No replicas: all on primary.
+DATABASE_REPLICAS = []
+for _index, _replica in enumerate(config('DB_REPLICAS', default='', cast=Csv()), 1):
+    _alias = f'replica_{_index}'
+    DATABASES[_alias] = {
+        **DATABASES['default'],
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'TEST': {'MIRROR': 'default'},  # tests read the test primary through this alias
+    }
+    if 'sqlite3' in DB_ENGINE:
+        DATABASES[_alias]['NAME'] = _replica
+    else:
+        _host, _, _port = _replica.partition(':')
+        DATABASES[_alias].update(HOST=_host, PORT=_port or DATABASES['default']['PORT'])
+    DATABASE_REPLICAS.append(_alias)
+DATABASE_ROUTERS = ['appointments.routing.ReplicaRouter']
+
 # For MySQL, use:
 # DATABASES = {
 #     'default': {
@@ -127,7 +241,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'appointments.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -135,7 +249,92 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    # orjson when installed, DRF's JSONRenderer otherwise
+    'DEFAULT_RENDERER_CLASSES': [
+        'appointments.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Token -> user resolutions kept in each process (appointments/authentication.py).
+# Logout and token rotation evict them locally; other workers drop them after the TTL.
+AUTH_TOKEN_CACHE_SIZE = 10000
+AUTH_TOKEN_CACHE_TTL = 60  # seconds; 0 turns the cache off
+
+# Stateless JWT mode: Bearer access tokens are verified from their signature and
+# claims alone, with no database query. Tokens come from /api/token/ and /api/login/.
+JWT_AUTHENTICATION = config('JWT_AUTHENTICATION', default=False, cast=bool)
+if JWT_AUTHENTICATION:
+    REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES'].insert(
+        0, 'rest_framework_simplejwt.authentication.JWTStatelessUserAuthentication'
+    )
+    SIMPLE_JWT = {
+        'ACCESS_TOKEN_LIFETIME': timedelta(minutes=15),
+        'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
+    }
+
+# Background jobs (appointments/jobs.py), run by `python manage.py run_workers`.
+# Failed jobs retry after JOB_RETRY_BASE_DELAY seconds, doubling up to the max.
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BASE_DELAY = 10
+JOB_RETRY_MAX_DELAY = 3600
+JOB_CLAIM_TIMEOUT = 300  # seconds before a silent worker's jobs are handed out again
+
+# Booking/confirmation/cancellation notices. LocalTransport only records them
+# (as JSON lines in the outbox file); point this at a real email/SMS transport
+# with the same send_many(messages) method in production.
+NOTIFICATION_TRANSPORT = 'appointments.notifications.LocalTransport'
+NOTIFICATION_OUTBOX = BASE_DIR / 'outbox.jsonl'
+NOTIFICATION_BATCH_SIZE = 500
+
+# Sessions are read through the cache, so session-authenticated requests skip the session table
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Cache - local memory by default; point this at Redis or Memcached when running
+# several processes so doctor directory invalidations reach every worker
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'hospital-appointment',
+    }
 }
+DOCTOR_DIRECTORY_CACHE_TIMEOUT = 300  # seconds
+
+# Book against the pre-generated slot calendar (ScheduledSlot rows) instead of
+# TimeSlot. Run `python manage.py generate_slot_calendar` daily to keep it filled.
+SLOT_CALENDAR_ENABLED = False
+SLOT_CALENDAR_DAYS_AHEAD = 60
+
+# Server-Sent Events for slot changes (/api/async/doctors/<id>/slot_events/, ASGI only).
+# LocalBroker only reaches clients of the process that made the change; with several
+# processes, point EVENTS_BROKER at a broker that fans out between them.
+EVENTS_BROKER = 'appointments.events.LocalBroker'
+EVENTS_QUEUE_SIZE = 100  # events buffered per client before it is sent a fresh snapshot instead
+EVENTS_HEARTBEAT = 15  # seconds between keepalive comments
+EVENTS_STREAM_TIMEOUT = 300  # seconds before a stream ends and the client reconnects
+
+# Cancelling an appointment books the freed slot for the next patient on the
+# waitlist for that doctor and day (appointments/waitlist.py)
+WAITLIST_BACKFILL = True
+
+# Serve dashboard-stats from maintained counters instead of counting rows.
+# Run `python manage.py rebuild_dashboard_counters` after turning this on.
+DASHBOARD_COUNTER_CACHE = False
+
+# Request metrics (appointments/metrics.py): per-view timings served at /api/metrics/,
+# a Server-Timing header on every response, and a warning for any request that
+# runs more queries than the threshold (None disables the warning).
+# Server-Timing exposes query counts and timings to clients, so it is off outside DEBUG.
+METRICS_SERVER_TIMING = config('METRICS_SERVER_TIMING', default=DEBUG, cast=bool)
+METRICS_QUERY_COUNT_THRESHOLD = 50
+# /api/metrics/ answers only these client addresses (REMOTE_ADDR, so list the proxy
+# when behind one) or a scraper sending "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_ALLOWED_IPS = config('METRICS_ALLOWED_IPS', default='127.0.0.1,::1', cast=Csv())
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# List endpoints whose fields all map to columns build rows from values() instead
+# of running a serializer per object (appointments/fieldsets.py)
+FAST_LIST_RESPONSES = True
 
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True  # Change in production
@@ -145,6 +344,7 @@ CORS_ALLOW_CREDENTIALS = True
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import RegexValidator
+from django.utils import timezone
 
 class Doctor(models.Model):
     SPECIALTIES = [
@@ -180,10 +380,27 @@ class Doctor(models.Model):
         return f"Dr. {self.name} - {self.get_specialty_display()}"
 
 
+def normalize_email(email):
+    return (email or '').strip().lower()
+
+
+def digits_only(phone):
+    return ''.join(char for char in phone or '' if char.isdigit())
+
+
+class PatientQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create skips save(), so fill the search columns here
+        objs = list(objs)
+        for patient in objs:
+            patient.set_search_fields()
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class Patient(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True)
     full_name = models.CharField(max_length=200)
-    email = models.EmailField()
+    email = models.EmailField(db_index=True)
     phone_regex = RegexValidator(
         regex=r'^\+?1?\d{9,15}$',
         message="Phone number must be entered in the format: '+999999999'. Up to 15 digits allowed."
@@ -193,14 +410,39 @@ class Patient(models.Model):
     address = models.TextField(blank=True)
     blood_group = models.CharField(max_length=5, blank=True)
     medical_history = models.TextField(blank=True)
+    # Derived from email and phone on save, for case-insensitive and partial lookups
+    email_normalized = models.CharField(max_length=254, blank=True, editable=False)
+    phone_digits = models.CharField(max_length=17, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = PatientQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Matches PatientCursorPagination's keyset ordering
+            models.Index(fields=['-created_at', '-id'], name='patient_created_id_idx'),
+            # Equality and prefix (LIKE 'x%') lookups; the opclass only applies on PostgreSQL.
+            # Substring and fuzzy name matches use the trigram indexes from search.py.
+            models.Index(fields=['email_normalized'], name='patient_email_norm_idx',
+                         opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['phone_digits'], name='patient_phone_digits_idx',
+                         opclasses=['varchar_pattern_ops']),
+        ]
     
     def __str__(self):
         return self.full_name
+    
+    def set_search_fields(self):
+        self.email_normalized = normalize_email(self.email)
+        self.phone_digits = digits_only(self.phone)
+    
+    def save(self, *args, **kwargs):
+        self.set_search_fields()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'email_normalized', 'phone_digits'}
+        super().save(*args, **kwargs)
 
 
 class TimeSlot(models.Model):
@@ -227,6 +469,36 @@ class TimeSlot(models.Model):
         return f"{self.doctor.name} - {self.time}"
 
 
+# Statuses that hold a doctor's time slot
+ACTIVE_STATUSES = ['pending', 'confirmed']
+
+
+class AppointmentQuerySet(models.QuerySet):
+    def with_related(self):
+        """Join only the patient and doctor columns that AppointmentSerializer reads."""
+        fields = [field.name for field in self.model._meta.concrete_fields]
+        return self.select_related('patient', 'doctor').only(
+            *fields,
+            'patient__full_name', 'patient__email', 'patient__phone',
+            'doctor__name', 'doctor__specialty',
+        )
+    
+    def matching(self, patient_id=None, doctor_id=None, status=None, start=None, end=None):
+        """Apply the listing filters; empty values are ignored."""
+        queryset = self
+        if patient_id:
+            queryset = queryset.filter(patient_id=patient_id)
+        if doctor_id:
+            queryset = queryset.filter(doctor_id=doctor_id)
+        if status:
+            queryset = queryset.filter(status=status)
+        if start:
+            queryset = queryset.filter(appointment_date__gte=start)
+        if end:
+            queryset = queryset.filter(appointment_date__lte=end)
+        return queryset
+
+
 class Appointment(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -246,358 +518,7140 @@ class Appointment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = AppointmentQuerySet.as_manager()
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Stored values, so the dashboard counters can tell what a save changed
+        instance._stored_state = (
+            instance.__dict__.get('status'),
+            instance.__dict__.get('doctor_id'),
+            instance.__dict__.get('appointment_date'),
+        )
+        instance._stored_slot = (
+            instance.__dict__.get('doctor_id'),
+            instance.__dict__.get('appointment_date'),
+            instance.__dict__.get('appointment_time'),
+        )
+        return instance
+    
     class Meta:
         ordering = ['-appointment_date', '-appointment_time']
-        unique_together = ['doctor', 'appointment_date', 'appointment_time']
+        constraints = [
+            # Only bookings that hold the slot are unique, so a cancelled slot can be rebooked.
+            # Also serves the slot lookups in availability.py.
+            models.UniqueConstraint(
+                fields=['doctor', 'appointment_date', 'appointment_time'],
+                condition=models.Q(status__in=ACTIVE_STATUSES),
+                name='unique_active_booking'
+            ),
+        ]
+        indexes = [
+            # Matches AppointmentCursorPagination's keyset ordering
+            models.Index(
+                fields=['-appointment_date', '-appointment_time', '-id'],
+                name='appt_date_time_id_idx'
+            ),
+            # Patient history and status-filtered listings, in list order
+            models.Index(
+                fields=['patient', '-appointment_date', '-appointment_time'],
+                name='appt_patient_date_idx'
+            ),
+            models.Index(
+                fields=['status', '-appointment_date', '-appointment_time'],
+                name='appt_status_date_idx'
+            ),
+            models.Index(
+                fields=['doctor', '-appointment_date', '-appointment_time'],
+                name='appt_doctor_date_idx'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.patient.full_name} - Dr. {self.doctor.name} - {self.appointment_date}"
 
 
-# ==================== appointments/serializers.py ====================
-from rest_framework import serializers
-from .models import Doctor, Patient, Appointment, TimeSlot
-from django.contrib.auth.models import User
+class ArchivedAppointment(models.Model):
+    """A finished appointment moved out of the hot table by `manage.py archive_appointments`.
 
-class DoctorSerializer(serializers.ModelSerializer):
+    Keeps the original appointment id and timestamps; see appointments/archive.py.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='archived_appointments')
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='archived_appointments')
+    appointment_date = models.DateField()
+    appointment_time = models.CharField(max_length=5)
+    reason = models.TextField()
+    status = models.CharField(max_length=20, choices=Appointment.STATUS_CHOICES)
+    notes = models.TextField(blank=True)
+    prescription = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = AppointmentQuerySet.as_manager()
+    
     class Meta:
-        model = Doctor
-        fields = '__all__'
-        read_only_fields = ['created_at', 'updated_at']
-
+        ordering = ['-appointment_date', '-appointment_time']
+        indexes = [
+            models.Index(
+                fields=['patient', '-appointment_date', '-appointment_time'],
+                name='archive_patient_date_idx'
+            ),
+            models.Index(
+                fields=['doctor', '-appointment_date', '-appointment_time'],
+                name='archive_doctor_date_idx'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.patient.full_name} - Dr. {self.doctor.name} - {self.appointment_date} (archived)"
 
-class PatientSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Patient
-        fields = '__all__'
-        read_only_fields = ['created_at', 'updated_at']
 
+class WaitlistEntry(models.Model):
+    """A patient waiting for a slot with a doctor on a day, optionally within a time window.
 
-class TimeSlotSerializer(serializers.ModelSerializer):
+    When an appointment that fits is cancelled, appointments/waitlist.py books the
+    freed slot for the first waiting entry by priority, then by age.
+    """
+    STATUS_CHOICES = [
+        ('waiting', 'Waiting'),
+        ('offered', 'Offered'),
+        ('withdrawn', 'Withdrawn'),
+    ]
+    time_regex = RegexValidator(regex=r'^([01]\d|2[0-3]):[0-5]\d$', message="Times must be in the format 'HH:MM'.")
+    
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='waitlist_entries')
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='waitlist_entries')
+    date = models.DateField()
+    # Inclusive bounds on appointment_time; blank means any time that day
+    window_start = models.CharField(max_length=5, blank=True, validators=[time_regex])
+    window_end = models.CharField(max_length=5, blank=True, validators=[time_regex])
+    priority = models.SmallIntegerField(default=0)  # higher is offered first
+    reason = models.TextField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='waiting')
+    appointment = models.ForeignKey(
+        Appointment, on_delete=models.SET_NULL, null=True, blank=True, related_name='waitlist_entries'
+    )
+    offered_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
     class Meta:
-        model = TimeSlot
-        fields = '__all__'
+        ordering = ['date', '-priority', 'id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['patient', 'doctor', 'date'],
+                condition=models.Q(status='waiting'),
+                name='unique_waiting_entry'
+            ),
+        ]
+        indexes = [
+            # One queue per doctor and day, already in offer order
+            models.Index(
+                fields=['doctor', 'date', 'status', '-priority', 'id'],
+                name='waitlist_queue_idx'
+            ),
+            models.Index(fields=['patient', 'date'], name='waitlist_patient_date_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.patient.full_name} - Dr. {self.doctor.name} - {self.date} ({self.status})"
 
 
-class AppointmentSerializer(serializers.ModelSerializer):
-    patient_name = serializers.CharField(source='patient.full_name', read_only=True)
-    patient_email = serializers.CharField(source='patient.email', read_only=True)
-    patient_phone = serializers.CharField(source='patient.phone', read_only=True)
-    doctor_name = serializers.CharField(source='doctor.name', read_only=True)
-    doctor_specialty = serializers.CharField(source='doctor.get_specialty_display', read_only=True)
+class DoctorSchedule(models.Model):
+    WEEKDAYS = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+    
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='schedules')
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAYS)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    slot_minutes = models.PositiveSmallIntegerField(default=60)
     
     class Meta:
-        model = Appointment
-        fields = '__all__'
-        read_only_fields = ['created_at', 'updated_at']
-
-
-class AppointmentCreateSerializer(serializers.Serializer):
-    patient_name = serializers.CharField(max_length=200)
-    email = serializers.EmailField()
-    phone = serializers.CharField(max_length=17)
-    doctor_id = serializers.IntegerField()
-    appointment_date = serializers.DateField()
-    appointment_time = serializers.CharField(max_length=5)
-    reason = serializers.CharField()
+        ordering = ['weekday', 'start_time']
     
-    def create(self, validated_data):
-        # Get or create patient
-        patient, created = Patient.objects.get_or_create(
-            email=validated_data['email'],
-            defaults={
-                'full_name': validated_data['patient_name'],
-                'phone': validated_data['phone']
-            }
-        )
-        
-        # Get doctor
-        doctor = Doctor.objects.get(id=validated_data['doctor_id'])
-        
-        # Create appointment
-        appointment = Appointment.objects.create(
-            patient=patient,
-            doctor=doctor,
-            appointment_date=validated_data['appointment_date'],
-            appointment_time=validated_data['appointment_time'],
-            reason=validated_data['reason'],
-            status='pending'
-        )
-        
-        return appointment
+    def __str__(self):
+        return f"{self.doctor.name} - {self.get_weekday_display()} {self.start_time}-{self.end_time}"
 
 
-class UserRegistrationSerializer(serializers.ModelSerializer):
-    password = serializers.CharField(write_only=True)
+class DoctorLeave(models.Model):
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='leaves')
+    start_date = models.DateField()
+    end_date = models.DateField()
+    reason = models.CharField(max_length=200, blank=True)
     
     class Meta:
-        model = User
-        fields = ['username', 'email', 'password', 'first_name', 'last_name']
+        ordering = ['-start_date']
     
-    def create(self, validated_data):
-        user = User.objects.create_user(
-            username=validated_data['username'],
-            email=validated_data.get('email', ''),
-            password=validated_data['password'],
-            first_name=validated_data.get('first_name', ''),
-            last_name=validated_data.get('last_name', '')
-        )
-        return user
-
+    def __str__(self):
+        return f"{self.doctor.name} - {self.start_date} to {self.end_date}"
 
-# ==================== appointments/views.py ====================
-from rest_framework import viewsets, status, permissions
-from rest_framework.decorators import action, api_view, permission_classes
-from rest_framework.response import Response
-from rest_framework.authtoken.models import Token
-from django.contrib.auth import authenticate
-from django.contrib.auth.models import User
-from .models import Doctor, Patient, Appointment, TimeSlot
-from .serializers import (
-    DoctorSerializer, PatientSerializer, AppointmentSerializer,
-    AppointmentCreateSerializer, TimeSlotSerializer, UserRegistrationSerializer
-)
 
-class DoctorViewSet(viewsets.ModelViewSet):
-    queryset = Doctor.objects.all()
-    serializer_class = DoctorSerializer
-    permission_classes = [permissions.AllowAny]  # Change in production
+class ScheduledSlot(models.Model):
+    """One bookable slot on the pre-generated calendar, claimed atomically on booking."""
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='scheduled_slots')
+    date = models.DateField()
+    time = models.CharField(max_length=5)
+    is_booked = models.BooleanField(default=False)
     
-    @action(detail=False, methods=['get'])
-    def available(self, request):
-        doctors = Doctor.objects.filter(is_available=True)
-        serializer = self.get_serializer(doctors, many=True)
-        return Response(serializer.data)
+    class Meta:
+        ordering = ['date', 'time']
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'date', 'time'], name='unique_scheduled_slot'),
+        ]
     
-    @action(detail=True, methods=['get'])
-    def available_slots(self, request, pk=None):
-        doctor = self.get_object()
-        date = request.query_params.get('date')
-        
-        if not date:
-            return Response(
-                {'error': 'Date parameter is required'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Get booked appointments for this doctor on this date
-        booked_appointments = Appointment.objects.filter(
-            doctor=doctor,
-            appointment_date=date,
-            status__in=['pending', 'confirmed']
-        ).values_list('appointment_time', flat=True)
-        
-        # Get all time slots for this doctor
-        all_slots = TimeSlot.objects.filter(doctor=doctor, is_available=True)
-        
-        available_slots = []
-        for slot in all_slots:
-            if slot.time not in booked_appointments:
-                available_slots.append({
-                    'time': slot.time,
-                    'display': slot.get_time_display()
-                })
-        
-        return Response(available_slots)
+    def __str__(self):
+        return f"{self.doctor.name} - {self.date} {self.time}"
 
 
-class PatientViewSet(viewsets.ModelViewSet):
-    queryset = Patient.objects.all()
-    serializer_class = PatientSerializer
-    permission_classes = [permissions.AllowAny]  # Change in production
+class DashboardCounter(models.Model):
+    key = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
     
-    @action(detail=False, methods=['get'])
-    def by_email(self, request):
-        email = request.query_params.get('email')
-        if not email:
-            return Response(
-                {'error': 'Email parameter is required'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        try:
-            patient = Patient.objects.get(email=email)
-            serializer = self.get_serializer(patient)
-            return Response(serializer.data)
-        except Patient.DoesNotExist:
-            return Response(
-                {'error': 'Patient not found'},
-                status=status.HTTP_404_NOT_FOUND
-            )
+    def __str__(self):
+        return f"{self.key} = {self.value}"
 
 
-class AppointmentViewSet(viewsets.ModelViewSet):
-    queryset = Appointment.objects.all()
-    serializer_class = AppointmentSerializer
-    permission_classes = [permissions.AllowAny]  # Change in production
-    
-    def get_queryset(self):
-        queryset = Appointment.objects.all()
-        patient_id = self.request.query_params.get('patient_id')
-        doctor_id = self.request.query_params.get('doctor_id')
-        status_param = self.request.query_params.get('status')
-        
-        if patient_id:
-            queryset = queryset.filter(patient_id=patient_id)
-        if doctor_id:
-            queryset = queryset.filter(doctor_id=doctor_id)
-        if status_param:
-            queryset = queryset.filter(status=status_param)
-        
-        return queryset
-    
-    def create(self, request):
-        serializer = AppointmentCreateSerializer(data=request.data)
-        if serializer.is_valid():
-            appointment = serializer.save()
-            response_serializer = AppointmentSerializer(appointment)
-            return Response(
-                response_serializer.data,
-                status=status.HTTP_201_CREATED
-            )
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+class Job(models.Model):
+    """A queued background task, run by `manage.py run_workers` (appointments/jobs.py)."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
     
-    @action(detail=True, methods=['post'])
-    def confirm(self, request, pk=None):
-        appointment = self.get_object()
-        appointment.status = 'confirmed'
-        appointment.save()
-        serializer = self.get_serializer(appointment)
-        return Response(serializer.data)
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=64, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
     
-    @action(detail=True, methods=['post'])
-    def cancel(self, request, pk=None):
-        appointment = self.get_object()
-        appointment.status = 'cancelled'
-        appointment.save()
-        serializer = self.get_serializer(appointment)
-        return Response(serializer.data)
+    class Meta:
+        ordering = ['run_after', 'id']
+        indexes = [
+            # Workers poll for due jobs with status + run_after
+            models.Index(fields=['status', 'run_after'], name='job_due_idx'),
+        ]
     
-    @action(detail=True, methods=['post'])
-    def complete(self, request, pk=None):
-        appointment = self.get_object()
-        appointment.status = 'completed'
-        appointment.notes = request.data.get('notes', '')
-        appointment.prescription = request.data.get('prescription', '')
-        appointment.save()
-        serializer = self.get_serializer(appointment)
-        return Response(serializer.data)
+    def __str__(self):
+        return f"{self.kind} #{self.id} ({self.status})"
 
 
-@api_view(['POST'])
-@permission_classes([permissions.AllowAny])
-def register_user(request):
-    serializer = UserRegistrationSerializer(data=request.data)
-    if serializer.is_valid():
-        user = serializer.save()
-        token, created = Token.objects.get_or_create(user=user)
-        return Response({
-            'token': token.key,
-            'user_id': user.id,
-            'username': user.username,
-            'email': user.email
-        }, status=status.HTTP_201_CREATED)
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+# ==================== appointments/jobs.py ====================
+import logging
+import time
+from contextlib import nullcontext
+from datetime import timedelta
+from uuid import uuid4
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from .models import Job
 
+logger = logging.getLogger(__name__)
 
-@api_view(['POST'])
-@permission_classes([permissions.AllowAny])
-def login_user(request):
-    username = request.data.get('username')
-    password = request.data.get('password')
-    
-    user = authenticate(username=username, password=password)
-    
-    if user:
-        token, created = Token.objects.get_or_create(user=user)
-        return Response({
-            'token': token.key,
-            'user_id': user.id,
-            'username': user.username,
-            'email': user.email
-        })
-    
-    return Response(
-        {'error': 'Invalid credentials'},
-        status=status.HTTP_401_UNAUTHORIZED
+# kind -> handler(jobs); each handler receives a whole claimed batch at once
+HANDLERS = {}
+APPOINTMENT_EVENT = 'appointment_event'
+
+
+class PartialFailure(Exception):
+    """Raised by a handler that completed only part of its batch.
+
+    Only the jobs in ``failed`` (ids) are retried; the rest are marked done, so
+    work that already happened, such as delivered messages, is not repeated.
+    """
+
+    def __init__(self, failed, error):
+        super().__init__(f'{len(failed)} job(s) failed: {error!r}')
+        self.failed = set(failed)
+        self.error = error
+
+
+def job_handler(kind):
+    def register(handler):
+        HANDLERS[kind] = handler
+        return handler
+    return register
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue(kind, payload, delay=0):
+    """Queue one job. It commits or rolls back with the caller's transaction."""
+    return Job.objects.create(
+        kind=kind,
+        payload=payload,
+        max_attempts=_setting('JOB_MAX_ATTEMPTS', 5),
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def enqueue_appointment_event(event, appointment_ids):
+    """One job per request, however many appointments or side effects it covers."""
+    appointment_ids = [pk for pk in appointment_ids if pk is not None]
+    if appointment_ids:
+        enqueue(APPOINTMENT_EVENT, {'event': event, 'appointment_ids': appointment_ids})
+
+
+def backoff(attempts):
+    """Seconds before retry number ``attempts``: doubling from JOB_RETRY_BASE_DELAY, capped."""
+    base = _setting('JOB_RETRY_BASE_DELAY', 10)
+    return min(base * 2 ** (attempts - 1), _setting('JOB_RETRY_MAX_DELAY', 3600))
+
+
+def _due(now):
+    # Running jobs whose worker went quiet for longer than the claim timeout are due again
+    stale = now - timedelta(seconds=_setting('JOB_CLAIM_TIMEOUT', 300))
+    return Q(status='pending', run_after__lte=now) | Q(status='running', claimed_at__lt=stale)
+
+
+def claim(worker_id, limit):
+    """Atomically take up to ``limit`` due jobs for this worker and return them."""
+    now = timezone.now()
+    token = f'{worker_id}:{uuid4().hex[:8]}'
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    # With SKIP LOCKED, concurrent workers pick disjoint rows. Without it (SQLite) the
+    # read stays outside a transaction, so it never has to upgrade to the write lock.
+    with transaction.atomic() if skip_locked else nullcontext():
+        candidates = Job.objects.filter(_due(now)).order_by('run_after', 'id')
+        if skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        ids = list(candidates.values_list('id', flat=True)[:limit])
+        if not ids:
+            return []
+        # Conditional on still being due, so two workers can never both win a job
+        Job.objects.filter(_due(now), id__in=ids).update(
+            status='running', claimed_by=token, claimed_at=now, attempts=F('attempts') + 1
+        )
+    return list(Job.objects.filter(claimed_by=token, status='running').order_by('id'))
+
+
+def _finish(jobs):
+    if not jobs:
+        return
+    Job.objects.filter(id__in=[job.id for job in jobs]).update(
+        status='done', finished_at=timezone.now(), last_error=''
+    )
+
+
+def _retry(jobs, error):
+    now = timezone.now()
+    by_attempts = {}
+    for job in jobs:
+        by_attempts.setdefault(job.attempts, []).append(job)
+    for attempts, group in by_attempts.items():
+        failed = [job.id for job in group if job.attempts >= job.max_attempts]
+        retried = [job.id for job in group if job.attempts < job.max_attempts]
+        if failed:
+            Job.objects.filter(id__in=failed).update(status='failed', finished_at=now, last_error=error)
+        if retried:
+            Job.objects.filter(id__in=retried).update(
+                status='pending', run_after=now + timedelta(seconds=backoff(attempts)), last_error=error
+            )
+
+
+def process(jobs):
+    """Run claimed jobs, one handler call per kind.
+
+    A handler that raises retries its whole group, unless it raises PartialFailure
+    naming the jobs that failed.
+    """
+    by_kind = {}
+    for job in jobs:
+        by_kind.setdefault(job.kind, []).append(job)
+    for kind, group in by_kind.items():
+        try:
+            handler = HANDLERS.get(kind)
+            if handler is None:
+                raise LookupError(f'No handler registered for {kind!r} jobs')
+            handler(group)
+        except PartialFailure as exc:
+            failed = [job for job in group if job.id in exc.failed]
+            logger.warning('%d of %d %s job(s) failed: %r', len(failed), len(group), kind, exc.error)
+            _retry(failed, repr(exc.error))
+            _finish([job for job in group if job.id not in exc.failed])
+        except Exception as exc:
+            logger.warning('%d %s job(s) failed: %r', len(group), kind, exc)
+            _retry(group, repr(exc))
+        else:
+            _finish(group)
+
+
+def work(worker_id, batch_size=100, poll_interval=1.0, stop=None, once=False):
+    """Claim and process batches until ``stop`` is set, or until the queue is empty with ``once``."""
+    processed = 0
+    while stop is None or not stop.is_set():
+        try:
+            jobs = claim(worker_id, batch_size)
+        except DatabaseError as exc:
+            # Lock timeouts or a dropped connection; back off and poll again
+            logger.warning('Worker %s could not claim jobs: %r', worker_id, exc)
+            close_old_connections()
+            jobs = None
+        if jobs:
+            process(jobs)
+            processed += len(jobs)
+        elif once and jobs is not None:
+            break
+        elif stop is not None:
+            stop.wait(poll_interval)
+        else:
+            time.sleep(poll_interval)
+    return processed
+
+
+def prune(days):
+    """Delete finished jobs older than ``days``; failed ones are kept for inspection."""
+    cutoff = timezone.now() - timedelta(days=days)
+    return Job.objects.filter(status='done', finished_at__lt=cutoff).delete()[0]
+
+
+def queue_stats():
+    stats = {code: 0 for code, _ in Job.STATUS_CHOICES}
+    for job_status, count in Job.objects.order_by().values_list('status').annotate(count=Count('id')):
+        stats[job_status] = count
+    return stats
+
+
+# ==================== appointments/archive.py ====================
+import time
+from django.db import connection, connections, transaction
+from .models import Appointment, ArchivedAppointment
+
+ARCHIVABLE_STATUSES = ('completed', 'cancelled')
+CHUNK_SIZE = 1000
+# Columns copied as-is; the archive keeps each appointment's original id
+ARCHIVED_FIELDS = [field.attname for field in Appointment._meta.concrete_fields]
+
+
+def archivable(before, statuses=ARCHIVABLE_STATUSES):
+    return Appointment.objects.filter(appointment_date__lt=before, status__in=statuses)
+
+
+def archive_before(before, chunk_size=CHUNK_SIZE, statuses=ARCHIVABLE_STATUSES, pause=0.0, progress=None):
+    """Move finished appointments dated before ``before`` into the archive table.
+
+    Each chunk is copied and deleted in its own short transaction, so no lock is
+    held for longer than one chunk and a crash loses nothing. Deletes go through
+    the ORM, so the post_delete signals keep the dashboard counters in step.
+    Returns the number of rows moved.
+    """
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    if connection.vendor == 'postgresql':
+        first = archivable(before, statuses).order_by('appointment_date').values_list(
+            'appointment_date', flat=True
+        ).first()
+        if first is not None:
+            ensure_archive_partitions(first.year, before.year)
+
+    moved = 0
+    while True:
+        with transaction.atomic():
+            rows = archivable(before, statuses).order_by('id')
+            if skip_locked:
+                # Rows a request is busy with are left for the next run
+                rows = rows.select_for_update(skip_locked=True)
+            rows = list(rows[:chunk_size])
+            if not rows:
+                break
+            ArchivedAppointment.objects.bulk_create([
+                ArchivedAppointment(**{name: getattr(row, name) for name in ARCHIVED_FIELDS})
+                for row in rows
+            ], ignore_conflicts=True)
+            Appointment.objects.filter(id__in=[row.id for row in rows]).delete()
+        moved += len(rows)
+        if progress:
+            progress(moved)
+        if pause:
+            time.sleep(pause)
+    return moved
+
+
+def _table():
+    return ArchivedAppointment._meta.db_table
+
+
+def _relkind(conn):
+    # 'r' for a plain table, 'p' for a partitioned one, None before it is migrated
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)', [_table()])
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def partition_archive_table(using='default', **kwargs):
+    """post_migrate hook: on PostgreSQL, rebuild the empty archive table as
+    ``PARTITION BY RANGE (appointment_date)`` with a DEFAULT partition.
+
+    Partitioned tables need the partition key in the primary key, so it becomes
+    (id, appointment_date); indexes and foreign keys keep the names Django gave them.
+    """
+    conn = connections[using]
+    if conn.vendor != 'postgresql' or _relkind(conn) != 'r':
+        return
+    table = _table()
+    quote = conn.ops.quote_name
+    quoted = quote(table)
+    with transaction.atomic(using=using), conn.cursor() as cursor:
+        cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {quoted})')
+        if cursor.fetchone()[0]:
+            return
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+            [table, f'{table}_pkey'],
+        )
+        indexes = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [table],
+        )
+        foreign_keys = cursor.fetchall()
+
+        cursor.execute(f'ALTER TABLE {quoted} RENAME TO {quote(table + "_old")}')
+        cursor.execute(
+            f'CREATE TABLE {quoted} (LIKE {quote(table + "_old")} INCLUDING DEFAULTS) '
+            f'PARTITION BY RANGE (appointment_date)'
+        )
+        cursor.execute(f'DROP TABLE {quote(table + "_old")}')
+        cursor.execute(
+            f'ALTER TABLE {quoted} ADD CONSTRAINT {quote(table + "_pkey")} '
+            f'PRIMARY KEY (id, appointment_date)'
+        )
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {quoted} ADD CONSTRAINT {quote(name)} {definition}')
+        for definition in indexes:
+            cursor.execute(definition)
+        cursor.execute(
+            f'CREATE TABLE {quote(table + "_default")} PARTITION OF {quoted} DEFAULT'
+        )
+
+
+def ensure_archive_partitions(first_year, last_year, using='default'):
+    """Create one partition per year in the range, if the archive is partitioned.
+
+    The DEFAULT partition must not hold rows for a new year's range, so those
+    are moved into the new partition first.
+    """
+    conn = connections[using]
+    if conn.vendor != 'postgresql' or _relkind(conn) != 'p':
+        return
+    table = _table()
+    quote = conn.ops.quote_name
+    quoted = quote(table)
+    default = quote(table + '_default')
+    with transaction.atomic(using=using), conn.cursor() as cursor:
+        for year in range(first_year, last_year + 1):
+            partition = f'{table}_y{year}'
+            cursor.execute('SELECT to_regclass(%s)', [partition])
+            if cursor.fetchone()[0] is not None:
+                continue
+            start, end = f'{year}-01-01', f'{year + 1}-01-01'
+            cursor.execute(f'ALTER TABLE {quoted} DETACH PARTITION {default}')
+            cursor.execute(
+                f'CREATE TABLE {quote(partition)} PARTITION OF {quoted} '
+                f'FOR VALUES FROM (%s) TO (%s)', [start, end]
+            )
+            cursor.execute(
+                f'INSERT INTO {quoted} SELECT * FROM {default} '
+                f'WHERE appointment_date >= %s AND appointment_date < %s', [start, end]
+            )
+            cursor.execute(
+                f'DELETE FROM {default} WHERE appointment_date >= %s AND appointment_date < %s', [start, end]
+            )
+            cursor.execute(f'ALTER TABLE {quoted} ATTACH PARTITION {default} DEFAULT')
+
+
+# ==================== appointments/notifications.py ====================
+import json
+import threading
+from collections import deque
+from django.conf import settings
+from django.utils.module_loading import import_string
+from .jobs import APPOINTMENT_EVENT, PartialFailure, job_handler
+from .models import Appointment
+
+EVENT_WORDING = {
+    'booked': ('Appointment request received', 'has been booked and is awaiting confirmation'),
+    'confirmed': ('Appointment confirmed', 'is confirmed'),
+    'cancelled': ('Appointment cancelled', 'has been cancelled'),
+    'waitlist_offer': (
+        'A slot opened up for you',
+        'has been booked for you from the waitlist; please confirm or cancel it',
+    ),
+}
+
+
+class LocalTransport:
+    """Stand-in for an email/SMS provider: records each message instead of sending it.
+
+    Messages are appended as JSON lines to NOTIFICATION_OUTBOX (when set) and kept
+    in ``sent``, newest last. A real transport should use each message's ``key``
+    to skip messages it already delivered before a retry.
+    """
+    
+    def __init__(self, path=None, keep=1000):
+        self.path = path
+        self.sent = deque(maxlen=keep)
+        self._lock = threading.Lock()
+    
+    def send_many(self, messages):
+        with self._lock:
+            self.sent.extend(messages)
+            if self.path:
+                with open(self.path, 'a', encoding='utf-8') as outbox:
+                    outbox.writelines(json.dumps(message) + '\n' for message in messages)
+
+
+_transport = None
+
+
+def get_transport():
+    global _transport
+    if _transport is None:
+        transport_class = import_string(
+            getattr(settings, 'NOTIFICATION_TRANSPORT', 'appointments.notifications.LocalTransport')
+        )
+        _transport = transport_class(getattr(settings, 'NOTIFICATION_OUTBOX', None))
+    return _transport
+
+
+def build_messages(appointment, event):
+    subject, phrase = EVENT_WORDING[event]
+    when = f'{appointment.appointment_date:%d %b %Y} at {appointment.appointment_time}'
+    text = f'Your appointment with Dr. {appointment.doctor.name} on {when} {phrase}.'
+    return [
+        {
+            'channel': 'email',
+            'to': appointment.patient.email,
+            'subject': subject,
+            'body': f'Dear {appointment.patient.full_name},\n\n{text}\n',
+            'appointment_id': appointment.id,
+            'event': event,
+        },
+        {
+            'channel': 'sms',
+            'to': appointment.patient.phone,
+            'body': text,
+            'appointment_id': appointment.id,
+            'event': event,
+        },
+    ]
+
+
+def _batches(jobs, appointments, batch_size):
+    """Yield ``(jobs, messages)`` send batches that never split a job, unless it alone is too big.
+
+    Each message carries a ``key`` that stays the same when its job is retried, so
+    a transport can drop a message it has already delivered.
+    """
+    batch_jobs, batch = [], []
+    for job in jobs:
+        messages = [
+            dict(message, key=f"{job.id}:{message['appointment_id']}:{message['channel']}")
+            for pk in job.payload['appointment_ids'] if pk in appointments
+            for message in build_messages(appointments[pk], job.payload['event'])
+        ]
+        if batch and len(batch) + len(messages) > batch_size:
+            yield batch_jobs, batch
+            batch_jobs, batch = [], []
+        batch_jobs.append(job)
+        batch.extend(messages)
+    if batch_jobs:
+        yield batch_jobs, batch
+
+
+@job_handler(APPOINTMENT_EVENT)
+def send_appointment_notifications(jobs):
+    """Load every appointment in the batch with one query and send the messages in batches.
+
+    A failed send only fails the jobs whose messages were in it; the others are done.
+    """
+    ids = {pk for job in jobs for pk in job.payload['appointment_ids']}
+    appointments = Appointment.objects.select_related('patient', 'doctor').in_bulk(ids)
+    batch_size = getattr(settings, 'NOTIFICATION_BATCH_SIZE', 500)
+    transport = get_transport()
+    failed, error = set(), None
+    for batch_jobs, messages in _batches(jobs, appointments, batch_size):
+        try:
+            for start in range(0, len(messages), batch_size):
+                transport.send_many(messages[start:start + batch_size])
+        except Exception as exc:
+            failed.update(job.id for job in batch_jobs)
+            error = exc
+    if failed:
+        raise PartialFailure(failed, error)
+
+
+# ==================== appointments/slot_calendar.py ====================
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from functools import reduce
+from operator import or_
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from .models import (
+    ACTIVE_STATUSES, Appointment, Doctor, DoctorLeave, DoctorSchedule, ScheduledSlot, TimeSlot
+)
+
+
+def calendar_enabled():
+    return getattr(settings, 'SLOT_CALENDAR_ENABLED', False)
+
+
+def schedule_times(start_time, end_time, slot_minutes):
+    """'HH:MM' start times of every slot that fits between start_time and end_time."""
+    current = datetime.combine(date.min, start_time)
+    end = datetime.combine(date.min, end_time)
+    step = timedelta(minutes=slot_minutes)
+    times = []
+    while current + step <= end:
+        times.append(current.strftime('%H:%M'))
+        current += step
+    return times
+
+
+def _slot_filter(slots):
+    return reduce(or_, (Q(doctor_id=doctor_id, date=day, time=time) for doctor_id, day, time in slots))
+
+
+def generate_calendar(start, end, doctor_ids=None, rebuild=False, chunk_size=100):
+    """Create ScheduledSlot rows for every doctor and day in the range.
+
+    A doctor's weekly DoctorSchedule rows define their slots; doctors without any
+    fall back to their TimeSlots every day. Days on leave get no slots, and slots
+    held by pending/confirmed appointments are created already booked. Existing
+    rows are kept unless ``rebuild`` is set, which regenerates the range.
+    Returns the number of rows created.
+    """
+    if doctor_ids is None:
+        doctor_ids = list(Doctor.objects.order_by('id').values_list('id', flat=True))
+    created = 0
+    for offset in range(0, len(doctor_ids), chunk_size):
+        chunk = doctor_ids[offset:offset + chunk_size]
+
+        fallback = defaultdict(list)
+        for doctor_id, time in TimeSlot.objects.filter(
+            doctor_id__in=chunk, is_available=True
+        ).order_by('time').values_list('doctor_id', 'time'):
+            fallback[doctor_id].append(time)
+
+        weekly = defaultdict(lambda: defaultdict(list))
+        for schedule in DoctorSchedule.objects.filter(doctor_id__in=chunk):
+            weekly[schedule.doctor_id][schedule.weekday].extend(
+                schedule_times(schedule.start_time, schedule.end_time, schedule.slot_minutes)
+            )
+
+        leave = defaultdict(list)
+        for doctor_id, leave_start, leave_end in DoctorLeave.objects.filter(
+            doctor_id__in=chunk, start_date__lte=end, end_date__gte=start
+        ).values_list('doctor_id', 'start_date', 'end_date'):
+            leave[doctor_id].append((leave_start, leave_end))
+
+        booked = set(Appointment.objects.filter(
+            doctor_id__in=chunk, appointment_date__range=(start, end), status__in=ACTIVE_STATUSES
+        ).order_by().values_list('doctor_id', 'appointment_date', 'appointment_time'))
+
+        rows = []
+        for doctor_id in chunk:
+            day = start
+            while day <= end:
+                if not any(first <= day <= last for first, last in leave[doctor_id]):
+                    if doctor_id in weekly:
+                        times = sorted(set(weekly[doctor_id][day.weekday()]))
+                    else:
+                        times = fallback[doctor_id]
+                    rows.extend(
+                        ScheduledSlot(
+                            doctor_id=doctor_id, date=day, time=time,
+                            is_booked=(doctor_id, day, time) in booked
+                        )
+                        for time in times
+                    )
+                day += timedelta(days=1)
+
+        with transaction.atomic():
+            if rebuild:
+                ScheduledSlot.objects.filter(doctor_id__in=chunk, date__range=(start, end)).delete()
+            ScheduledSlot.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+        created += len(rows)
+    return created
+
+
+def free_slots(doctor_ids, start, end):
+    """Return ``{doctor_id: {date: [times]}}`` of unbooked calendar slots in one indexed read."""
+    free = {doctor_id: defaultdict(list) for doctor_id in doctor_ids}
+    for doctor_id, day, time in ScheduledSlot.objects.filter(
+        doctor_id__in=doctor_ids, date__range=(start, end), is_booked=False
+    ).order_by('date', 'time').values_list('doctor_id', 'date', 'time'):
+        free[doctor_id][day].append(time)
+    return free
+
+
+def find_slot(doctor_id, day, time):
+    return ScheduledSlot.objects.select_related('doctor').filter(
+        doctor_id=doctor_id, date=day, time=time
+    ).first()
+
+
+def claim_slot(doctor_id, day, time):
+    """Mark a free slot booked with a single conditional UPDATE; False if it was taken."""
+    return ScheduledSlot.objects.filter(
+        doctor_id=doctor_id, date=day, time=time, is_booked=False
+    ).update(is_booked=True) == 1
+
+
+def lock_slots(doctor_ids, dates):
+    """Lock and return ``{(doctor_id, date, time): (pk, is_booked)}`` for the given doctors and days."""
+    return {
+        (doctor_id, day, time): (pk, is_booked)
+        for pk, doctor_id, day, time, is_booked in ScheduledSlot.objects.select_for_update().filter(
+            doctor_id__in=doctor_ids, date__in=dates
+        ).order_by('id').values_list('id', 'doctor_id', 'date', 'time', 'is_booked')
+    }
+
+
+def mark_slots(slots, is_booked):
+    """Set ``is_booked`` on the given (doctor_id, date, time) slots in one UPDATE."""
+    slots = [slot for slot in slots if None not in slot]
+    if slots:
+        ScheduledSlot.objects.filter(_slot_filter(slots)).update(is_booked=is_booked)
+
+
+# ==================== appointments/events.py ====================
+import asyncio
+import itertools
+import json
+import threading
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+SLOT_TAKEN = 'slot_taken'
+SLOT_FREED = 'slot_freed'
+RECONNECT_MS = 3000  # how long EventSource waits before reconnecting a dropped stream
+# Queued in place of a slow subscriber's backlog; the stream answers it with a fresh snapshot
+RESYNC = object()
+
+_event_ids = itertools.count(1)
+
+
+def slot_topic(doctor_id, day):
+    return f'slots:{doctor_id}:{day}'
+
+
+class Subscription:
+    """One client's bounded event queue, fed from any thread and read on its event loop.
+
+    A client that lets the queue fill up loses its backlog: the queue is emptied
+    and a single RESYNC is queued instead, so memory per client stays bounded and
+    publishers never wait on a slow reader.
+    """
+    
+    def __init__(self, topics, maxsize):
+        self.topics = topics
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+    
+    def _put(self, event):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            self.overflowed = True
+    
+    def deliver(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The client's loop has shut down; the stream's finally block unsubscribes it
+            pass
+    
+    async def get(self, timeout):
+        event = await asyncio.wait_for(self.queue.get(), timeout)
+        if event is RESYNC:
+            self.overflowed = False
+        return event
+
+
+class LocalBroker:
+    """In-process pub/sub: events reach the subscribers connected to this process.
+
+    With several server processes, set EVENTS_BROKER to a subclass whose publish()
+    sends through a shared channel (e.g. Redis PUBLISH) and whose listener calls
+    LocalBroker.publish() in every process.
+    """
+    
+    def __init__(self):
+        self._topics = {}
+        self._lock = threading.Lock()
+    
+    def subscribe(self, topics, maxsize):
+        subscription = Subscription(topics, maxsize)
+        with self._lock:
+            for topic in topics:
+                self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+    
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._topics.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._topics[topic]
+    
+    def publish(self, topic, event):
+        with self._lock:
+            subscribers = list(self._topics.get(topic, ()))
+        for subscription in subscribers:
+            subscription.deliver(event)
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'topics': len(self._topics),
+                'subscriptions': len({sub for subs in self._topics.values() for sub in subs}),
+            }
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(getattr(settings, 'EVENTS_BROKER', 'appointments.events.LocalBroker'))()
+    return _broker
+
+
+def _publish(event_type, slots):
+    broker = get_broker()
+    for doctor_id, day, time in slots:
+        broker.publish(slot_topic(doctor_id, day), {
+            'id': next(_event_ids),
+            'type': event_type,
+            'doctor_id': doctor_id,
+            'date': str(day),
+            'time': time,
+        })
+
+
+def publish_slots(event_type, slots):
+    """Announce ``(doctor_id, date, time)`` slots as taken or freed once the transaction commits."""
+    slots = list(slots)
+    if slots:
+        transaction.on_commit(lambda: _publish(event_type, slots))
+
+
+def format_sse(event, data, event_id=None):
+    lines = [f'event: {event}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+# ==================== appointments/serializers.py ====================
+from rest_framework import serializers
+from .models import (
+    ACTIVE_STATUSES, Doctor, Patient, Appointment, ArchivedAppointment, TimeSlot, WaitlistEntry,
+    normalize_email,
+)
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .slot_calendar import calendar_enabled, claim_slot, find_slot
+from .jobs import enqueue_appointment_event
+from .events import SLOT_TAKEN, publish_slots
+
+class SparseFieldsMixin:
+    """Keep only the fields named in the ``fields`` context entry (``?fields=``), if any."""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = self.context.get('fields')
+        if requested:
+            for name in set(self.fields) - set(requested):
+                self.fields.pop(name)
+
+
+class DoctorSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Doctor
+        fields = '__all__'
+        read_only_fields = ['created_at', 'updated_at']
+
+
+class DoctorListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Doctor
+        fields = ['id', 'name', 'specialty', 'consultation_fee', 'is_available']
+
+
+class PatientSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Patient
+        exclude = ['email_normalized', 'phone_digits']
+        read_only_fields = ['created_at', 'updated_at']
+
+
+class PatientListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Patient
+        fields = ['id', 'full_name', 'email', 'phone', 'date_of_birth', 'blood_group']
+
+
+class TimeSlotSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TimeSlot
+        fields = '__all__'
+
+
+class AppointmentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    patient_name = serializers.CharField(source='patient.full_name', read_only=True)
+    patient_email = serializers.CharField(source='patient.email', read_only=True)
+    patient_phone = serializers.CharField(source='patient.phone', read_only=True)
+    doctor_name = serializers.CharField(source='doctor.name', read_only=True)
+    doctor_specialty = serializers.CharField(source='doctor.get_specialty_display', read_only=True)
+    
+    class Meta:
+        model = Appointment
+        fields = '__all__'
+        # Status only moves through the confirm/cancel/complete actions (transitions.py)
+        read_only_fields = ['status', 'created_at', 'updated_at']
+
+
+class AppointmentListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Leaves out reason, notes and prescription; fetch those per appointment or via ?fields=."""
+    patient_name = serializers.CharField(source='patient.full_name', read_only=True)
+    doctor_name = serializers.CharField(source='doctor.name', read_only=True)
+    doctor_specialty = serializers.CharField(source='doctor.get_specialty_display', read_only=True)
+    
+    class Meta:
+        model = Appointment
+        fields = [
+            'id', 'patient', 'patient_name', 'doctor', 'doctor_name', 'doctor_specialty',
+            'appointment_date', 'appointment_time', 'status',
+        ]
+
+
+class ArchivedAppointmentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    patient_name = serializers.CharField(source='patient.full_name', read_only=True)
+    patient_email = serializers.CharField(source='patient.email', read_only=True)
+    patient_phone = serializers.CharField(source='patient.phone', read_only=True)
+    doctor_name = serializers.CharField(source='doctor.name', read_only=True)
+    doctor_specialty = serializers.CharField(source='doctor.get_specialty_display', read_only=True)
+    
+    class Meta:
+        model = ArchivedAppointment
+        fields = '__all__'
+
+
+class ArchivedAppointmentListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    patient_name = serializers.CharField(source='patient.full_name', read_only=True)
+    doctor_name = serializers.CharField(source='doctor.name', read_only=True)
+    doctor_specialty = serializers.CharField(source='doctor.get_specialty_display', read_only=True)
+    
+    class Meta:
+        model = ArchivedAppointment
+        fields = [
+            'id', 'patient', 'patient_name', 'doctor', 'doctor_name', 'doctor_specialty',
+            'appointment_date', 'appointment_time', 'status',
+        ]
+
+
+class WaitlistEntrySerializer(serializers.ModelSerializer):
+    patient_name = serializers.CharField(source='patient.full_name', read_only=True)
+    doctor_name = serializers.CharField(source='doctor.name', read_only=True)
+    
+    class Meta:
+        model = WaitlistEntry
+        fields = '__all__'
+        read_only_fields = ['status', 'appointment', 'offered_at', 'created_at']
+    
+    def validate(self, data):
+        if data['date'] < timezone.localdate():
+            raise serializers.ValidationError({'date': 'Cannot join the waitlist for a past date'})
+        start, end = data.get('window_start'), data.get('window_end')
+        if start and end and end < start:
+            raise serializers.ValidationError({'window_end': 'Window end must not be before window start'})
+        return data
+
+
+MAX_BATCH_SIZE = 500
+
+
+class SlotUnavailable(Exception):
+    """The requested slot was booked by someone else."""
+    
+    def __init__(self, doctor_id, date):
+        super().__init__('This time slot is no longer available')
+        self.doctor_id = doctor_id
+        self.date = date
+
+
+class AppointmentCreateSerializer(serializers.Serializer):
+    patient_name = serializers.CharField(max_length=200)
+    email = serializers.EmailField()
+    phone = serializers.CharField(max_length=17)
+    doctor_id = serializers.IntegerField()
+    appointment_date = serializers.DateField()
+    appointment_time = serializers.CharField(max_length=5)
+    reason = serializers.CharField()
+    
+    def validate(self, data):
+        if calendar_enabled():
+            slot = find_slot(data['doctor_id'], data['appointment_date'], data['appointment_time'])
+        else:
+            slot = TimeSlot.objects.select_related('doctor').filter(
+                doctor_id=data['doctor_id'],
+                time=data['appointment_time'],
+                is_available=True
+            ).first()
+        if slot is None:
+            if not Doctor.objects.filter(id=data['doctor_id']).exists():
+                raise serializers.ValidationError({'doctor_id': 'Doctor not found'})
+            raise serializers.ValidationError(
+                {'appointment_time': 'The doctor does not take appointments at this time'}
+            )
+        data['doctor'] = slot.doctor
+        return data
+    
+    def create(self, validated_data):
+        doctor_id = validated_data['doctor_id']
+        appointment_date = validated_data['appointment_date']
+        appointment_time = validated_data['appointment_time']
+        
+        with transaction.atomic():
+            if calendar_enabled():
+                # Claiming the calendar slot is the lock; it is released again if
+                # anything below rolls the transaction back
+                if not claim_slot(doctor_id, appointment_date, appointment_time):
+                    raise SlotUnavailable(doctor_id, appointment_date)
+            else:
+                # Lock the doctor's slot row so concurrent bookings for this time queue up
+                # instead of racing; the unique_active_booking constraint is the backstop
+                # on databases without row locks.
+                TimeSlot.objects.select_for_update().filter(
+                    doctor_id=doctor_id, time=appointment_time
+                ).first()
+            if Appointment.objects.filter(
+                doctor_id=doctor_id,
+                appointment_date=appointment_date,
+                appointment_time=appointment_time,
+                status__in=ACTIVE_STATUSES
+            ).exists():
+                raise SlotUnavailable(doctor_id, appointment_date)
+            
+            # Email is not unique, so pick the oldest match rather than get_or_create;
+            # matching on email_normalized ignores case and stray whitespace
+            patient = Patient.objects.filter(
+                email_normalized=normalize_email(validated_data['email'])
+            ).order_by('id').first()
+            if patient is None:
+                patient = Patient.objects.create(
+                    email=validated_data['email'],
+                    full_name=validated_data['patient_name'],
+                    phone=validated_data['phone']
+                )
+            
+            appointment = Appointment(
+                patient=patient,
+                doctor=validated_data['doctor'],
+                appointment_date=appointment_date,
+                appointment_time=appointment_time,
+                reason=validated_data['reason'],
+                status='pending'
+            )
+            appointment._slot_claimed = True
+            try:
+                with transaction.atomic():
+                    appointment.save(force_insert=True)
+            except IntegrityError:
+                raise SlotUnavailable(doctor_id, appointment_date)
+            enqueue_appointment_event('booked', [appointment.pk])
+            publish_slots(SLOT_TAKEN, [(doctor_id, appointment_date, appointment_time)])
+        
+        return appointment
+
+
+class AppointmentBatchItemSerializer(AppointmentCreateSerializer):
+    """Field validation only; book_appointments checks doctors and slots for the whole batch."""
+    
+    def validate(self, data):
+        return data
+
+
+class BulkStatusSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=MAX_BATCH_SIZE
+    )
+
+
+class UserRegistrationSerializer(serializers.ModelSerializer):
+    password = serializers.CharField(write_only=True)
+    
+    class Meta:
+        model = User
+        fields = ['username', 'email', 'password', 'first_name', 'last_name']
+    
+    def create(self, validated_data):
+        user = User.objects.create_user(
+            username=validated_data['username'],
+            email=validated_data.get('email', ''),
+            password=validated_data['password'],
+            first_name=validated_data.get('first_name', ''),
+            last_name=validated_data.get('last_name', '')
+        )
+        return user
+
+
+# ==================== appointments/directory_cache.py ====================
+import hashlib
+import threading
+from collections import Counter
+from math import ceil
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponseNotModified, JsonResponse
+from django.utils.cache import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from .models import TimeSlot
+
+# Every cached doctor directory entry embeds this version in its key, so bumping
+# it on any Doctor/TimeSlot change invalidates all of them at once
+VERSION_KEY = 'doctor-directory:version'
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _record(event, count=1):
+    with _stats_lock:
+        _stats[event] += count
+
+
+def cache_stats():
+    with _stats_lock:
+        return {event: _stats[event] for event in ('hits', 'misses', 'not_modified')}
+
+
+def _timeout():
+    return getattr(settings, 'DOCTOR_DIRECTORY_CACHE_TIMEOUT', 300)
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def invalidate_directory():
+    """Drop every cached directory entry. Bulk writes that skip signals must call this."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, timeout=None)
+
+
+def _key(version, name):
+    return f'doctor-directory:v{version}:{name}'
+
+
+def cached(name, build, version=None):
+    """Read-through lookup of a directory entry, calling ``build()`` on a miss."""
+    key = _key(version or get_version(), name)
+    value = cache.get(key)
+    if value is not None:
+        _record('hits')
+        return value
+    _record('misses')
+    value = build()
+    cache.set(key, value, _timeout())
+    return value
+
+
+def _etag(version, name):
+    return '"doctors-%s-%s"' % (version, hashlib.md5(name.encode()).hexdigest()[:16])
+
+
+def _not_modified(request, etag):
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        _record('not_modified')
+        return True
+    return False
+
+
+def directory_response(request, name, build):
+    """Serve a cached directory payload, answering a matching If-None-Match with 304."""
+    version = get_version()
+    etag = _etag(version, name)
+    if _not_modified(request, etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    return Response(cached(name, build, version), headers={'ETag': etag})
+
+
+def page_links(url, page, page_size, payload):
+    """A cached list page with its next/previous links rebuilt for ``url``, the request being served.
+
+    List entries are keyed on the page alone, so the links stored with them carry
+    the host and query string of whichever request filled the cache.
+    """
+    number = max(1, ceil(payload['count'] / page_size)) if page == 'last' else int(page)
+    if payload['previous'] is None:
+        previous = None
+    elif number == 2:
+        previous = remove_query_param(url, 'page')
+    else:
+        previous = replace_query_param(url, 'page', number - 1)
+    return {
+        **payload,
+        'next': replace_query_param(url, 'page', number + 1) if payload['next'] else None,
+        'previous': previous,
+    }
+
+
+async def adirectory_response(request, name, build, finish=None):
+    """Async counterpart of directory_response for the ASGI views; ``build`` is awaited on a miss.
+
+    ``finish``, if given, adjusts the cached value for this request before it is sent.
+    """
+    version = get_version()
+    etag = _etag(version, name)
+    if _not_modified(request, etag):
+        response = HttpResponseNotModified()
+    else:
+        key = _key(version, name)
+        value = cache.get(key)
+        if value is not None:
+            _record('hits')
+        else:
+            _record('misses')
+            value = await build()
+            cache.set(key, value, _timeout())
+        response = JsonResponse(finish(value) if finish else value, safe=False)
+    response['ETag'] = etag
+    return response
+
+
+def get_slot_times(doctor_ids):
+    """Return ``{doctor_id: set(times)}`` of available TimeSlots, loading misses in one query."""
+    version = get_version()
+    keys = {doctor_id: _key(version, f'slots:{doctor_id}') for doctor_id in doctor_ids}
+    found = cache.get_many(keys.values())
+    slot_times = {}
+    missing = []
+    for doctor_id, key in keys.items():
+        if key in found:
+            slot_times[doctor_id] = found[key]
+        else:
+            missing.append(doctor_id)
+    _record('hits', len(slot_times))
+
+    if missing:
+        _record('misses', len(missing))
+        loaded = {doctor_id: set() for doctor_id in missing}
+        for doctor_id, time in TimeSlot.objects.filter(
+            doctor_id__in=missing, is_available=True
+        ).order_by().values_list('doctor_id', 'time'):
+            loaded[doctor_id].add(time)
+        cache.set_many({keys[doctor_id]: times for doctor_id, times in loaded.items()}, _timeout())
+        slot_times.update(loaded)
+    return slot_times
+
+
+def peek_slot_times(doctor_id):
+    """Cached slot times for one doctor, or None without touching the database."""
+    times = cache.get(_key(get_version(), f'slots:{doctor_id}'))
+    _record('hits' if times is not None else 'misses')
+    return times
+
+
+def store_slot_times(doctor_id, times):
+    cache.set(_key(get_version(), f'slots:{doctor_id}'), times, _timeout())
+
+
+# ==================== appointments/availability.py ====================
+from collections import defaultdict
+from datetime import datetime, timedelta
+from django.db.models import DateField, F, IntegerField, Value
+from django.utils.dateparse import parse_date
+from .directory_cache import get_slot_times, peek_slot_times, store_slot_times
+from .models import ACTIVE_STATUSES, Appointment, ScheduledSlot, TimeSlot
+from .slot_calendar import calendar_enabled, free_slots
+
+TIME_DISPLAY = dict(TimeSlot.TIME_CHOICES)
+MAX_RANGE_DAYS = 31
+
+
+def _slot(time):
+    # Calendar slots can fall outside TIME_CHOICES, e.g. 09:30 with 30 minute slots
+    display = TIME_DISPLAY.get(time) or datetime.strptime(time, '%H:%M').strftime('%I:%M %p')
+    return {'time': time, 'display': display}
+
+
+def parse_date_range(start, end=None):
+    """Parse ``start``/``end`` query strings into dates, raising ValueError on bad input."""
+    try:
+        start_date = parse_date(start or '')
+        end_date = parse_date(end) if end else start_date
+    except ValueError:
+        start_date = end_date = None
+    if start_date is None or end_date is None:
+        raise ValueError('Dates must be in YYYY-MM-DD format')
+    if end_date < start_date:
+        raise ValueError('End date must not be before start date')
+    if (end_date - start_date).days >= MAX_RANGE_DAYS:
+        raise ValueError(f'Date range cannot exceed {MAX_RANGE_DAYS} days')
+    return start_date, end_date
+
+
+def _slot_rows(doctor_id, start, end):
+    # Slots (kind 0) and active bookings (kind 1) come back in one UNION ALL round trip.
+    # Every column is an annotation so both halves select them in the same order.
+    slots = TimeSlot.objects.filter(
+        doctor_id=doctor_id, is_available=True
+    ).order_by().annotate(
+        kind=Value(0, output_field=IntegerField()),
+        day=Value(None, output_field=DateField()),
+        slot_time=F('time'),
+    ).values_list('kind', 'day', 'slot_time')
+
+    booked = Appointment.objects.filter(
+        doctor_id=doctor_id,
+        appointment_date__range=(start, end),
+        status__in=ACTIVE_STATUSES
+    ).order_by().annotate(
+        kind=Value(1, output_field=IntegerField()),
+        day=F('appointment_date'),
+        slot_time=F('appointment_time'),
+    ).values_list('kind', 'day', 'slot_time')
+
+    return slots.union(booked, all=True)
+
+
+def _days(start, end):
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+def _booked_rows(doctor_id, start, end):
+    return Appointment.objects.filter(
+        doctor_id=doctor_id,
+        appointment_date__range=(start, end),
+        status__in=ACTIVE_STATUSES
+    ).order_by().values_list('appointment_date', 'appointment_time')
+
+
+def _calendar_rows(doctor_id, start, end):
+    return ScheduledSlot.objects.filter(
+        doctor_id=doctor_id, date__range=(start, end), is_booked=False
+    ).order_by('date', 'time').values_list('date', 'time')
+
+
+def _free_by_day(days, slot_times, booked):
+    return {
+        day: [_slot(time) for time in sorted(slot_times - booked.get(day, set()))]
+        for day in days
+    }
+
+
+def get_availability(doctor_id, start, end=None):
+    """Return ``{date: [{'time', 'display'}, ...]}`` of free slots for every day in the range.
+
+    One query in every mode: the slot calendar read when SLOT_CALENDAR_ENABLED,
+    bookings only when the doctor's slots are cached, otherwise the UNION of
+    slots and bookings, which also fills the cache.
+    """
+    end = end or start
+    days = _days(start, end)
+    if calendar_enabled():
+        free = defaultdict(list)
+        for day, time in _calendar_rows(doctor_id, start, end):
+            free[day].append(time)
+        return {day: [_slot(time) for time in free.get(day, [])] for day in days}
+
+    slot_times = peek_slot_times(doctor_id)
+    booked = defaultdict(set)
+    if slot_times is None:
+        slot_times = set()
+        for kind, day, time in _slot_rows(doctor_id, start, end):
+            if kind == 0:
+                slot_times.add(time)
+            else:
+                booked[day].add(time)
+        store_slot_times(doctor_id, slot_times)
+    else:
+        for day, time in _booked_rows(doctor_id, start, end):
+            booked[day].add(time)
+
+    return _free_by_day(days, slot_times, booked)
+
+
+async def aget_availability(doctor_id, start, end=None):
+    """Async counterpart of get_availability for the ASGI views, running the same queries."""
+    end = end or start
+    days = _days(start, end)
+    if calendar_enabled():
+        free = defaultdict(list)
+        async for day, time in _calendar_rows(doctor_id, start, end):
+            free[day].append(time)
+        return {day: [_slot(time) for time in free.get(day, [])] for day in days}
+
+    # Cache reads only; none of these touch the database
+    slot_times = peek_slot_times(doctor_id)
+    booked = defaultdict(set)
+    if slot_times is None:
+        slot_times = set()
+        async for kind, day, time in _slot_rows(doctor_id, start, end):
+            if kind == 0:
+                slot_times.add(time)
+            else:
+                booked[day].add(time)
+        store_slot_times(doctor_id, slot_times)
+    else:
+        async for day, time in _booked_rows(doctor_id, start, end):
+            booked[day].add(time)
+
+    return _free_by_day(days, slot_times, booked)
+
+
+def get_bulk_availability(doctor_ids, date):
+    """Return ``{doctor_id: [{'time', 'display'}, ...]}`` for many doctors on one date.
+
+    At most two queries, however many doctors are passed in; slot sets come
+    from the directory cache when warm, or a single calendar read when enabled.
+    """
+    if calendar_enabled():
+        free = free_slots(doctor_ids, date, date)
+        return {doctor_id: [_slot(time) for time in free[doctor_id].get(date, [])] for doctor_id in doctor_ids}
+
+    slot_times = get_slot_times(doctor_ids)
+
+    booked = defaultdict(set)
+    for doctor_id, time in Appointment.objects.filter(
+        doctor_id__in=doctor_ids,
+        appointment_date=date,
+        status__in=ACTIVE_STATUSES
+    ).order_by().values_list('doctor_id', 'appointment_time'):
+        booked[doctor_id].add(time)
+
+    return {
+        doctor_id: [_slot(time) for time in sorted(slot_times[doctor_id] - booked[doctor_id])]
+        for doctor_id in doctor_ids
+    }
+
+
+# ==================== appointments/pagination.py ====================
+import base64
+import json
+from types import SimpleNamespace
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def _invert(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination over a composite ordering.
+
+    Unlike DRF's CursorPagination, the cursor stores the whole ordering key of the
+    boundary row instead of the first field plus an offset, so every page is a
+    single index range scan even when many rows share the same date.
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    ordering = ('-id',)
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.opts = queryset.model._meta
+        position, reverse = self.decode_cursor(request)
+
+        ordering = tuple(_invert(field) for field in self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.position_filter(ordering, position))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.has_next = position is not None if reverse else has_more
+        self.has_previous = has_more if reverse else position is not None
+        self.page = rows
+        return rows
+
+    def position_filter(self, ordering, position):
+        # (a, b, c) after (x, y, z) expands to a > x OR (a = x AND b > y) OR ...
+        # The leading a >= x keeps the whole condition usable as an index range.
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+
+        lead = ordering[0]
+        lead_lookup = 'lte' if lead.startswith('-') else 'gte'
+        return Q(**{f'{lead.lstrip("-")}__{lead_lookup}': position[0]}) & condition
+
+    def row_position(self, row):
+        # values() dicts from the fast list path carry the same attributes as instances
+        if isinstance(row, dict):
+            row = SimpleNamespace(**row)
+        return [
+            self.opts.get_field(field.lstrip('-')).value_to_string(row)
+            for field in self.ordering
+        ]
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+            position = [
+                self.opts.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, payload['p'], strict=True)
+            ]
+            return position, bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position, reverse=False):
+        payload = json.dumps({'p': position, 'r': int(reverse)}, separators=(',', ':'))
+        token = base64.urlsafe_b64encode(payload.encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.row_position(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.row_position(self.page[0]), reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class AppointmentCursorPagination(KeysetPagination):
+    ordering = ('-appointment_date', '-appointment_time', '-id')
+
+
+class PatientCursorPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+
+
+class OptionalCursorPaginationMixin:
+    """Switch a viewset to keyset pagination when ``?pagination=cursor`` is passed."""
+    cursor_pagination_class = None
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.cursor_pagination_class is not None and (
+                self.request.query_params.get('pagination') == 'cursor'
+            ):
+                self._paginator = self.cursor_pagination_class()
+            else:
+                return super().paginator
+        return self._paginator
+
+
+# ==================== appointments/renderers.py ====================
+from django.utils.encoding import force_str
+from django.utils.functional import Promise
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional speedup; DRF's encoder is used without it
+    orjson = None
+
+_fallback = JSONEncoder()
+
+
+def _default(obj):
+    # Dates, decimals, lazy strings and the rest go through DRF's encoder, so the
+    # output matches JSONRenderer byte for byte
+    if isinstance(obj, Promise):
+        return force_str(obj)
+    return _fallback.default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer backed by orjson, several times faster on large list responses.
+
+    Falls back to DRF's implementation when orjson is missing or the client asked
+    for indented output.
+    """
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        ret = orjson.dumps(
+            data, default=_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+        )
+        # Same escaping as JSONRenderer, so the payload is also valid JavaScript
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+# ==================== appointments/fieldsets.py ====================
+import re
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.utils.encoding import force_str
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+FIELDS_PARAM = 'fields'
+DISPLAY_SOURCE = re.compile(r'^get_(\w+)_display$')
+# Serializer fields whose output is the column value itself
+PLAIN_FIELDS = (
+    serializers.CharField, serializers.IntegerField, serializers.BooleanField,
+    serializers.FloatField, serializers.ChoiceField, serializers.ReadOnlyField,
+    serializers.PrimaryKeyRelatedField,
+)
+# Serializer fields whose output is their own to_representation() of the column
+CONVERTED_FIELDS = (
+    serializers.DateField, serializers.DateTimeField, serializers.TimeField,
+    serializers.DecimalField,
+)
+
+
+def fast_lists_enabled():
+    return getattr(settings, 'FAST_LIST_RESPONSES', False)
+
+
+def parse_fields(value, allowed):
+    """Split a ``?fields=`` value into field names; None when it is absent or empty."""
+    names = list(dict.fromkeys(name.strip() for name in (value or '').split(',') if name.strip()))
+    if not names:
+        return None
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ValueError(
+            f"Unknown field(s): {', '.join(unknown)}. Choose from: {', '.join(allowed)}"
+        )
+    return tuple(names)
+
+
+def _column(model, source):
+    """The values() lookup and final model field for a dotted serializer source."""
+    parts = source.split('.')
+    display = DISPLAY_SOURCE.match(parts[-1])
+    if display:
+        parts[-1] = display.group(1)
+    field = None
+    for part in parts:
+        if field is not None:
+            if not (field.many_to_one or field.one_to_one) or field.related_model is None:
+                return None, None, False
+            model = field.related_model
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            return None, None, False
+    return '__'.join(parts), field, bool(display)
+
+
+def row_plan(serializer):
+    """``[(name, lookup, convert)]`` to build ``serializer``'s output from values() rows.
+
+    None when any readable field needs an object (method fields, nested
+    serializers, properties), in which case the serializer has to run.
+    """
+    model = serializer.Meta.model
+    plan = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if not isinstance(field, PLAIN_FIELDS + CONVERTED_FIELDS) or field.source == '*':
+            return None
+        lookup, model_field, display = _column(model, field.source)
+        if lookup is None or model_field.many_to_many or model_field.one_to_many:
+            return None
+        if model_field.is_relation != isinstance(field, serializers.PrimaryKeyRelatedField):
+            return None
+        if display:
+            choices = {value: force_str(label) for value, label in model_field.flatchoices}
+            plan.append((name, lookup, lambda value, choices=choices: choices.get(value, value)))
+        elif isinstance(field, CONVERTED_FIELDS):
+            plan.append((name, lookup, field.to_representation))
+        else:
+            plan.append((name, lookup, None))
+    return plan
+
+
+class CountedRows:
+    """values() rows for page-number pagination, counted through the plain queryset.
+
+    Lookups across foreign keys join tables that COUNT(*) would keep joining;
+    the queryset the rows came from counts the same rows without them.
+    """
+    
+    def __init__(self, rows, queryset):
+        self.rows = rows
+        self.queryset = queryset
+        self.ordered = rows.ordered
+    
+    def count(self):
+        return self.queryset.count()
+    
+    def __len__(self):
+        return self.count()
+    
+    def __getitem__(self, key):
+        return self.rows[key]
+
+
+def render_rows(plan, rows):
+    return [
+        {
+            name: row[lookup] if convert is None or row[lookup] is None else convert(row[lookup])
+            for name, lookup, convert in plan
+        }
+        for row in rows
+    ]
+
+
+class FieldsetMixin:
+    """Sparse fieldsets, a compact list representation and a values() list path.
+
+    ``?fields=id,status`` trims any read to the named fields of ``serializer_class``.
+    Without it, list actions use the smaller ``list_serializer_class``. With
+    FAST_LIST_RESPONSES on, a list whose fields all map to columns is read with a
+    single values() query of just those columns, and no serializer runs per row.
+    """
+    list_serializer_class = None
+    
+    def requested_fields(self):
+        if not hasattr(self, '_requested_fields'):
+            self._requested_fields = None
+            if self.request is not None and self.request.method in SAFE_METHODS:
+                readable = [
+                    name for name, field in self.serializer_class().fields.items()
+                    if not field.write_only
+                ]
+                try:
+                    self._requested_fields = parse_fields(
+                        self.request.query_params.get(FIELDS_PARAM), readable
+                    )
+                except ValueError as exc:
+                    raise ValidationError({FIELDS_PARAM: [str(exc)]})
+        return self._requested_fields
+    
+    def get_serializer_class(self):
+        if self.action == 'list' and self.list_serializer_class and not self.requested_fields():
+            return self.list_serializer_class
+        return super().get_serializer_class()
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.requested_fields()
+        return context
+    
+    def list(self, request, *args, **kwargs):
+        plan = row_plan(self.get_serializer()) if fast_lists_enabled() else None
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+        
+        # Keyset cursors are built from the ordering columns, so fetch those too
+        ordering = [field.lstrip('-') for field in getattr(self.paginator, 'ordering', ())]
+        lookups = dict.fromkeys([lookup for _, lookup, _ in plan] + ordering)
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = queryset.values(*lookups)
+        # Keyset pagination reorders and filters a real queryset; page numbers only count and slice
+        page = self.paginate_queryset(rows if ordering else CountedRows(rows, queryset))
+        if page is not None:
+            return self.get_paginated_response(render_rows(plan, page))
+        return Response(render_rows(plan, rows))
+
+
+# ==================== appointments/stats.py ====================
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+from .models import Appointment, DashboardCounter, Doctor, Patient
+
+# Counter keys:
+#   appointments, doctors, patients          -> table totals
+#   appointments:<status>                    -> appointments per status
+#   doctor:<doctor_id>:<status>              -> per-doctor breakdown
+#   day:<YYYY-MM-DD>:<status>                -> per-day breakdown
+STATUSES = [code for code, _ in Appointment.STATUS_CHOICES]
+
+
+def counter_cache_enabled():
+    return getattr(settings, 'DASHBOARD_COUNTER_CACHE', False)
+
+
+def appointment_counter_keys(status, doctor_id, day):
+    return [
+        f'appointments:{status}',
+        f'doctor:{doctor_id}:{status}',
+        f'day:{day}:{status}',
+    ]
+
+
+def bump_counters(deltas):
+    """Apply ``{key: delta}`` to the counter table with atomic ``value = value + delta`` updates.
+
+    Costs one insert for missing keys plus one UPDATE per distinct delta.
+    """
+    by_delta = {}
+    for key, delta in deltas.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(key)
+    if not by_delta:
+        return
+    with transaction.atomic():
+        DashboardCounter.objects.bulk_create(
+            [DashboardCounter(key=key) for keys in by_delta.values() for key in keys],
+            ignore_conflicts=True
+        )
+        for delta, keys in by_delta.items():
+            DashboardCounter.objects.filter(key__in=keys).update(value=F('value') + delta)
+
+
+def count_status_changes(states, new_status):
+    """Move counters for appointments leaving ``states`` ((status, doctor_id, day) tuples) for ``new_status``."""
+    if not counter_cache_enabled():
+        return
+    deltas = {}
+    for state in states:
+        for key in appointment_counter_keys(*state):
+            deltas[key] = deltas.get(key, 0) - 1
+        for key in appointment_counter_keys(new_status, *state[1:]):
+            deltas[key] = deltas.get(key, 0) + 1
+    bump_counters(deltas)
+
+
+def _stats_from_counts(counts):
+    return {
+        'total_appointments': counts.get('appointments', 0),
+        'pending': counts.get('appointments:pending', 0),
+        'confirmed': counts.get('appointments:confirmed', 0),
+        'total_doctors': counts.get('doctors', 0),
+        'total_patients': counts.get('patients', 0),
+    }
+
+
+DASHBOARD_KEYS = ['appointments', 'appointments:pending', 'appointments:confirmed', 'doctors', 'patients']
+
+
+def _appointment_totals():
+    # One pass over Appointment with conditional aggregates
+    return {
+        'total_appointments': Count('id'),
+        'pending': Count('id', filter=Q(status='pending')),
+        'confirmed': Count('id', filter=Q(status='confirmed')),
+    }
+
+
+def get_dashboard_stats():
+    if counter_cache_enabled():
+        return _stats_from_counts(dict(
+            DashboardCounter.objects.filter(key__in=DASHBOARD_KEYS).values_list('key', 'value')
+        ))
+
+    stats = Appointment.objects.aggregate(**_appointment_totals())
+    stats['total_doctors'] = Doctor.objects.count()
+    stats['total_patients'] = Patient.objects.count()
+    return stats
+
+
+async def aget_dashboard_stats():
+    """Async counterpart of get_dashboard_stats for the ASGI views."""
+    if counter_cache_enabled():
+        return _stats_from_counts({
+            key: value async for key, value in
+            DashboardCounter.objects.filter(key__in=DASHBOARD_KEYS).values_list('key', 'value')
+        })
+
+    stats = await Appointment.objects.aaggregate(**_appointment_totals())
+    stats['total_doctors'] = await Doctor.objects.acount()
+    stats['total_patients'] = await Patient.objects.acount()
+    return stats
+
+
+def _nest(rows):
+    breakdown = {}
+    if counter_cache_enabled():
+        # Counter rows are (key, value) with keys like doctor:<id>:<status>
+        rows = ((*key.split(':')[1:], value) for key, value in rows)
+    for group, status, count in rows:
+        breakdown.setdefault(str(group), dict.fromkeys(STATUSES, 0))[status] = count
+    return breakdown
+
+
+def _doctor_rows():
+    if counter_cache_enabled():
+        return DashboardCounter.objects.filter(key__startswith='doctor:').values_list('key', 'value')
+    return Appointment.objects.order_by().values_list('doctor_id', 'status').annotate(count=Count('id'))
+
+
+def _day_rows(start, end):
+    if counter_cache_enabled():
+        return DashboardCounter.objects.filter(
+            key__gte=f'day:{start}', key__lte=f'day:{end}:~'
+        ).values_list('key', 'value')
+    return Appointment.objects.filter(
+        appointment_date__range=(start, end)
+    ).order_by().values_list('appointment_date', 'status').annotate(count=Count('id'))
+
+
+def get_doctor_breakdown():
+    """Return ``{doctor_id: {status: count}}``."""
+    return _nest(_doctor_rows())
+
+
+def get_day_breakdown(start, end):
+    """Return ``{YYYY-MM-DD: {status: count}}`` for appointment dates in the range."""
+    return _nest(_day_rows(start, end))
+
+
+async def aget_doctor_breakdown():
+    return _nest([row async for row in _doctor_rows()])
+
+
+async def aget_day_breakdown(start, end):
+    return _nest([row async for row in _day_rows(start, end)])
+
+
+def rebuild_counters():
+    """Recount every dashboard counter from the source tables."""
+    counts = {
+        'appointments': Appointment.objects.count(),
+        'doctors': Doctor.objects.count(),
+        'patients': Patient.objects.count(),
+    }
+    for status, doctor_id, day, count in Appointment.objects.order_by().values_list(
+        'status', 'doctor_id', 'appointment_date'
+    ).annotate(count=Count('id')):
+        for key in appointment_counter_keys(status, doctor_id, day):
+            counts[key] = counts.get(key, 0) + count
+
+    with transaction.atomic():
+        DashboardCounter.objects.all().delete()
+        DashboardCounter.objects.bulk_create(
+            [DashboardCounter(key=key, value=value) for key, value in counts.items()],
+            batch_size=1000
+        )
+    return len(counts)
+
+
+# ==================== appointments/waitlist.py ====================
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .events import SLOT_TAKEN, publish_slots
+from .jobs import enqueue_appointment_event
+from .models import Appointment, TimeSlot, WaitlistEntry
+from .slot_calendar import calendar_enabled, claim_slot
+
+WAITLIST_OFFER = 'waitlist_offer'
+
+
+def waitlist_enabled():
+    return getattr(settings, 'WAITLIST_BACKFILL', True)
+
+
+def queue(doctor_id, day, time):
+    """Waiting entries for the doctor and day that accept ``time``, in offer order.
+
+    waitlist_queue_idx seeks straight to the (doctor, date, waiting) queue in
+    priority order, so only that day's entries are read, not the whole table.
+    """
+    return WaitlistEntry.objects.filter(
+        doctor_id=doctor_id, date=day, status='waiting'
+    ).filter(
+        Q(window_start='') | Q(window_start__lte=time),
+        Q(window_end='') | Q(window_end__gte=time),
+    ).order_by('-priority', 'id')
+
+
+def offer_slot(doctor_id, day, time, exclude_patient_id=None):
+    """Book a freed slot for the first waiting entry that fits; returns the appointment or None.
+
+    Call it inside the transaction that freed the slot, so the cancellation and
+    the offer commit together. The offer is a pending appointment the patient
+    confirms or cancels like any other; cancelling it offers the slot onwards.
+    """
+    if not waitlist_enabled() or day < timezone.localdate():
+        return None
+
+    entries = queue(doctor_id, day, time)
+    if exclude_patient_id is not None:
+        entries = entries.exclude(patient_id=exclude_patient_id)
+    if connection.features.has_select_for_update_skip_locked:
+        # An entry locked by a concurrent cancellation is left to that one
+        entries = entries.select_for_update(skip_locked=True)
+    entry = entries.first()
+    if entry is None:
+        return None
+
+    appointment = Appointment(
+        patient_id=entry.patient_id,
+        doctor_id=doctor_id,
+        appointment_date=day,
+        appointment_time=time,
+        reason=entry.reason or 'Booked from the waitlist',
+        status='pending'
+    )
+    try:
+        with transaction.atomic():
+            if calendar_enabled():
+                if not claim_slot(doctor_id, day, time):
+                    return None
+                appointment._slot_claimed = True
+            elif TimeSlot.objects.select_for_update().filter(
+                doctor_id=doctor_id, time=time, is_available=True
+            ).first() is None:
+                # The doctor no longer takes appointments at this time
+                return None
+            appointment.save(force_insert=True)
+    except IntegrityError:
+        # A regular booking took the slot first
+        return None
+
+    WaitlistEntry.objects.filter(pk=entry.pk).update(
+        status='offered', appointment=appointment, offered_at=timezone.now()
+    )
+    enqueue_appointment_event(WAITLIST_OFFER, [appointment.pk])
+    publish_slots(SLOT_TAKEN, [(doctor_id, day, time)])
+    return appointment
+
+
+def backfill(freed):
+    """Offer each freed ``(doctor_id, date, time, patient_id)`` slot onwards; returns the offers made."""
+    offers = []
+    for doctor_id, day, time, patient_id in freed:
+        appointment = offer_slot(doctor_id, day, time, exclude_patient_id=patient_id)
+        if appointment is not None:
+            offers.append(appointment)
+    return offers
+
+
+# ==================== appointments/transitions.py ====================
+from django.db import transaction
+from django.utils import timezone
+from .jobs import enqueue_appointment_event
+from .models import Appointment
+from .slot_calendar import calendar_enabled, mark_slots
+from .stats import count_status_changes
+from .waitlist import backfill
+from .events import SLOT_FREED, publish_slots
+
+# Allowed status moves; cancelled and completed are final
+TRANSITIONS = {
+    'pending': {'confirmed', 'cancelled', 'completed'},
+    'confirmed': {'cancelled', 'completed'},
+    'cancelled': set(),
+    'completed': set(),
+}
+VERBS = {'confirmed': 'confirm', 'cancelled': 'cancel', 'completed': 'complete'}
+# Moves that notify the patient through the job queue
+NOTIFY_ON = {'confirmed', 'cancelled'}
+# Moves out of ACTIVE_STATUSES, after which the slot can be booked again
+SLOT_RELEASING = {'cancelled', 'completed'}
+
+
+class IllegalTransition(Exception):
+    def __init__(self, current, target):
+        super().__init__(f'Cannot {VERBS.get(target, target)} a {current} appointment')
+        self.current = current
+        self.target = target
+
+
+def can_transition(current, target):
+    return target in TRANSITIONS.get(current, ())
+
+
+def apply_transition_effects(moved, target):
+    """Everything that follows appointments moving to ``target``, for single and bulk moves alike.
+
+    ``moved`` holds ``(id, previous status, doctor_id, date, time, patient_id)`` rows.
+    Call it inside the transaction that made the move, so the counters, calendar,
+    queued notifications, slot events and waitlist offers commit with it.
+    """
+    if not moved:
+        return
+    count_status_changes([(status, doctor_id, day) for _, status, doctor_id, day, _, _ in moved], target)
+    if target in SLOT_RELEASING:
+        slots = [(doctor_id, day, time) for _, _, doctor_id, day, time, _ in moved]
+        if calendar_enabled():
+            mark_slots(slots, False)
+        publish_slots(SLOT_FREED, slots)
+    if target in NOTIFY_ON:
+        enqueue_appointment_event(target, [pk for pk, *_ in moved])
+    if target == 'cancelled':
+        backfill([(doctor_id, day, time, patient_id) for _, _, doctor_id, day, time, patient_id in moved])
+
+
+def transition(appointment, target, **fields):
+    """Move ``appointment`` to ``target``, writing only status, updated_at and ``fields``.
+
+    The UPDATE is conditional on the status the instance was loaded with, so if a
+    concurrent request moved the appointment first this raises IllegalTransition
+    instead of overwriting it.
+    """
+    current = appointment.status
+    if not can_transition(current, target):
+        raise IllegalTransition(current, target)
+
+    changes = dict(fields, status=target, updated_at=timezone.now())
+    with transaction.atomic():
+        updated = Appointment.objects.filter(pk=appointment.pk, status=current).update(**changes)
+        if not updated:
+            actual = Appointment.objects.filter(pk=appointment.pk).values_list('status', flat=True).first()
+            raise IllegalTransition(actual or current, target)
+        apply_transition_effects([(
+            appointment.pk, current, appointment.doctor_id, appointment.appointment_date,
+            appointment.appointment_time, appointment.patient_id,
+        )], target)
+
+    for name, value in changes.items():
+        setattr(appointment, name, value)
+    appointment._stored_state = (target, appointment.doctor_id, appointment.appointment_date)
+    return appointment
+
+
+# ==================== appointments/bulk.py ====================
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .models import ACTIVE_STATUSES, Appointment, Doctor, Patient, TimeSlot, normalize_email
+from .serializers import AppointmentBatchItemSerializer
+from .slot_calendar import calendar_enabled, lock_slots, mark_slots
+from .stats import appointment_counter_keys, bump_counters, counter_cache_enabled
+from .transitions import IllegalTransition, apply_transition_effects, can_transition
+from .jobs import enqueue_appointment_event
+from .events import SLOT_TAKEN, publish_slots
+
+
+def _count_created(appointments, new_patients):
+    # bulk_create skips post_save, so keep the dashboard counters in step by hand
+    for appointment in appointments:
+        appointment._stored_state = (
+            appointment.status, appointment.doctor_id, appointment.appointment_date
+        )
+    if not counter_cache_enabled():
+        return
+    deltas = {'appointments': len(appointments), 'patients': new_patients}
+    for appointment in appointments:
+        for key in appointment_counter_keys(*appointment._stored_state):
+            deltas[key] = deltas.get(key, 0) + 1
+    bump_counters(deltas)
+
+
+def _patients_by_email(items):
+    """Patients for the payloads' emails keyed by normalize_email(), creating the missing ones."""
+    emails = {normalize_email(data['email']) for data in items}
+    patients = {}
+    # Newest first, so the oldest patient with an email wins, as in single booking
+    for patient in Patient.objects.filter(email_normalized__in=emails).order_by('-id'):
+        patients[patient.email_normalized] = patient
+
+    missing = {}
+    for data in items:
+        email = normalize_email(data['email'])
+        if email not in patients and email not in missing:
+            missing[email] = Patient(
+                email=data['email'], full_name=data['patient_name'], phone=data['phone']
+            )
+    if missing:
+        Patient.objects.bulk_create(missing.values())
+        patients.update(missing)
+    return patients, len(missing)
+
+
+def book_appointments(payloads):
+    """Validate and book a list of AppointmentCreateSerializer payloads in one transaction.
+
+    Returns one result per payload, in order, each with a ``status_code`` of 201
+    (``appointment``), 400 (``errors``) or 409 (``error``).
+    """
+    results = [None] * len(payloads)
+    valid = []
+    for index, payload in enumerate(payloads):
+        serializer = AppointmentBatchItemSerializer(data=payload)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            results[index] = {'index': index, 'status_code': 400, 'errors': serializer.errors}
+    if not valid:
+        return results
+
+    doctor_ids = {data['doctor_id'] for _, data in valid}
+    dates = {data['appointment_date'] for _, data in valid}
+    with transaction.atomic():
+        # Lock every slot row the batch can touch, in id order to avoid deadlocks
+        doctors = Doctor.objects.in_bulk(doctor_ids)
+        if calendar_enabled():
+            calendar = lock_slots(doctor_ids, dates)
+            taken = {slot for slot, (_, is_booked) in calendar.items() if is_booked}
+        else:
+            calendar = None
+            slots = set(TimeSlot.objects.select_for_update().filter(
+                doctor_id__in=doctor_ids, is_available=True
+            ).order_by('id').values_list('doctor_id', 'time'))
+            taken = set(Appointment.objects.filter(
+                doctor_id__in=doctor_ids,
+                appointment_date__in=dates,
+                status__in=ACTIVE_STATUSES
+            ).order_by().values_list('doctor_id', 'appointment_date', 'appointment_time'))
+
+        to_book = []
+        for index, data in valid:
+            slot = (data['doctor_id'], data['appointment_date'], data['appointment_time'])
+            if calendar is not None:
+                offered = slot in calendar
+            else:
+                offered = (data['doctor_id'], data['appointment_time']) in slots
+            if data['doctor_id'] not in doctors:
+                results[index] = {
+                    'index': index, 'status_code': 400,
+                    'errors': {'doctor_id': ['Doctor not found']},
+                }
+            elif not offered:
+                results[index] = {
+                    'index': index, 'status_code': 400,
+                    'errors': {'appointment_time': ['The doctor does not take appointments at this time']},
+                }
+            elif slot in taken:
+                results[index] = {
+                    'index': index, 'status_code': 409,
+                    'error': 'This time slot is no longer available',
+                }
+            else:
+                taken.add(slot)
+                to_book.append((index, data))
+
+        if not to_book:
+            return results
+
+        patients, new_patients = _patients_by_email([data for _, data in to_book])
+        appointments = [
+            Appointment(
+                patient=patients[normalize_email(data['email'])],
+                doctor=doctors[data['doctor_id']],
+                appointment_date=data['appointment_date'],
+                appointment_time=data['appointment_time'],
+                reason=data['reason'],
+                status='pending'
+            )
+            for _, data in to_book
+        ]
+
+        try:
+            with transaction.atomic():
+                Appointment.objects.bulk_create(appointments)
+            booked = list(zip(to_book, appointments))
+        except IntegrityError:
+            # A concurrent booking slipped past the locks; retry row by row
+            booked = []
+            for item, appointment in zip(to_book, appointments):
+                try:
+                    with transaction.atomic():
+                        Appointment.objects.bulk_create([appointment])
+                    booked.append((item, appointment))
+                except IntegrityError:
+                    results[item[0]] = {
+                        'index': item[0], 'status_code': 409,
+                        'error': 'This time slot is no longer available',
+                    }
+
+        _count_created([appointment for _, appointment in booked], new_patients)
+        enqueue_appointment_event('booked', [appointment.pk for _, appointment in booked])
+        publish_slots(SLOT_TAKEN, [
+            (appointment.doctor_id, appointment.appointment_date, appointment.appointment_time)
+            for _, appointment in booked
+        ])
+        if calendar is not None:
+            mark_slots([
+                (appointment.doctor_id, appointment.appointment_date, appointment.appointment_time)
+                for _, appointment in booked
+            ], True)
+
+    for (index, _), appointment in booked:
+        results[index] = {'index': index, 'status_code': 201, 'appointment': appointment}
+    return results
+
+
+def bulk_set_status(ids, new_status):
+    """Move the given appointments to ``new_status`` with one locking SELECT and one
+    conditional UPDATE per source status.
+
+    Returns one result per id, in order, with a ``status_code`` of 200, 404, or 409
+    for moves the state machine does not allow.
+    """
+    results = {}
+    with transaction.atomic():
+        # id -> (id, status, doctor_id, date, time, patient_id), as apply_transition_effects takes them
+        stored = {
+            row[0]: row
+            for row in Appointment.objects.select_for_update().filter(id__in=ids).order_by().values_list(
+                'id', 'status', 'doctor_id', 'appointment_date', 'appointment_time', 'patient_id'
+            )
+        }
+
+        by_status = {}
+        for pk, row in stored.items():
+            if can_transition(row[1], new_status):
+                by_status.setdefault(row[1], []).append(pk)
+            else:
+                results[pk] = {
+                    'id': pk, 'status_code': 409,
+                    'error': str(IllegalTransition(row[1], new_status)),
+                }
+
+        now = timezone.now()
+        moved = []
+        for current, pks in by_status.items():
+            updated = Appointment.objects.filter(id__in=pks, status=current).update(
+                status=new_status, updated_at=now
+            )
+            if updated != len(pks):
+                # Only possible without row locks (SQLite); find the rows that did move
+                pks = list(Appointment.objects.filter(
+                    id__in=pks, status=new_status, updated_at=now
+                ).values_list('id', flat=True))
+            moved.extend(pks)
+        apply_transition_effects([stored[pk] for pk in moved], new_status)
+
+    for pk in moved:
+        results[pk] = {'id': pk, 'status_code': 200, 'status': new_status}
+    for pk in ids:
+        if pk not in stored:
+            results[pk] = {'id': pk, 'status_code': 404, 'error': 'Appointment not found'}
+        elif pk not in results:
+            results[pk] = {'id': pk, 'status_code': 409, 'error': 'Appointment changed concurrently'}
+    return [results[pk] for pk in ids]
+
+
+# ==================== appointments/importer.py ====================
+import csv
+import json
+import re
+import time
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from django.db import connection, transaction
+from .directory_cache import invalidate_directory
+from .models import ACTIVE_STATUSES, Appointment, Doctor, Patient, TimeSlot, normalize_email
+from .slot_calendar import calendar_enabled, mark_slots
+from .stats import counter_cache_enabled, rebuild_counters
+
+BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 20
+TIME_PATTERN = re.compile(r'^([01]\d|2[0-3]):[0-5]\d$')
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y'}
+SPECIALTIES = {code for code, _ in Doctor.SPECIALTIES}
+SLOT_TIMES = {code for code, _ in TimeSlot.TIME_CHOICES}
+STATUSES = {code for code, _ in Appointment.STATUS_CHOICES}
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_records(path):
+    """Yield one dict per row from a .csv or JSON-lines (.jsonl/.ndjson) file without loading it whole.
+
+    A .json file holding a single array is also accepted, but is parsed in one go.
+    """
+    if path.endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as handle:
+            yield from csv.DictReader(handle)
+    elif path.endswith(('.jsonl', '.ndjson')):
+        with open(path, encoding='utf-8') as handle:
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+    elif path.endswith('.json'):
+        with open(path, encoding='utf-8') as handle:
+            yield from json.load(handle)
+    else:
+        raise ValueError(f'{path}: expected a .csv, .json, .jsonl or .ndjson file')
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def phone_mask(phones, validator):
+    """Check a whole batch of phone numbers against a model's RegexValidator in one pass.
+
+    Uses the validator's compiled pattern directly instead of raising and catching
+    a ValidationError per row.
+    """
+    search = validator.regex.search
+    return [bool(search(phone)) != validator.inverse_match for phone in phones]
+
+
+def _text(record, key):
+    value = record.get(key)
+    return '' if value is None else str(value).strip()
+
+
+def _required(record, key):
+    value = _text(record, key)
+    if not value:
+        raise RowError(f'{key} is required')
+    return value
+
+
+def _flag(record, key, default):
+    value = record.get(key)
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+class ImportReport:
+    def __init__(self, kind):
+        self.kind = kind
+        self.rows = 0
+        self.written = 0
+        self.rejected = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def reject(self, row_number, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((row_number, message))
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+class HospitalImporter:
+    """Bulk-load doctors, time slots and appointments in batched transactions.
+
+    Rows are validated in Python, then written with one ``bulk_create`` per model
+    per batch. Doctors upsert on email and time slots on (doctor, time) where the
+    database supports ``ON CONFLICT ... DO UPDATE``; appointments skip rows that
+    clash with an active booking. Patients are deduplicated by normalized email
+    through an in-memory map, so each distinct email costs one lookup or insert
+    per import.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, progress=None):
+        self.batch_size = batch_size
+        self.progress = progress
+        self.doctors = dict(Doctor.objects.values_list('email', 'id'))
+        self.doctor_ids = set(self.doctors.values())
+        self.patients = {}
+        self.directory_changed = False
+        # bulk_create skips the signals that keep the doctors/patients/appointments counters in step
+        self.counters_changed = False
+
+    def run(self, kind, path):
+        load = {
+            'doctors': self._doctor_batch,
+            'time_slots': self._time_slot_batch,
+            'appointments': self._appointment_batch,
+        }[kind]
+        report = ImportReport(kind)
+        rows = enumerate(read_records(path), start=1)
+        for batch in chunked(rows, self.batch_size):
+            report.rows += len(batch)
+            with transaction.atomic():
+                report.written += load(batch, report)
+            if self.progress:
+                self.progress(report)
+        return report.finish()
+
+    def finish(self):
+        """Redo what post_save signals would have done for the imported rows."""
+        if self.directory_changed:
+            invalidate_directory()
+        if self.counters_changed and counter_cache_enabled():
+            rebuild_counters()
+
+    def _clean(self, batch, report, parse, validator=None, phone_key=None):
+        parsed = []
+        for row_number, record in batch:
+            try:
+                if not isinstance(record, dict):
+                    raise RowError('expected an object')
+                parsed.append((row_number, record, parse(record)))
+            except (ValueError, InvalidOperation) as exc:
+                report.reject(row_number, str(exc))
+        if validator is None:
+            return [value for _, _, value in parsed]
+        valid = phone_mask([_text(record, phone_key) for _, record, _ in parsed], validator)
+        cleaned = []
+        for (row_number, _, value), ok in zip(parsed, valid):
+            if ok:
+                cleaned.append(value)
+            else:
+                report.reject(row_number, f'{phone_key}: {validator.message}')
+        return cleaned
+
+    def _upsert(self, model, objects, unique_fields, update_fields):
+        if connection.features.supports_update_conflicts_with_target:
+            model.objects.bulk_create(
+                objects, update_conflicts=True, unique_fields=unique_fields, update_fields=update_fields
+            )
+        else:
+            model.objects.bulk_create(objects, ignore_conflicts=True)
+
+    def _doctor_id(self, record):
+        email = _text(record, 'doctor_email')
+        if email:
+            doctor_id = self.doctors.get(email)
+        else:
+            doctor_id = int(_required(record, 'doctor_id'))
+            if doctor_id not in self.doctor_ids:
+                doctor_id = None
+        if doctor_id is None:
+            raise RowError('unknown doctor')
+        return doctor_id
+
+    def _parse_doctor(self, record):
+        specialty = _required(record, 'specialty')
+        if specialty not in SPECIALTIES:
+            raise RowError(f'unknown specialty {specialty!r}')
+        return Doctor(
+            name=_required(record, 'name'),
+            specialty=specialty,
+            email=_required(record, 'email'),
+            phone=_text(record, 'phone'),
+            qualification=_text(record, 'qualification'),
+            experience_years=int(_text(record, 'experience_years') or 0),
+            consultation_fee=Decimal(_text(record, 'consultation_fee') or 0),
+            is_available=_flag(record, 'is_available', True),
+        )
+
+    def _doctor_batch(self, batch, report):
+        # Last row wins for an email repeated within a batch; ON CONFLICT cannot touch a row twice
+        doctors = {
+            doctor.email: doctor
+            for doctor in self._clean(batch, report, self._parse_doctor, Doctor.phone_regex, 'phone')
+        }
+        if not doctors:
+            return 0
+        self._upsert(
+            Doctor, list(doctors.values()), ['email'],
+            ['name', 'specialty', 'phone', 'qualification', 'experience_years',
+             'consultation_fee', 'is_available', 'updated_at']
+        )
+        # Upserts do not report primary keys back, so read them by email
+        for email, doctor_id in Doctor.objects.filter(email__in=doctors).values_list('email', 'id'):
+            self.doctors[email] = doctor_id
+            self.doctor_ids.add(doctor_id)
+        self.directory_changed = True
+        self.counters_changed = True
+        return len(doctors)
+
+    def _parse_time_slot(self, record):
+        slot_time = _required(record, 'time')
+        if slot_time not in SLOT_TIMES:
+            raise RowError(f'time must be one of {", ".join(sorted(SLOT_TIMES))}')
+        return TimeSlot(
+            doctor_id=self._doctor_id(record),
+            time=slot_time,
+            is_available=_flag(record, 'is_available', True),
+        )
+
+    def _time_slot_batch(self, batch, report):
+        slots = {
+            (slot.doctor_id, slot.time): slot
+            for slot in self._clean(batch, report, self._parse_time_slot)
+        }
+        if not slots:
+            return 0
+        self._upsert(TimeSlot, list(slots.values()), ['doctor', 'time'], ['is_available'])
+        self.directory_changed = True
+        return len(slots)
+
+    def _parse_appointment(self, record):
+        appointment_time = _required(record, 'appointment_time')
+        if not TIME_PATTERN.match(appointment_time):
+            raise RowError('appointment_time must be in HH:MM format')
+        appointment_status = _text(record, 'status') or 'pending'
+        if appointment_status not in STATUSES:
+            raise RowError(f'unknown status {appointment_status!r}')
+        return (
+            normalize_email(_required(record, 'patient_email')),
+            Appointment(
+                doctor_id=self._doctor_id(record),
+                appointment_date=date.fromisoformat(_required(record, 'appointment_date')),
+                appointment_time=appointment_time,
+                reason=_text(record, 'reason'),
+                status=appointment_status,
+                notes=_text(record, 'notes'),
+                prescription=_text(record, 'prescription'),
+            ),
+            record,
+        )
+
+    def _resolve_patients(self, rows):
+        unknown = {email for email, _, _ in rows if email not in self.patients}
+        if not unknown:
+            return
+        # Newest first, so the oldest patient with an email wins, as in single booking
+        for email, patient_id in Patient.objects.filter(
+            email_normalized__in=unknown
+        ).order_by('-id').values_list('email_normalized', 'id'):
+            self.patients[email] = patient_id
+
+        missing = {}
+        for email, _, record in rows:
+            if email not in self.patients and email not in missing:
+                missing[email] = Patient(
+                    email=_text(record, 'patient_email'),
+                    full_name=_text(record, 'patient_name'),
+                    phone=_text(record, 'patient_phone'),
+                )
+        if not missing:
+            return
+        Patient.objects.bulk_create(missing.values())
+        self.counters_changed = True
+        if any(patient.pk is None for patient in missing.values()):
+            # Backends that cannot return ids from a bulk insert
+            for email, patient_id in Patient.objects.filter(
+                email_normalized__in=missing
+            ).order_by('-id').values_list('email_normalized', 'id'):
+                self.patients[email] = patient_id
+        else:
+            self.patients.update((email, patient.pk) for email, patient in missing.items())
+
+    def _appointment_batch(self, batch, report):
+        rows = self._clean(batch, report, self._parse_appointment, Patient.phone_regex, 'patient_phone')
+        if not rows:
+            return 0
+        self._resolve_patients(rows)
+        appointments = []
+        for email, appointment, _ in rows:
+            appointment.patient_id = self.patients[email]
+            appointments.append(appointment)
+
+        held = [
+            (appointment.doctor_id, appointment.appointment_date, appointment.appointment_time)
+            for appointment in appointments if appointment.status in ACTIVE_STATUSES
+        ]
+        # Only active rows can clash with a booking and be skipped, so only they need counting
+        active = Appointment.objects.filter(
+            status__in=ACTIVE_STATUSES,
+            doctor_id__in={slot[0] for slot in held},
+            appointment_date__in={slot[1] for slot in held},
+        )
+        before = active.count() if held else 0
+        Appointment.objects.bulk_create(appointments, ignore_conflicts=True)
+        written = len(appointments) - len(held) + (active.count() - before if held else 0)
+
+        if calendar_enabled():
+            for chunk in chunked(held, 500):
+                mark_slots(chunk, True)
+        self.counters_changed = True
+        return written
+
+
+# ==================== appointments/search.py ====================
+from django.db import connection, connections
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from .models import Patient, digits_only, normalize_email
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+MIN_QUERY_LENGTH = 2
+PHONE_CHARACTERS = set('0123456789+-(). ')
+RESULT_FIELDS = ('id', 'full_name', 'email', 'phone')
+
+# GIN trigram indexes behind the substring and fuzzy matches on PostgreSQL.
+# They are created after migrate rather than declared on the model, because
+# SQLite has no equivalent and the migrations have to run on both.
+TRIGRAM_INDEXES = {
+    'patient_name_trgm_idx': 'full_name',
+    'patient_phone_trgm_idx': 'phone_digits',
+}
+
+
+def create_search_indexes(using='default', **kwargs):
+    """post_migrate hook: enable pg_trgm and add the trigram indexes, if missing."""
+    conn = connections[using]
+    table = Patient._meta.db_table
+    if conn.vendor != 'postgresql' or table not in conn.introspection.table_names():
+        return
+    with conn.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for name, column in TRIGRAM_INDEXES.items():
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({column} gin_trgm_ops)'
+            )
+
+
+def _ranked(queryset, exact, prefix):
+    return queryset.annotate(rank=Case(
+        When(exact, then=Value(0)),
+        When(prefix, then=Value(1)),
+        default=Value(2),
+        output_field=IntegerField(),
+    ))
+
+
+def search_patients(query, limit=DEFAULT_LIMIT):
+    """Return up to ``limit`` patient rows matching ``query``, best matches first.
+
+    Queries containing ``@`` match email prefixes and queries made of phone
+    characters match anywhere in the digits; anything else is a name search,
+    which is fuzzy (trigram word similarity) on PostgreSQL and a substring
+    match elsewhere. Exact matches rank first, then prefixes, then the rest.
+    Raises ValueError for queries too short to search on.
+    """
+    query = ' '.join(query.split())
+    if len(query) < MIN_QUERY_LENGTH:
+        raise ValueError(f'Search query must be at least {MIN_QUERY_LENGTH} characters')
+
+    if '@' in query:
+        email = normalize_email(query)
+        patients = _ranked(
+            Patient.objects.filter(email_normalized__startswith=email),
+            Q(email_normalized=email), Q(email_normalized__startswith=email),
+        ).order_by('rank', 'email_normalized', 'id')
+    elif set(query) <= PHONE_CHARACTERS:
+        digits = digits_only(query)
+        if len(digits) < MIN_QUERY_LENGTH:
+            raise ValueError(f'Phone searches need at least {MIN_QUERY_LENGTH} digits')
+        patients = _ranked(
+            Patient.objects.filter(phone_digits__contains=digits),
+            Q(phone_digits=digits), Q(phone_digits__startswith=digits),
+        ).order_by('rank', 'phone_digits', 'id')
+    elif connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        patients = _ranked(
+            Patient.objects.filter(full_name__trigram_word_similar=query),
+            Q(full_name__iexact=query), Q(full_name__istartswith=query),
+        ).annotate(
+            similarity=TrigramWordSimilarity(query, 'full_name'),
+        ).order_by('rank', F('similarity').desc(), 'full_name', 'id')
+    else:
+        patients = _ranked(
+            Patient.objects.filter(full_name__icontains=query),
+            Q(full_name__iexact=query), Q(full_name__istartswith=query),
+        ).order_by('rank', 'full_name', 'id')
+
+    return list(patients.values(*RESULT_FIELDS)[:limit])
+
+
+# ==================== appointments/exports.py ====================
+import csv
+import json
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_date
+from .models import Appointment, Patient
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+CHUNK_SIZE = 2000
+
+APPOINTMENT_COLUMNS = [
+    ('id', 'id'),
+    ('appointment_date', 'appointment_date'),
+    ('appointment_time', 'appointment_time'),
+    ('status', 'status'),
+    ('patient_id', 'patient_id'),
+    ('patient_name', 'patient__full_name'),
+    ('patient_email', 'patient__email'),
+    ('patient_phone', 'patient__phone'),
+    ('doctor_id', 'doctor_id'),
+    ('doctor_name', 'doctor__name'),
+    ('doctor_specialty', 'doctor__specialty'),
+    ('reason', 'reason'),
+    ('notes', 'notes'),
+    ('prescription', 'prescription'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+]
+
+PATIENT_COLUMNS = [
+    ('id', 'id'),
+    ('full_name', 'full_name'),
+    ('email', 'email'),
+    ('phone', 'phone'),
+    ('date_of_birth', 'date_of_birth'),
+    ('blood_group', 'blood_group'),
+    ('address', 'address'),
+    ('medical_history', 'medical_history'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+]
+
+
+def _parse_day(value, name):
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise ValueError(f'{name} must be in YYYY-MM-DD format')
+    return day
+
+
+def _rows(queryset, columns):
+    # values_list + iterator() streams tuples through a server-side cursor on
+    # PostgreSQL, so memory stays flat however many rows match
+    return queryset.values_list(*[lookup for _, lookup in columns]).iterator(chunk_size=CHUNK_SIZE)
+
+
+def appointment_rows(params):
+    """Headers and a row iterator for appointments matching the listing filters plus start/end."""
+    queryset = Appointment.objects.matching(
+        patient_id=params.get('patient_id'),
+        doctor_id=params.get('doctor_id'),
+        status=params.get('status'),
+        start=_parse_day(params.get('start'), 'start'),
+        end=_parse_day(params.get('end'), 'end'),
+    ).order_by('appointment_date', 'appointment_time', 'id')
+    return [header for header, _ in APPOINTMENT_COLUMNS], _rows(queryset, APPOINTMENT_COLUMNS)
+
+
+def patient_rows(params):
+    """Headers and a row iterator for patients, optionally limited to a created_at start/end."""
+    queryset = Patient.objects.order_by('id')
+    start = _parse_day(params.get('start'), 'start')
+    end = _parse_day(params.get('end'), 'end')
+    if start:
+        queryset = queryset.filter(created_at__date__gte=start)
+    if end:
+        queryset = queryset.filter(created_at__date__lte=end)
+    return [header for header, _ in PATIENT_COLUMNS], _rows(queryset, PATIENT_COLUMNS)
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def render_csv(headers, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def render_ndjson(headers, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(headers, row)), default=str) + '\n'
+
+
+def render(headers, rows, export_format):
+    if export_format == 'ndjson':
+        return render_ndjson(headers, rows)
+    return render_csv(headers, rows)
+
+
+def streaming_export(headers, rows, export_format, filename):
+    response = StreamingHttpResponse(
+        render(headers, rows, export_format), content_type=EXPORT_FORMATS[export_format]
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
+
+
+# ==================== appointments/metrics.py ====================
+import bisect
+import hmac
+import logging
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# name: (help text, upper bucket bounds; +Inf is implied)
+HISTOGRAMS = {
+    'http_request_duration_seconds': (
+        'Wall time per request', (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+    ),
+    'http_request_db_seconds': (
+        'Time spent in database queries per request', (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+    ),
+    'http_request_db_queries': (
+        'Database queries per request', (0, 1, 2, 3, 5, 10, 20, 50, 100)
+    ),
+    'http_response_size_bytes': (
+        'Response body size', (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+    ),
+}
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsRegistry:
+    """Per-view histograms kept in process memory; each worker reports its own."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {name: {} for name in HISTOGRAMS}
+        self._responses = Counter()
+
+    def observe(self, view, status_code, values):
+        with self._lock:
+            self._responses[(view, status_code)] += 1
+            for name, value in values.items():
+                series = self._histograms[name]
+                if view not in series:
+                    series[view] = Histogram(HISTOGRAMS[name][1])
+                series[view].observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {name: {} for name in HISTOGRAMS}
+            self._responses.clear()
+
+    def render(self):
+        """All series in the Prometheus text exposition format."""
+        lines = [
+            '# HELP http_responses_total Responses by view and status code',
+            '# TYPE http_responses_total counter',
+        ]
+        with self._lock:
+            for (view, status_code), count in sorted(self._responses.items()):
+                lines.append(f'http_responses_total{{view="{_label(view)}",status="{status_code}"}} {count}')
+            for name, (help_text, bounds) in HISTOGRAMS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for view, histogram in sorted(self._histograms[name].items()):
+                    view = _label(view)
+                    cumulative = 0
+                    for bound, count in zip((*bounds, '+Inf'), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_sum{{view="{view}"}} {histogram.total}')
+                    lines.append(f'{name}_count{{view="{view}"}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def view_label(request):
+    """``ViewSet.action`` for DRF viewsets, the function name for @api_view, else the URL name."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    view = match.func
+    cls = getattr(view, 'cls', None)
+    actions = getattr(view, 'actions', None)
+    if cls is not None and actions:
+        return f'{cls.__name__}.{actions.get(request.method.lower(), request.method.lower())}'
+    if cls is not None:
+        return cls.__name__
+    return match.view_name or getattr(view, '__name__', 'unknown')
+
+
+class QueryProbe:
+    """execute_wrapper that counts queries and sums their time."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+# The probe of the request being served. Connections are per thread, and async views
+# run their queries in sync_to_async threads, which inherit this context; so every
+# connection carries _probe_queries and it reports to whichever request is current.
+_current_probe = ContextVar('metrics_probe', default=None)
+
+
+def _probe_queries(execute, sql, params, many, context):
+    probe = _current_probe.get()
+    if probe is None:
+        return execute(sql, params, many, context)
+    return probe(execute, sql, params, many, context)
+
+
+def install_probe(sender=None, connection=None, **kwargs):
+    if _probe_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_probe_queries)
+
+
+connection_created.connect(install_probe)
+
+
+def scrape_allowed(request):
+    """Whether ``request`` may read /api/metrics/: an allowed address or the METRICS_TOKEN bearer."""
+    if request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ()):
+        return True
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    scheme, _, credentials = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    return bool(token) and scheme.lower() == 'bearer' and hmac.compare_digest(credentials.strip(), token)
+
+
+class RequestMetricsMiddleware:
+    """Record wall time, query count, DB time and payload size for every request.
+
+    The numbers go into the in-process registry served at /api/metrics/ and,
+    with METRICS_SERVER_TIMING, into a Server-Timing header. Requests that run
+    more than METRICS_QUERY_COUNT_THRESHOLD queries are logged as warnings.
+    Queries issued while a streaming response is being consumed are not counted.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'METRICS_SERVER_TIMING', settings.DEBUG)
+        self.query_threshold = getattr(settings, 'METRICS_QUERY_COUNT_THRESHOLD', None)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        probe = QueryProbe()
+        started = time.perf_counter()
+        token = self._probing(probe)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_probe.reset(token)
+        return self._record(request, response, probe, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        probe = QueryProbe()
+        started = time.perf_counter()
+        token = self._probing(probe)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_probe.reset(token)
+        return self._record(request, response, probe, time.perf_counter() - started)
+
+    def _probing(self, probe):
+        # Connections opened before this module was imported missed connection_created
+        for connection in connections.all(initialized_only=True):
+            install_probe(connection=connection)
+        return _current_probe.set(probe)
+
+    def _record(self, request, response, probe, elapsed):
+        view = view_label(request)
+        values = {
+            'http_request_duration_seconds': elapsed,
+            'http_request_db_seconds': probe.duration,
+            'http_request_db_queries': probe.count,
+        }
+        if not response.streaming:
+            values['http_response_size_bytes'] = len(response.content)
+        registry.observe(view, response.status_code, values)
+
+        if self.server_timing:
+            response['Server-Timing'] = (
+                f'app;dur={elapsed * 1000:.1f}, '
+                f'db;dur={probe.duration * 1000:.1f};desc="{probe.count} queries"'
+            )
+        if self.query_threshold and probe.count > self.query_threshold:
+            logger.warning(
+                '%s %s (%s) ran %d queries in %.1f ms (%.1f ms in the database)',
+                request.method, request.get_full_path(), view, probe.count,
+                elapsed * 1000, probe.duration * 1000
+            )
+        return response
+
+
+# ==================== appointments/authentication.py ====================
+import copy
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+def _limits():
+    return (
+        getattr(settings, 'AUTH_TOKEN_CACHE_SIZE', 10000),
+        getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 60),
+    )
+
+
+class TokenCache:
+    """Bounded LRU of token key -> (user, token), each entry expiring after a TTL.
+
+    Per process: Token/User signals drop entries in the process that made the
+    change, and the TTL bounds how long other workers keep serving a revoked token.
+    """
+    
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            user, token, _ = entry
+        # Copies, so per-request state (permission caches, edits) never leaks between requests
+        return copy.copy(user), copy.copy(token)
+    
+    def set(self, key, user, token):
+        max_size, ttl = _limits()
+        if max_size <= 0 or ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (user, token, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+    
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def discard_user(self, user_id):
+        with self._lock:
+            for key in [key for key, (user, _, _) in self._entries.items() if user.pk == user_id]:
+                del self._entries[key]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+    
+    def stats(self):
+        max_size, ttl = _limits()
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': max_size,
+                'ttl': ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that resolves each key from the database once per TTL."""
+    
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, token)
+        return user, token
+
+
+async def aauthenticate_token(key):
+    """Async lookup for the ASGI views: the active user owning ``key``, or None."""
+    cached = token_cache.get(key)
+    if cached is not None:
+        return cached[0]
+    token = await Token.objects.select_related('user').filter(key=key).afirst()
+    if token is None or not token.user.is_active:
+        return None
+    token_cache.set(key, token.user, token)
+    return token.user
+
+
+def jwt_enabled():
+    return getattr(settings, 'JWT_AUTHENTICATION', False)
+
+
+def jwt_user(raw_token):
+    """The TokenUser for a valid access token, built from its claims alone; None if invalid."""
+    from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+    from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+    backend = JWTStatelessUserAuthentication()
+    try:
+        return backend.get_user(backend.get_validated_token(raw_token))
+    except (InvalidToken, TokenError):
+        return None
+
+
+def issue_jwt(user):
+    from rest_framework_simplejwt.tokens import RefreshToken
+    refresh = RefreshToken.for_user(user)
+    return {'access': str(refresh.access_token), 'refresh': str(refresh)}
+
+
+# ==================== appointments/routing.py ====================
+import random
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+# Routing state of the request being served; None outside a request (management
+# commands, workers, shell), where every query goes to the primary
+_routing = ContextVar('db_routing', default=None)
+
+
+class RequestRouting:
+    """Which replica, if any, this request reads from, and whether it has written yet."""
+    __slots__ = ('replica', 'pinned')
+
+    def __init__(self):
+        self.replica = None
+        self.pinned = False
+
+
+def replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+def use_replica():
+    """Send the rest of this request's reads to a replica, if one is configured.
+
+    Call it from views that only read, once authentication is done. A request
+    that has already written stays on the primary.
+    """
+    state = _routing.get()
+    aliases = replicas()
+    if state is None or state.pinned or not aliases:
+        return None
+    if state.replica is None:
+        # One replica per request, so a page and its count see the same snapshot
+        state.replica = random.choice(aliases)
+    return state.replica
+
+
+def current_read_alias():
+    state = _routing.get()
+    if state is None or state.pinned or state.replica is None:
+        return DEFAULT_DB_ALIAS
+    return state.replica
+
+
+class ReplicaRouter:
+    """Reads go to the request's replica; writes, and every read after one, to the primary."""
+
+    def db_for_read(self, model, **hints):
+        # Reads inside a transaction must see that transaction's writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return current_read_alias()
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold copies of the primary's rows, so objects may relate across them
+        pool = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Give each request its own routing state, starting on the primary."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _routing.set(RequestRouting())
+        try:
+            return self.get_response(request)
+        finally:
+            _routing.reset(token)
+
+    async def __acall__(self, request):
+        token = _routing.set(RequestRouting())
+        try:
+            return await self.get_response(request)
+        finally:
+            _routing.reset(token)
+
+
+class ReplicaReadMixin:
+    """Serve the viewset actions named in ``replica_actions`` from a read replica."""
+    replica_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and self.action in self.replica_actions:
+            use_replica()
+
+
+# ==================== appointments/views.py ====================
+from rest_framework import viewsets, status, permissions
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.response import Response
+from rest_framework.authtoken.models import Token
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+from .models import (
+    Doctor, Patient, Appointment, ArchivedAppointment, TimeSlot, WaitlistEntry, normalize_email
+)
+from .serializers import (
+    DoctorSerializer, PatientSerializer, AppointmentSerializer,
+    AppointmentCreateSerializer, TimeSlotSerializer, UserRegistrationSerializer,
+    BulkStatusSerializer, SlotUnavailable, MAX_BATCH_SIZE,
+    DoctorListSerializer, PatientListSerializer, AppointmentListSerializer,
+    ArchivedAppointmentSerializer, ArchivedAppointmentListSerializer, WaitlistEntrySerializer
+)
+from .bulk import book_appointments, bulk_set_status
+from .transitions import IllegalTransition, transition
+from .directory_cache import cache_stats, directory_response, page_links
+from .exports import EXPORT_FORMATS, appointment_rows, patient_rows, streaming_export
+from .search import DEFAULT_LIMIT, MAX_LIMIT, search_patients
+from .availability import get_availability, get_bulk_availability, parse_date_range
+from .pagination import (
+    AppointmentCursorPagination, OptionalCursorPaginationMixin, PatientCursorPagination
+)
+from .fieldsets import FieldsetMixin
+from .stats import get_dashboard_stats, get_day_breakdown, get_doctor_breakdown
+from .metrics import PROMETHEUS_CONTENT_TYPE, registry, scrape_allowed
+from .authentication import issue_jwt, jwt_enabled
+from .routing import ReplicaReadMixin, use_replica
+
+def export_response(request, build_rows, filename):
+    # ?output= rather than ?format=, which DRF reserves for renderer selection
+    export_format = request.query_params.get('output', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return Response(
+            {'error': f"Output must be one of: {', '.join(EXPORT_FORMATS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        headers, rows = build_rows(request.query_params)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    return streaming_export(headers, rows, export_format, filename)
+
+
+class DoctorViewSet(ReplicaReadMixin, FieldsetMixin, viewsets.ModelViewSet):
+    queryset = Doctor.objects.all()
+    serializer_class = DoctorSerializer
+    list_serializer_class = DoctorListSerializer
+    replica_actions = ('list', 'retrieve', 'available')
+    permission_classes = [permissions.AllowAny]  # Change in production
+    
+    def _cache_name(self, name):
+        # A sparse fieldset is a different payload, so it gets its own entry
+        fields = self.requested_fields()
+        return f"{name}:{','.join(fields)}" if fields else name
+    
+    # Reads are served from the directory cache; Doctor/TimeSlot signals invalidate it
+    def list(self, request, *args, **kwargs):
+        parent = super()
+        # Only the page and ?fields change the payload; other parameters and the host do not
+        page = request.query_params.get(self.paginator.page_query_param) or '1'
+        response = directory_response(
+            request, self._cache_name(f'list:{page}'),
+            lambda: parent.list(request, *args, **kwargs).data
+        )
+        if response.status_code == status.HTTP_200_OK:
+            response.data = page_links(
+                request.build_absolute_uri(), page, self.paginator.page_size, response.data
+            )
+        return response
+    
+    def retrieve(self, request, *args, **kwargs):
+        parent = super()
+        return directory_response(
+            request, self._cache_name(f"detail:{kwargs['pk']}"),
+            lambda: parent.retrieve(request, *args, **kwargs).data
+        )
+    
+    @action(detail=False, methods=['get'])
+    def available(self, request):
+        def build():
+            doctors = Doctor.objects.filter(is_available=True)
+            return self.get_serializer(doctors, many=True).data
+        return directory_response(request, self._cache_name('available'), build)
+    
+    @action(detail=True, methods=['get'])
+    def available_slots(self, request, pk=None):
+        doctor = self.get_object()
+        date = request.query_params.get('date')
+        start = request.query_params.get('start') or date
+        end = request.query_params.get('end')
+        
+        if not start:
+            return Response(
+                {'error': 'Date parameter is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            start, end = parse_date_range(start, end)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        availability = get_availability(doctor.id, start, end)
+        
+        # A single ?date= keeps the original flat list response
+        if date and not request.query_params.get('start') and not request.query_params.get('end'):
+            return Response(availability[start])
+        
+        return Response({
+            day.isoformat(): slots for day, slots in availability.items()
+        })
+    
+    @action(detail=False, methods=['get'])
+    def availability(self, request):
+        date = request.query_params.get('date')
+        if not date:
+            return Response(
+                {'error': 'Date parameter is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            date, _ = parse_date_range(date)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        doctors = Doctor.objects.filter(is_available=True).only('id', 'name', 'specialty')
+        specialty = request.query_params.get('specialty')
+        if specialty:
+            doctors = doctors.filter(specialty=specialty)
+        
+        # Paginate the roster so the slot queries only cover one page of doctors
+        page = self.paginate_queryset(doctors)
+        doctors = page if page is not None else list(doctors)
+        slots = get_bulk_availability([doctor.id for doctor in doctors], date)
+        
+        data = [{
+            'doctor_id': doctor.id,
+            'doctor_name': doctor.name,
+            'doctor_specialty': doctor.get_specialty_display(),
+            'available_slots': slots[doctor.id],
+        } for doctor in doctors]
+        
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+class PatientViewSet(ReplicaReadMixin, FieldsetMixin, OptionalCursorPaginationMixin, viewsets.ModelViewSet):
+    queryset = Patient.objects.all()
+    serializer_class = PatientSerializer
+    list_serializer_class = PatientListSerializer
+    cursor_pagination_class = PatientCursorPagination
+    permission_classes = [permissions.AllowAny]  # Change in production
+    
+    @action(detail=False, methods=['get'])
+    def by_email(self, request):
+        email = request.query_params.get('email')
+        if not email:
+            return Response(
+                {'error': 'Email parameter is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Case-insensitive through the indexed normalized column; oldest match wins
+        patient = Patient.objects.filter(email_normalized=normalize_email(email)).order_by('id').first()
+        if patient is None:
+            return Response(
+                {'error': 'Patient not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        serializer = self.get_serializer(patient)
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        query = request.query_params.get('q', '')
+        try:
+            limit = min(int(request.query_params.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return Response(
+                {'error': f'Limit must be a number between 1 and {MAX_LIMIT}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            results = search_patients(query, limit)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'results': results})
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        return export_response(request, patient_rows, 'patients')
+
+
+class AppointmentViewSet(ReplicaReadMixin, FieldsetMixin, OptionalCursorPaginationMixin, viewsets.ModelViewSet):
+    queryset = Appointment.objects.all()
+    serializer_class = AppointmentSerializer
+    list_serializer_class = AppointmentListSerializer
+    cursor_pagination_class = AppointmentCursorPagination
+    permission_classes = [permissions.AllowAny]  # Change in production
+    
+    def get_queryset(self):
+        return Appointment.objects.with_related().matching(
+            patient_id=self.request.query_params.get('patient_id'),
+            doctor_id=self.request.query_params.get('doctor_id'),
+            status=self.request.query_params.get('status'),
+        )
+    
+    def create(self, request):
+        serializer = AppointmentCreateSerializer(data=request.data)
+        if serializer.is_valid():
+            try:
+                appointment = serializer.save()
+            except SlotUnavailable as exc:
+                return Response({
+                    'error': str(exc),
+                    'available_slots': get_availability(exc.doctor_id, exc.date)[exc.date],
+                }, status=status.HTTP_409_CONFLICT)
+            response_serializer = AppointmentSerializer(appointment)
+            return Response(
+                response_serializer.data,
+                status=status.HTTP_201_CREATED
+            )
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        return export_response(request, appointment_rows, 'appointments')
+    
+    def _transition(self, target, **fields):
+        appointment = self.get_object()
+        try:
+            transition(appointment, target, **fields)
+        except IllegalTransition as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_409_CONFLICT)
+        serializer = self.get_serializer(appointment)
+        return Response(serializer.data)
+    
+    @action(detail=True, methods=['post'])
+    def confirm(self, request, pk=None):
+        return self._transition('confirmed')
+    
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        return self._transition('cancelled')
+    
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None):
+        return self._transition(
+            'completed',
+            notes=request.data.get('notes', ''),
+            prescription=request.data.get('prescription', '')
+        )
+    
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        payloads = request.data if isinstance(request.data, list) else request.data.get('appointments')
+        if not isinstance(payloads, list) or not payloads:
+            return Response(
+                {'error': 'Expected a non-empty list of appointments'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(payloads) > MAX_BATCH_SIZE:
+            return Response(
+                {'error': f'A batch cannot contain more than {MAX_BATCH_SIZE} appointments'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        results = book_appointments(payloads)
+        for result in results:
+            if 'appointment' in result:
+                result['appointment'] = AppointmentSerializer(result['appointment']).data
+        return Response({'results': results})
+    
+    def _bulk_transition(self, request, new_status):
+        serializer = BulkStatusSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'results': bulk_set_status(serializer.validated_data['ids'], new_status)})
+    
+    @action(detail=False, methods=['post'])
+    def bulk_confirm(self, request):
+        return self._bulk_transition(request, 'confirmed')
+    
+    @action(detail=False, methods=['post'])
+    def bulk_cancel(self, request):
+        return self._bulk_transition(request, 'cancelled')
+    
+    @action(detail=False, methods=['post'])
+    def bulk_complete(self, request):
+        return self._bulk_transition(request, 'completed')
+
+
+def query_day(request, name):
+    """The ``name`` query parameter as a date, or None; a 400 if it is not YYYY-MM-DD."""
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise ValidationError({name: ['Dates must be in YYYY-MM-DD format']})
+    return day
+
+
+def query_id(request, name):
+    """The ``name`` query parameter as an id, or None; a 400 if it is not a positive integer."""
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    if not value.isdigit():
+        raise ValidationError({name: ['A valid integer is required.']})
+    return int(value)
+
+
+class AppointmentHistoryViewSet(ReplicaReadMixin, FieldsetMixin, OptionalCursorPaginationMixin,
+                                viewsets.ReadOnlyModelViewSet):
+    """Read-only access to appointments moved out by `manage.py archive_appointments`."""
+    queryset = ArchivedAppointment.objects.all()
+    serializer_class = ArchivedAppointmentSerializer
+    list_serializer_class = ArchivedAppointmentListSerializer
+    cursor_pagination_class = AppointmentCursorPagination
+    permission_classes = [permissions.AllowAny]  # Change in production
+    
+    def get_queryset(self):
+        # start/end bound appointment_date, which also prunes archive partitions on PostgreSQL
+        return ArchivedAppointment.objects.with_related().matching(
+            patient_id=self.request.query_params.get('patient_id'),
+            doctor_id=self.request.query_params.get('doctor_id'),
+            status=self.request.query_params.get('status'),
+            start=query_day(self.request, 'start'),
+            end=query_day(self.request, 'end'),
+        )
+
+
+class WaitlistViewSet(viewsets.ModelViewSet):
+    """Join, list and leave the waitlist; cancellations offer freed slots to it (waitlist.py)."""
+    queryset = WaitlistEntry.objects.all()
+    serializer_class = WaitlistEntrySerializer
+    permission_classes = [permissions.AllowAny]  # Change in production
+    http_method_names = ['get', 'post', 'delete', 'head', 'options']
+    
+    def get_queryset(self):
+        queryset = WaitlistEntry.objects.select_related('patient', 'doctor').only(
+            *[field.name for field in WaitlistEntry._meta.concrete_fields],
+            'patient__full_name', 'doctor__name',
+        )
+        filters = {
+            'patient_id': query_id(self.request, 'patient_id'),
+            'doctor_id': query_id(self.request, 'doctor_id'),
+            'date': query_day(self.request, 'date'),
+            'status': self.request.query_params.get('status'),
+        }
+        if filters['status'] and filters['status'] not in dict(WaitlistEntry.STATUS_CHOICES):
+            choices = ', '.join(code for code, _ in WaitlistEntry.STATUS_CHOICES)
+            raise ValidationError({'status': [f'Status must be one of: {choices}']})
+        return queryset.filter(**{name: value for name, value in filters.items() if value})
+    
+    def create(self, request, *args, **kwargs):
+        try:
+            with transaction.atomic():
+                return super().create(request, *args, **kwargs)
+        except IntegrityError:
+            return Response(
+                {'error': 'The patient is already waiting for this doctor on this date'},
+                status=status.HTTP_409_CONFLICT
+            )
+    
+    def destroy(self, request, *args, **kwargs):
+        # Leaving keeps the row (and any offer it led to) for the record
+        entry = self.get_object()
+        if not WaitlistEntry.objects.filter(pk=entry.pk, status='waiting').update(status='withdrawn'):
+            return Response(
+                {'error': f'Cannot withdraw a {entry.status} waitlist entry'},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.AllowAny])
+def register_user(request):
+    serializer = UserRegistrationSerializer(data=request.data)
+    if serializer.is_valid():
+        user = serializer.save()
+        token, created = Token.objects.get_or_create(user=user)
+        return Response({
+            'token': token.key,
+            'user_id': user.id,
+            'username': user.username,
+            'email': user.email
+        }, status=status.HTTP_201_CREATED)
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.AllowAny])
+def login_user(request):
+    username = request.data.get('username')
+    password = request.data.get('password')
+    
+    user = authenticate(username=username, password=password)
+    
+    if user:
+        token, created = Token.objects.get_or_create(user=user)
+        data = {
+            'token': token.key,
+            'user_id': user.id,
+            'username': user.username,
+            'email': user.email
+        }
+        if jwt_enabled():
+            data.update(issue_jwt(user))
+        return Response(data)
+    
+    return Response(
+        {'error': 'Invalid credentials'},
+        status=status.HTTP_401_UNAUTHORIZED
+    )
+
+
+@api_view(['POST'])
+def logout_user(request):
+    # Deleting the token evicts it from the auth cache; JWTs simply expire
+    Token.objects.filter(user_id=request.user.pk).delete()
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@api_view(['POST'])
+def rotate_token(request):
+    with transaction.atomic():
+        Token.objects.filter(user_id=request.user.pk).delete()
+        token = Token.objects.create(user_id=request.user.pk)
+    return Response({'token': token.key})
+
+
+@api_view(['GET'])
+def dashboard_stats(request):
+    use_replica()
+    stats = get_dashboard_stats()
+    breakdown = request.query_params.get('breakdown')
+    
+    if breakdown == 'doctor':
+        stats['by_doctor'] = get_doctor_breakdown()
+    elif breakdown == 'day':
+        try:
+            start, end = parse_date_range(
+                request.query_params.get('start'), request.query_params.get('end')
+            )
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        stats['by_day'] = get_day_breakdown(start, end)
+    elif breakdown:
+        return Response(
+            {'error': "Breakdown must be 'doctor' or 'day'"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    return Response(stats)
+
+
+@api_view(['GET'])
+def directory_cache_stats(request):
+    return Response(cache_stats())
+
+
+def metrics(request):
+    """Request metrics for this process in Prometheus text format, for scraping."""
+    if not scrape_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+# ==================== appointments/async_views.py ====================
+import asyncio
+from datetime import timedelta
+from functools import wraps
+from math import ceil
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.paginator import InvalidPage
+from django.http import HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from rest_framework.settings import api_settings
+from .authentication import aauthenticate_token, jwt_enabled, jwt_user
+from .availability import aget_availability, parse_date_range
+from .directory_cache import adirectory_response, page_links
+from .events import RECONNECT_MS, RESYNC, format_sse, get_broker, slot_topic
+from .models import Doctor, Patient, normalize_email
+from .routing import use_replica
+from .fieldsets import FIELDS_PARAM, parse_fields
+from .serializers import DoctorListSerializer, DoctorSerializer, PatientSerializer
+from .stats import aget_dashboard_stats, aget_day_breakdown, aget_doctor_breakdown
+
+# Async versions of the read-heavy endpoints, served under /api/async/. DRF 3.14
+# views are synchronous, so these are plain Django views on the async ORM that
+# return the same payloads as their DRF counterparts. Under ASGI a waiting query
+# no longer ties up a worker; under WSGI they still work, one request at a time.
+
+
+def get_only(view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return HttpResponseNotAllowed(['GET'])
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def _unauthorized(request):
+    """Mirror TokenAuthentication/SessionAuthentication: None when authenticated, else a 401."""
+    keyword, _, key = request.headers.get('Authorization', '').partition(' ')
+    if keyword.lower() == 'token':
+        if key and await aauthenticate_token(key.strip()) is not None:
+            return None
+        detail = 'Invalid token.'
+    elif keyword.lower() == 'bearer' and jwt_enabled():
+        if key and jwt_user(key.strip()) is not None:
+            return None
+        detail = 'Given token not valid for any token type'
+    elif await sync_to_async(lambda: request.user.is_authenticated)():
+        return None
+    else:
+        detail = 'Authentication credentials were not provided.'
+    response = JsonResponse({'detail': detail}, status=401)
+    response['WWW-Authenticate'] = 'Token'
+    return response
+
+
+def _error(message, status_code=400):
+    return JsonResponse({'error': message}, status=status_code)
+
+
+@get_only
+async def doctor_list(request):
+    use_replica()
+    page_size = api_settings.PAGE_SIZE
+    try:
+        number = int(request.GET.get('page', 1))
+    except ValueError:
+        number = 0
+    try:
+        fields = parse_fields(request.GET.get(FIELDS_PARAM), list(DoctorSerializer().fields))
+    except ValueError as exc:
+        return JsonResponse({FIELDS_PARAM: [str(exc)]}, status=400)
+    serializer_class = DoctorSerializer if fields else DoctorListSerializer
+
+    async def build():
+        count = await Doctor.objects.acount()
+        pages = max(1, ceil(count / page_size))
+        if not 1 <= number <= pages:
+            raise InvalidPage
+        offset = (number - 1) * page_size
+        doctors = [doctor async for doctor in Doctor.objects.all()[offset:offset + page_size]]
+
+        # Placeholders; page_links() fills in the links for each request served
+        return {
+            'count': count,
+            'next': number < pages or None,
+            'previous': number > 1 or None,
+            'results': serializer_class(doctors, many=True, context={'fields': fields}).data,
+        }
+
+    # Keyed like DoctorViewSet.list: only the page and ?fields change the payload
+    name = f"async-list:{number}:{','.join(fields)}" if fields else f'async-list:{number}'
+    try:
+        return await adirectory_response(
+            request, name, build,
+            finish=lambda payload: page_links(request.build_absolute_uri(), number, page_size, payload),
+        )
+    except InvalidPage:
+        return JsonResponse({'detail': 'Invalid page.'}, status=404)
+
+
+@get_only
+async def available_slots(request, pk):
+    if not await Doctor.objects.filter(pk=pk).aexists():
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+    date = request.GET.get('date')
+    start = request.GET.get('start') or date
+    end = request.GET.get('end')
+
+    if not start:
+        return _error('Date parameter is required')
+
+    try:
+        start, end = parse_date_range(start, end)
+    except ValueError as exc:
+        return _error(str(exc))
+
+    availability = await aget_availability(pk, start, end)
+
+    # A single ?date= keeps the original flat list response
+    if date and not request.GET.get('start') and not request.GET.get('end'):
+        return JsonResponse(availability[start], safe=False)
+
+    return JsonResponse({day.isoformat(): slots for day, slots in availability.items()})
+
+
+def _snapshot(availability):
+    return {day.isoformat(): slots for day, slots in availability.items()}
+
+
+@get_only
+async def slot_events(request, pk):
+    """Server-Sent Events for one doctor's slots on ``?date=`` (or ``?start=&end=``).
+
+    Opens with a ``snapshot`` of the free slots, then streams ``slot_taken`` and
+    ``slot_freed`` events as bookings, cancellations and completions commit.
+    Comment lines keep idle connections open; after EVENTS_STREAM_TIMEOUT the
+    stream ends and EventSource reconnects, getting a fresh snapshot.
+    """
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would be tied up for the whole stream
+        return _error('Slot events are only served under ASGI', 501)
+    if not await Doctor.objects.filter(pk=pk).aexists():
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+    start = request.GET.get('start') or request.GET.get('date')
+    if not start:
+        return _error('Date parameter is required')
+    try:
+        start, end = parse_date_range(start, request.GET.get('end'))
+    except ValueError as exc:
+        return _error(str(exc))
+
+    heartbeat = getattr(settings, 'EVENTS_HEARTBEAT', 15)
+    timeout = getattr(settings, 'EVENTS_STREAM_TIMEOUT', 300)
+    queue_size = getattr(settings, 'EVENTS_QUEUE_SIZE', 100)
+    topics = [slot_topic(pk, start + timedelta(days=offset)) for offset in range((end - start).days + 1)]
+
+    async def stream():
+        broker = get_broker()
+        # Subscribe before reading the snapshot, so nothing committed in between is missed
+        subscription = broker.subscribe(topics, queue_size)
+        try:
+            yield f'retry: {RECONNECT_MS}\n\n'
+            yield format_sse('snapshot', _snapshot(await aget_availability(pk, start, end)))
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            while (remaining := deadline - loop.time()) > 0:
+                try:
+                    event = await subscription.get(min(heartbeat, remaining))
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                if event is RESYNC:
+                    # This client fell behind and lost events; send the current state instead
+                    yield format_sse('snapshot', _snapshot(await aget_availability(pk, start, end)))
+                else:
+                    yield format_sse(event['type'], event, event['id'])
+        finally:
+            broker.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # stop nginx from buffering the stream
+    return response
+
+
+@get_only
+async def patient_by_email(request):
+    email = request.GET.get('email')
+    if not email:
+        return _error('Email parameter is required')
+
+    patient = await Patient.objects.filter(email_normalized=normalize_email(email)).order_by('id').afirst()
+    if patient is None:
+        return _error('Patient not found', 404)
+    return JsonResponse(PatientSerializer(patient).data)
+
+
+@get_only
+async def dashboard_stats(request):
+    unauthorized = await _unauthorized(request)
+    if unauthorized is not None:
+        return unauthorized
+
+    use_replica()
+    stats = await aget_dashboard_stats()
+    breakdown = request.GET.get('breakdown')
+
+    if breakdown == 'doctor':
+        stats['by_doctor'] = await aget_doctor_breakdown()
+    elif breakdown == 'day':
+        try:
+            start, end = parse_date_range(request.GET.get('start'), request.GET.get('end'))
+        except ValueError as exc:
+            return _error(str(exc))
+        stats['by_day'] = await aget_day_breakdown(start, end)
+    elif breakdown:
+        return _error("Breakdown must be 'doctor' or 'day'")
+
+    return JsonResponse(stats)
+
+
+# ==================== appointments/urls.py ====================
+from django.conf import settings
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from . import async_views, views
+
+router = DefaultRouter()
+router.register(r'doctors', views.DoctorViewSet)
+router.register(r'patients', views.PatientViewSet)
+router.register(r'appointments', views.AppointmentViewSet)
+router.register(r'appointment-history', views.AppointmentHistoryViewSet)
+router.register(r'waitlist', views.WaitlistViewSet)
+
+urlpatterns = [
+    path('', include(router.urls)),
+    path('register/', views.register_user, name='register'),
+    path('login/', views.login_user, name='login'),
+    path('logout/', views.logout_user, name='logout'),
+    path('token/rotate/', views.rotate_token, name='token-rotate'),
+    path('dashboard-stats/', views.dashboard_stats, name='dashboard-stats'),
+    path('cache-stats/', views.directory_cache_stats, name='cache-stats'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('async/doctors/', async_views.doctor_list, name='async-doctor-list'),
+    path('async/doctors/<int:pk>/available_slots/', async_views.available_slots,
+         name='async-doctor-available-slots'),
+    path('async/doctors/<int:pk>/slot_events/', async_views.slot_events, name='async-doctor-slot-events'),
+    path('async/patients/by_email/', async_views.patient_by_email, name='async-patient-by-email'),
+    path('async/dashboard-stats/', async_views.dashboard_stats, name='async-dashboard-stats'),
+]
+
+if getattr(settings, 'JWT_AUTHENTICATION', False):
+    from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+    urlpatterns += [
+        path('token/', TokenObtainPairView.as_view(), name='token-obtain'),
+        path('token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
+    ]
+
+
+# ==================== hospital_appointment/urls.py ====================
+from django.contrib import admin
+from django.urls import path, include
+from django.conf import settings
+from django.conf.urls.static import static
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('api/', include('appointments.urls')),
+]
+
+if settings.DEBUG:
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+
+# ==================== hospital_appointment/asgi.py ====================
+import os
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hospital_appointment.settings')
+
+application = get_asgi_application()
+
+
+# ==================== appointments/admin.py ====================
+from django.contrib import admin
+from .models import (
+    Doctor, Patient, Appointment, ArchivedAppointment, TimeSlot, DoctorSchedule, DoctorLeave,
+    ScheduledSlot, Job, WaitlistEntry
+)
+
+@admin.register(Doctor)
+class DoctorAdmin(admin.ModelAdmin):
+    list_display = ['name', 'specialty', 'email', 'phone', 'is_available']
+    list_filter = ['specialty', 'is_available']
+    search_fields = ['name', 'email', 'phone']
+
+@admin.register(Patient)
+class PatientAdmin(admin.ModelAdmin):
+    list_display = ['full_name', 'email', 'phone', 'created_at']
+    search_fields = ['full_name', 'email', 'phone']
+
+@admin.register(Appointment)
+class AppointmentAdmin(admin.ModelAdmin):
+    list_display = ['patient', 'doctor', 'appointment_date', 'appointment_time', 'status']
+    list_select_related = ['patient', 'doctor']
+    list_filter = ['status', 'appointment_date', 'doctor']
+    search_fields = ['patient__full_name', 'doctor__name']
+
+@admin.register(ArchivedAppointment)
+class ArchivedAppointmentAdmin(admin.ModelAdmin):
+    list_display = ['patient', 'doctor', 'appointment_date', 'appointment_time', 'status', 'archived_at']
+    list_select_related = ['patient', 'doctor']
+    list_filter = ['status', 'doctor']
+    search_fields = ['patient__full_name', 'doctor__name']
+
+@admin.register(TimeSlot)
+class TimeSlotAdmin(admin.ModelAdmin):
+    list_display = ['doctor', 'time', 'is_available']
+    list_filter = ['doctor', 'is_available']
+
+@admin.register(DoctorSchedule)
+class DoctorScheduleAdmin(admin.ModelAdmin):
+    list_display = ['doctor', 'weekday', 'start_time', 'end_time', 'slot_minutes']
+    list_filter = ['weekday', 'doctor']
+    list_select_related = ['doctor']
+
+@admin.register(DoctorLeave)
+class DoctorLeaveAdmin(admin.ModelAdmin):
+    list_display = ['doctor', 'start_date', 'end_date', 'reason']
+    list_filter = ['doctor']
+    list_select_related = ['doctor']
+
+@admin.register(ScheduledSlot)
+class ScheduledSlotAdmin(admin.ModelAdmin):
+    list_display = ['doctor', 'date', 'time', 'is_booked']
+    list_filter = ['is_booked', 'date']
+    list_select_related = ['doctor']
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ['patient', 'doctor', 'date', 'window_start', 'window_end', 'priority', 'status']
+    list_filter = ['status', 'date', 'doctor']
+    list_select_related = ['patient', 'doctor']
+    readonly_fields = ['appointment', 'offered_at', 'created_at']
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'status', 'attempts', 'run_after', 'finished_at']
+    list_filter = ['status', 'kind']
+    readonly_fields = ['claimed_by', 'claimed_at', 'last_error', 'created_at', 'finished_at']
+
+
+# ==================== appointments/apps.py ====================
+from django.apps import AppConfig
+
+
+class AppointmentsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'appointments'
+    
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from . import notifications, signals  # noqa: F401
+        from .archive import partition_archive_table
+        from .search import create_search_indexes
+        post_migrate.connect(create_search_indexes, sender=self)
+        post_migrate.connect(partition_archive_table, sender=self)
+
+
+# ==================== appointments/signals.py ====================
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from .authentication import token_cache
+from .directory_cache import invalidate_directory
+from .models import ACTIVE_STATUSES, Appointment, Doctor, Patient, TimeSlot
+from .slot_calendar import calendar_enabled, mark_slots
+from .stats import appointment_counter_keys, bump_counters, counter_cache_enabled
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+@receiver(post_save, sender=TimeSlot)
+@receiver(post_delete, sender=TimeSlot)
+def refresh_doctor_directory(sender, **kwargs):
+    invalidate_directory()
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def evict_cached_token(sender, instance, **kwargs):
+    # Logout, rotation and admin edits; deleting a user cascades here too
+    token_cache.discard(instance.key)
+
+
+@receiver(post_save, sender=User)
+def evict_cached_user(sender, instance, **kwargs):
+    # Deactivation or any other change must not be served from a stale cached user
+    token_cache.discard_user(instance.pk)
+
+
+def _sync_slot_calendar(instance, created, previous, previous_slot):
+    # Generic saves (admin, PUT) keep the calendar in step; the booking and
+    # transition paths claim and release slots themselves
+    slot = (instance.doctor_id, instance.appointment_date, instance.appointment_time)
+    active = instance.status in ACTIVE_STATUSES
+    if created:
+        if active:
+            mark_slots([slot], True)
+        return
+    if previous is None or previous_slot is None:
+        return
+    was_active = previous[0] in ACTIVE_STATUSES
+    if was_active and (not active or previous_slot != slot):
+        mark_slots([previous_slot], False)
+    if active and (not was_active or previous_slot != slot):
+        mark_slots([slot], True)
+
+
+def _count_appointment_save(instance, created, previous, state):
+    deltas = {}
+    if created:
+        deltas['appointments'] = 1
+    elif previous is None or previous == state:
+        # Unknown or unchanged status/doctor/date; rebuild_dashboard_counters fixes drift
+        return
+    else:
+        for key in appointment_counter_keys(*previous):
+            deltas[key] = deltas.get(key, 0) - 1
+    for key in appointment_counter_keys(*state):
+        deltas[key] = deltas.get(key, 0) + 1
+    bump_counters(deltas)
+
+
+@receiver(post_save, sender=Appointment)
+def appointment_saved(sender, instance, created, raw=False, **kwargs):
+    state = (instance.status, instance.doctor_id, instance.appointment_date)
+    previous = getattr(instance, '_stored_state', None)
+    previous_slot = getattr(instance, '_stored_slot', None)
+    slot_claimed = getattr(instance, '_slot_claimed', False)
+    instance._stored_state = state
+    instance._stored_slot = (instance.doctor_id, instance.appointment_date, instance.appointment_time)
+    instance._slot_claimed = False
+    if raw:
+        return
+    if counter_cache_enabled():
+        _count_appointment_save(instance, created, previous, state)
+    if calendar_enabled() and not slot_claimed:
+        _sync_slot_calendar(instance, created, previous, previous_slot)
+
+
+@receiver(post_delete, sender=Appointment)
+def appointment_deleted(sender, instance, **kwargs):
+    state = getattr(instance, '_stored_state', None) or (
+        instance.status, instance.doctor_id, instance.appointment_date
+    )
+    if counter_cache_enabled():
+        deltas = {key: -1 for key in appointment_counter_keys(*state)}
+        deltas['appointments'] = -1
+        bump_counters(deltas)
+    if calendar_enabled() and state[0] in ACTIVE_STATUSES:
+        mark_slots([getattr(instance, '_stored_slot', None) or (
+            instance.doctor_id, instance.appointment_date, instance.appointment_time
+        )], False)
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_save, sender=Patient)
+def count_directory_create(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and counter_cache_enabled():
+        bump_counters({'doctors' if sender is Doctor else 'patients': 1})
+
+
+@receiver(post_delete, sender=Doctor)
+@receiver(post_delete, sender=Patient)
+def count_directory_delete(sender, instance, **kwargs):
+    if counter_cache_enabled():
+        bump_counters({'doctors' if sender is Doctor else 'patients': -1})
+
+
+# ==================== benchmarks/__init__.py ====================
+"""Reproducible benchmarks for the appointments API.
+
+``benchmarks.data`` generates a deterministic dataset, ``benchmarks.scenarios``
+scripts a request mix for every endpoint in appointments/urls.py and
+``benchmarks.runner`` times them. Run them with::
+
+    python manage.py run_benchmarks --generate --output baseline.json
+    python manage.py run_benchmarks --generate --compare baseline.json
+"""
+
+
+# ==================== benchmarks/data.py ====================
+import random
+from datetime import date, timedelta
+from itertools import accumulate
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from rest_framework.authtoken.models import Token
+from appointments.directory_cache import invalidate_directory
+from appointments.models import ACTIVE_STATUSES, Appointment, Doctor, Patient, TimeSlot
+from appointments.slot_calendar import calendar_enabled, generate_calendar
+from appointments.stats import counter_cache_enabled, rebuild_counters
+
+EMAIL_DOMAIN = 'bench.example.com'
+USER_PREFIX = 'bench-'
+BENCH_USERNAME = 'bench-user'
+BENCH_PASSWORD = 'bench-password-2024'
+# A fixed Monday, so the same seed always yields the same rows
+DEFAULT_ANCHOR = date(2025, 1, 6)
+PAST_DAYS = 730
+FUTURE_DAYS = 60
+
+SPECIALTY_WEIGHTS = {
+    'general': 30, 'pediatrics': 15, 'cardiology': 12, 'orthopedics': 12,
+    'dermatology': 10, 'neurology': 8, 'psychiatry': 8, 'oncology': 5,
+}
+PAST_STATUS_WEIGHTS = {'pending': 3, 'confirmed': 7, 'cancelled': 15, 'completed': 75}
+FUTURE_STATUS_WEIGHTS = {'pending': 45, 'confirmed': 45, 'cancelled': 10, 'completed': 0}
+# Clinics are quieter at the weekend
+WEEKDAY_WEIGHTS = [1.0, 1.0, 1.0, 1.0, 0.9, 0.3, 0.1]
+FIRST_NAMES = [
+    'James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David',
+    'Elizabeth', 'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Amit', 'Priya',
+    'Wei', 'Mei', 'Carlos', 'Sofia', 'Ahmed', 'Fatima', 'Olu', 'Ngozi',
+]
+LAST_NAMES = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez',
+    'Martinez', 'Hernandez', 'Lopez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Patel',
+    'Sharma', 'Chen', 'Wang', 'Khan', 'Okafor', 'Adeyemi', 'Silva', 'Rossi',
+]
+REASONS = ['Regular checkup', 'Follow-up visit', 'Chest pain', 'Skin rash', 'Headache', 'Back pain',
+           'Vaccination', 'Prescription renewal', 'Test results review']
+
+
+def bench_doctors():
+    return Doctor.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}')
+
+
+def bench_patients():
+    return Patient.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}')
+
+
+def clear():
+    """Delete everything a previous generate() or benchmark run created."""
+    with transaction.atomic():
+        Appointment.objects.filter(patient__email__endswith=f'@{EMAIL_DOMAIN}').delete()
+        bench_doctors().delete()
+        bench_patients().delete()
+        User.objects.filter(username__startswith=USER_PREFIX).delete()
+
+
+def _person(rng, index):
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    return f'{first} {last}', f'{first}.{last}{index}@{EMAIL_DOMAIN}'.lower()
+
+
+def generate(doctors=50, patients=5000, appointments=50000, seed=42, anchor=DEFAULT_ANCHOR,
+             batch_size=5000):
+    """Replace the benchmark rows with a fresh deterministic dataset.
+
+    Doctors get a specialty mix weighted towards general medicine and six to
+    eight of the standard time slots. Appointments span two years before
+    ``anchor`` and sixty days after it, thin out at weekends, follow a skewed
+    per-patient distribution, and mostly complete in the past while staying
+    pending or confirmed in the future. Returns the row counts.
+    """
+    rng = random.Random(seed)
+    times = [time_value for time_value, _ in TimeSlot.TIME_CHOICES]
+    capacity = doctors * len(times) * (PAST_DAYS + FUTURE_DAYS)
+    if appointments > capacity // 2:
+        raise ValueError(f'{appointments} appointments is too many for {doctors} doctors')
+
+    clear()
+    with transaction.atomic():
+        doctor_rows = []
+        for i in range(doctors):
+            name, email = _person(rng, i)
+            doctor_rows.append(Doctor(
+                name=name,
+                specialty=rng.choices(list(SPECIALTY_WEIGHTS), weights=SPECIALTY_WEIGHTS.values())[0],
+                email=email,
+                phone='+1555' + str(i).zfill(7),
+                qualification='MD',
+                experience_years=rng.randint(1, 35),
+                consultation_fee=rng.choice([50, 75, 100, 150, 200]),
+            ))
+        Doctor.objects.bulk_create(doctor_rows, batch_size=batch_size)
+        # Read the ids back; not every backend returns them from bulk_create
+        doctor_ids = list(bench_doctors().order_by('id').values_list('id', flat=True))
+
+        slot_times = {}
+        for doctor_id in doctor_ids:
+            slot_times[doctor_id] = sorted(rng.sample(times, rng.randint(6, len(times))))
+        TimeSlot.objects.bulk_create([
+            TimeSlot(doctor_id=doctor_id, time=time_value)
+            for doctor_id, doctor_times in slot_times.items() for time_value in doctor_times
+        ], batch_size=batch_size)
+
+        patient_rows = []
+        for i in range(patients):
+            name, email = _person(rng, i)
+            patient_rows.append(Patient(full_name=name, email=email, phone='+1666' + str(i).zfill(7)))
+        Patient.objects.bulk_create(patient_rows, batch_size=batch_size)
+        patient_ids = list(bench_patients().order_by('id').values_list('id', flat=True))
+
+    # A few patients account for many visits
+    patient_weights = [1 / (rank + 1) ** 0.8 for rank in range(len(patient_ids))]
+    rng.shuffle(patient_weights)
+    patient_cum_weights = list(accumulate(patient_weights))
+    taken = set()
+    batch = []
+    created = 0
+    while created < appointments:
+        day = anchor + timedelta(days=rng.randint(-PAST_DAYS, FUTURE_DAYS))
+        if rng.random() > WEEKDAY_WEIGHTS[day.weekday()]:
+            continue
+        doctor_id = rng.choice(doctor_ids)
+        slot = (doctor_id, day, rng.choice(slot_times[doctor_id]))
+        if slot in taken:
+            continue
+        taken.add(slot)
+        weights = PAST_STATUS_WEIGHTS if day < anchor else FUTURE_STATUS_WEIGHTS
+        batch.append(Appointment(
+            patient_id=rng.choices(patient_ids, cum_weights=patient_cum_weights)[0],
+            doctor_id=doctor_id,
+            appointment_date=day,
+            appointment_time=slot[2],
+            reason=rng.choice(REASONS),
+            status=rng.choices(list(weights), weights=weights.values())[0],
+        ))
+        created += 1
+        if len(batch) >= batch_size:
+            Appointment.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Appointment.objects.bulk_create(batch)
+
+    user = User.objects.create_user(BENCH_USERNAME, f'user@{EMAIL_DOMAIN}', BENCH_PASSWORD)
+    Token.objects.create(user=user)
+
+    # bulk_create skipped the signals that keep these in step
+    invalidate_directory()
+    if counter_cache_enabled():
+        rebuild_counters()
+    if calendar_enabled():
+        generate_calendar(anchor, anchor + timedelta(days=FUTURE_DAYS), doctor_ids=doctor_ids, rebuild=True)
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+    return {'doctors': doctors, 'patients': patients, 'appointments': appointments}
+
+
+class Dataset:
+    """Ids and values the scenarios target, read back from the generated rows."""
+
+    def __init__(self, anchor=DEFAULT_ANCHOR, free_slot_limit=5000):
+        self.anchor = anchor
+        self.doctor_ids = list(bench_doctors().order_by('id').values_list('id', flat=True))
+        if not self.doctor_ids:
+            raise LookupError('No benchmark data; generate it first')
+        self.specialties = sorted(set(bench_doctors().values_list('specialty', flat=True)))
+        self.patients = list(bench_patients().order_by('id').values_list('id', 'full_name', 'email')[:1000])
+        self.appointment_ids = list(Appointment.objects.filter(
+            doctor_id__in=self.doctor_ids
+        ).order_by('id').values_list('id', flat=True)[:1000])
+        self.pending_ids = list(Appointment.objects.filter(
+            doctor_id__in=self.doctor_ids, status='pending'
+        ).order_by('id').values_list('id', flat=True))
+        self.token = Token.objects.get(user__username=BENCH_USERNAME).key
+        self.free_slots = self._free_slots(free_slot_limit)
+
+    def _free_slots(self, limit):
+        # Open future slots, in a fixed order, for the booking scenarios to claim
+        days = [self.anchor + timedelta(days=offset) for offset in range(1, FUTURE_DAYS + 1)]
+        offered = {}
+        for doctor_id, time_value in TimeSlot.objects.filter(
+            doctor_id__in=self.doctor_ids, is_available=True
+        ).order_by('doctor_id', 'time').values_list('doctor_id', 'time'):
+            offered.setdefault(doctor_id, []).append(time_value)
+        booked = set(Appointment.objects.filter(
+            doctor_id__in=self.doctor_ids, appointment_date__in=days, status__in=ACTIVE_STATUSES
+        ).values_list('doctor_id', 'appointment_date', 'appointment_time'))
+        free = []
+        for day in days:
+            for doctor_id in self.doctor_ids:
+                for time_value in offered.get(doctor_id, []):
+                    if (doctor_id, day, time_value) not in booked:
+                        free.append((doctor_id, day, time_value))
+                        if len(free) >= limit:
+                            return free
+        return free
+
+    def take_free_slots(self, count):
+        """Hand out the next ``count`` free slots; no two scenarios book the same one."""
+        taken, self.free_slots = self.free_slots[:count], self.free_slots[count:]
+        return taken
+
+    def take_pending(self, count):
+        taken, self.pending_ids = self.pending_ids[:count], self.pending_ids[count:]
+        return taken
+
+
+# ==================== benchmarks/scenarios.py ====================
+from datetime import timedelta
+from uuid import uuid4
+from rest_framework.settings import api_settings
+from appointments.serializers import AppointmentSerializer
+from benchmarks.data import BENCH_PASSWORD, BENCH_USERNAME, EMAIL_DOMAIN, USER_PREFIX
+
+
+class Scenario:
+    """One scripted request shape.
+
+    ``path`` and ``body`` are callables taking the request index. Contended
+    scenarios give every worker thread the same index sequence, so all of them
+    race for the same target at once; otherwise each request gets its own index.
+    """
+
+    def __init__(self, name, method, path, body=None, auth=False, expect=(200,),
+                 iterations=None, concurrency=1, contended=False):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.body = body
+        self.auth = auth
+        self.expect = expect
+        self.iterations = iterations
+        self.concurrency = concurrency
+        self.contended = contended
+
+
+def _cycle(values, index):
+    return values[index % len(values)]
+
+
+def build_scenarios(dataset, iterations):
+    """Every endpoint in appointments/urls.py, in read-then-write order.
+
+    Writes claim their targets from ``dataset`` up front, so each one books a
+    slot or moves an appointment that no other scenario touches.
+    """
+    doctors = dataset.doctor_ids
+    patients = dataset.patients
+    appointments = dataset.appointment_ids
+    page_size = api_settings.PAGE_SIZE
+    # Every field of the detail serializer: the list payload before compact lists
+    full_appointment = ','.join(AppointmentSerializer().fields)
+    day = dataset.anchor + timedelta(days=1)
+    week_end = dataset.anchor + timedelta(days=7)
+    month_start = dataset.anchor - timedelta(days=30)
+
+    def doctor(i):
+        return _cycle(doctors, i)
+
+    def page(i, rows, most=5):
+        # Stay within the pages the dataset actually has
+        return i % min(most, max(1, -(-len(rows) // page_size))) + 1
+
+    def booking(slot, i):
+        doctor_id, slot_day, slot_time = slot
+        return {
+            'patient_name': f'Bench Booking {i}',
+            'email': f'booking{i}@{EMAIL_DOMAIN}',
+            'phone': '+1777' + str(i).zfill(7),
+            'doctor_id': doctor_id,
+            'appointment_date': slot_day.isoformat(),
+            'appointment_time': slot_time,
+            'reason': 'Benchmark booking',
+        }
+
+    contention_threads = 8
+    contended_slots = dataset.take_free_slots(iterations)
+    booking_slots = dataset.take_free_slots(iterations)
+    batch_size = 20
+    batch_slots = dataset.take_free_slots(batch_size * iterations)
+    pending = {name: dataset.take_pending(iterations) for name in ('confirm', 'cancel', 'complete')}
+    bulk_pending = {name: dataset.take_pending(batch_size * iterations) for name in ('bulk_confirm', 'bulk_cancel')}
+
+    # Usernames must be new on every run, even without regenerating the data
+    run_id = uuid4().hex[:8]
+
+    def fixed(value):
+        return lambda i: value
+
+    scenarios = [
+        # Doctor directory and slot lookup
+        Scenario('doctors_list', 'get', lambda i: f'/api/doctors/?page={page(i, doctors, 3)}'),
+        Scenario('doctor_detail', 'get', lambda i: f'/api/doctors/{doctor(i)}/'),
+        Scenario('doctors_available', 'get', fixed('/api/doctors/available/')),
+        Scenario('slot_lookup', 'get',
+                 lambda i: f'/api/doctors/{doctor(i)}/available_slots/?date={day}'),
+        Scenario('slot_lookup_week', 'get',
+                 lambda i: f'/api/doctors/{doctor(i)}/available_slots/?start={day}&end={week_end}'),
+        Scenario('slot_lookup_all_doctors', 'get',
+                 lambda i: f'/api/doctors/availability/?specialty={_cycle(dataset.specialties, i)}&date={day}'),
+
+        # Patients
+        Scenario('patients_list', 'get', lambda i: f'/api/patients/?page={page(i, patients)}'),
+        Scenario('patients_list_cursor', 'get', fixed('/api/patients/?pagination=cursor')),
+        Scenario('patient_detail', 'get', lambda i: f'/api/patients/{_cycle(patients, i)[0]}/'),
+        Scenario('patient_by_email', 'get',
+                 lambda i: f'/api/patients/by_email/?email={_cycle(patients, i)[2]}'),
+        Scenario('patient_search', 'get',
+                 lambda i: f'/api/patients/search/?q={_cycle(patients, i)[1][:4]}'),
+        Scenario('patients_export', 'get', fixed('/api/patients/export/?output=ndjson'),
+                 iterations=min(iterations, 3)),
+
+        # Appointment listings with filters
+        Scenario('appointments_list', 'get', lambda i: f'/api/appointments/?page={page(i, appointments)}'),
+        Scenario('appointments_by_doctor', 'get', lambda i: f'/api/appointments/?doctor_id={doctor(i)}'),
+        Scenario('appointments_by_patient', 'get',
+                 lambda i: f'/api/appointments/?patient_id={_cycle(patients, i)[0]}'),
+        Scenario('appointments_by_status', 'get',
+                 lambda i: f"/api/appointments/?status={_cycle(['pending', 'confirmed', 'completed'], i)}"),
+        Scenario('appointments_cursor', 'get',
+                 lambda i: f'/api/appointments/?pagination=cursor&doctor_id={doctor(i)}'),
+        Scenario('appointments_list_sparse', 'get',
+                 lambda i: f'/api/appointments/?fields=id,status,doctor_name&page={page(i, appointments)}'),
+        Scenario('appointments_list_full', 'get',
+                 lambda i: f'/api/appointments/?fields={full_appointment}&page={page(i, appointments)}'),
+        Scenario('appointment_detail', 'get', lambda i: f'/api/appointments/{_cycle(appointments, i)}/'),
+        Scenario('appointments_export', 'get',
+                 lambda i: f'/api/appointments/export/?doctor_id={doctor(i)}&start={month_start}&end={dataset.anchor}',
+                 iterations=min(iterations, 10)),
+
+        # Dashboard and operational endpoints
+        Scenario('dashboard_stats', 'get', fixed('/api/dashboard-stats/'), auth=True),
+        Scenario('dashboard_by_doctor', 'get', fixed('/api/dashboard-stats/?breakdown=doctor'), auth=True),
+        Scenario('dashboard_by_day', 'get',
+                 fixed(f'/api/dashboard-stats/?breakdown=day&start={month_start}&end={dataset.anchor}'), auth=True),
+        Scenario('cache_stats', 'get', fixed('/api/cache-stats/'), auth=True),
+        Scenario('metrics', 'get', fixed('/api/metrics/')),
+
+        # Async twins
+        Scenario('async_doctors_list', 'get', lambda i: f'/api/async/doctors/?page={page(i, doctors, 3)}'),
+        Scenario('async_slot_lookup', 'get',
+                 lambda i: f'/api/async/doctors/{doctor(i)}/available_slots/?date={day}'),
+        Scenario('async_patient_by_email', 'get',
+                 lambda i: f'/api/async/patients/by_email/?email={_cycle(patients, i)[2]}'),
+        Scenario('async_dashboard_stats', 'get', fixed('/api/async/dashboard-stats/'), auth=True),
+
+        # Booking
+        Scenario('booking', 'post', fixed('/api/appointments/'),
+                 body=lambda i: booking(booking_slots[i], i), expect=(201,),
+                 iterations=len(booking_slots)),
+        Scenario('booking_contention', 'post', fixed('/api/appointments/'),
+                 body=lambda i: booking(contended_slots[i], i), expect=(201, 409),
+                 iterations=len(contended_slots), concurrency=contention_threads, contended=True),
+        Scenario('booking_batch', 'post', fixed('/api/appointments/batch/'),
+                 body=lambda i: [
+                     booking(slot, i * batch_size + offset)
+                     for offset, slot in enumerate(batch_slots[i * batch_size:(i + 1) * batch_size])
+                 ],
+                 iterations=len(batch_slots) // batch_size),
+
+        # Status transitions
+        Scenario('confirm', 'post', lambda i: f"/api/appointments/{pending['confirm'][i]}/confirm/",
+                 iterations=len(pending['confirm'])),
+        Scenario('cancel', 'post', lambda i: f"/api/appointments/{pending['cancel'][i]}/cancel/",
+                 iterations=len(pending['cancel'])),
+        Scenario('complete', 'post', lambda i: f"/api/appointments/{pending['complete'][i]}/complete/",
+                 body=lambda i: {'notes': 'Benchmark', 'prescription': ''},
+                 iterations=len(pending['complete'])),
+        Scenario('bulk_confirm', 'post', fixed('/api/appointments/bulk_confirm/'),
+                 body=lambda i: {'ids': bulk_pending['bulk_confirm'][i * batch_size:(i + 1) * batch_size]},
+                 iterations=len(bulk_pending['bulk_confirm']) // batch_size),
+        Scenario('bulk_cancel', 'post', fixed('/api/appointments/bulk_cancel/'),
+                 body=lambda i: {'ids': bulk_pending['bulk_cancel'][i * batch_size:(i + 1) * batch_size]},
+                 iterations=len(bulk_pending['bulk_cancel']) // batch_size),
+
+        # Accounts; password hashing dominates, so fewer rounds
+        Scenario('register', 'post', fixed('/api/register/'),
+                 body=lambda i: {
+                     'username': f'{USER_PREFIX}{run_id}-{i}',
+                     'email': f'register-{run_id}-{i}@{EMAIL_DOMAIN}',
+                     'password': BENCH_PASSWORD,
+                 },
+                 expect=(201,), iterations=min(iterations, 10)),
+        Scenario('login', 'post', fixed('/api/login/'),
+                 body=fixed({'username': BENCH_USERNAME, 'password': BENCH_PASSWORD}),
+                 iterations=min(iterations, 10)),
+    ]
+    # Drop writes whose targets ran out on a small dataset
+    return [scenario for scenario in scenarios if scenario.iterations != 0]
+
+
+# ==================== benchmarks/rendering.py ====================
+import statistics
+import time
+from rest_framework.renderers import JSONRenderer
+from appointments.fieldsets import render_rows, row_plan
+from appointments.models import Appointment
+from appointments.renderers import FastJSONRenderer
+from appointments.serializers import AppointmentListSerializer, AppointmentSerializer
+
+
+def _full(rows):
+    return JSONRenderer().render(AppointmentSerializer(Appointment.objects.with_related()[:rows], many=True).data)
+
+
+def _compact(rows):
+    return JSONRenderer().render(
+        AppointmentListSerializer(Appointment.objects.with_related()[:rows], many=True).data
+    )
+
+
+def _compact_fast(rows):
+    return FastJSONRenderer().render(
+        AppointmentListSerializer(Appointment.objects.with_related()[:rows], many=True).data
+    )
+
+
+def _values_fast(rows):
+    plan = row_plan(AppointmentListSerializer())
+    queryset = Appointment.objects.values(*[lookup for _, lookup, _ in plan])[:rows]
+    return FastJSONRenderer().render(render_rows(plan, queryset))
+
+
+# From the list response as it was to the fast path, one step at a time
+CASES = {
+    'full_serializer_drf_json': _full,
+    'list_serializer_drf_json': _compact,
+    'list_serializer_fast_json': _compact_fast,
+    'values_rows_fast_json': _values_fast,
+}
+
+
+def compare_renderers(rows=1000, repeat=10):
+    """Time query + serialize + render of ``rows`` appointments for each case in CASES."""
+    results = {}
+    for name, case in CASES.items():
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            body = case(rows)
+            timings.append((time.perf_counter() - started) * 1000)
+        results[name] = {
+            'rows': rows,
+            'p50_ms': round(statistics.median(timings), 3),
+            'min_ms': round(min(timings), 3),
+            'bytes': len(body),
+        }
+    return results
+
+
+# ==================== benchmarks/runner.py ====================
+import json
+import platform
+import re
+import statistics
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+import django
+from django.db import connection
+from django.test import Client, override_settings
+
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def _percentiles(latencies):
+    if len(latencies) > 1:
+        cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+    else:
+        cuts = latencies * 99
+    return {'p50_ms': round(cuts[49], 3), 'p95_ms': round(cuts[94], 3), 'p99_ms': round(cuts[98], 3)}
+
+
+def _send(client, scenario, index, headers):
+    kwargs = dict(headers)
+    if scenario.body is not None:
+        kwargs['data'] = json.dumps(scenario.body(index))
+        kwargs['content_type'] = 'application/json'
+    started = time.perf_counter()
+    response = getattr(client, scenario.method)(scenario.path(index), **kwargs)
+    if getattr(response, 'streaming', False):
+        # Exports stream; the request is not finished until the body is drained
+        for _ in response.streaming_content:
+            pass
+    elapsed = (time.perf_counter() - started) * 1000
+    match = SERVER_TIMING_QUERIES.search(response.get('Server-Timing', ''))
+    return response.status_code, elapsed, int(match.group(1)) if match else None
+
+
+def run_scenario(scenario, token, iterations):
+    """Drive one scenario through the full middleware stack and summarise it.
+
+    Each worker thread gets its own test client and database connection. Query
+    counts come from the Server-Timing header the metrics middleware adds.
+    """
+    total = scenario.iterations if scenario.iterations is not None else iterations
+    concurrency = max(1, min(scenario.concurrency, total))
+    if connection.vendor == 'sqlite':
+        # SQLite serialises writers on a file lock; parallel writes only measure lock timeouts
+        concurrency = 1
+    headers = {'HTTP_AUTHORIZATION': f'Token {token}'} if scenario.auth else {}
+    samples = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(concurrency)
+    indexes = iter(range(total))
+
+    def next_index():
+        with lock:
+            return next(indexes, None)
+
+    def worker():
+        # Server errors count against the scenario instead of killing the thread
+        client = Client(raise_request_exception=False)
+        own = []
+        try:
+            barrier.wait()
+            if scenario.contended:
+                # Every thread fires at the same target, then they regroup for the next
+                for index in range(total):
+                    own.append(_send(client, scenario, index, headers))
+                    barrier.wait()
+            else:
+                index = next_index()
+                while index is not None:
+                    own.append(_send(client, scenario, index, headers))
+                    index = next_index()
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connection.close()
+        with lock:
+            samples.extend(own)
+
+    started = time.perf_counter()
+    if concurrency == 1:
+        worker()
+    else:
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - started
+
+    statuses = Counter(code for code, _, _ in samples)
+    queries = [count for _, _, count in samples if count is not None]
+    result = {
+        'requests': len(samples),
+        'concurrency': concurrency,
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        **_percentiles([ms for _, ms, _ in samples]),
+        'mean_queries': round(statistics.fmean(queries), 2) if queries else None,
+        'max_queries': max(queries) if queries else None,
+        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+        'errors': sum(count for code, count in statuses.items() if code not in scenario.expect),
+    }
+    return result
+
+
+def run(scenarios, token, iterations, meta=None, progress=None):
+    """Run ``scenarios`` in order and return the JSON-ready report."""
+    report = {
+        'meta': {
+            'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'iterations': iterations,
+            **(meta or {}),
+        },
+        'scenarios': {},
+    }
+    with override_settings(METRICS_SERVER_TIMING=True):
+        for scenario in scenarios:
+            result = run_scenario(scenario, token, iterations)
+            report['scenarios'][scenario.name] = result
+            if progress:
+                progress(scenario.name, result)
+    return report
+
+
+def compare(report, baseline, tolerance=0.2):
+    """Return one line per regression against an earlier report.
+
+    A scenario regresses when its p95 latency exceeds the baseline by more than
+    ``tolerance`` (a fraction), or when it needs more queries than before.
+    """
+    regressions = []
+    for name, result in report['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if before is None:
+            continue
+        if result['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {before['p95_ms']} ms -> {result['p95_ms']} ms"
+            )
+        if (result['max_queries'] or 0) > (before['max_queries'] or 0):
+            regressions.append(
+                f"{name}: queries {before['max_queries']} -> {result['max_queries']}"
+            )
+    return regressions
+
+
+# ==================== appointments/management/commands/archive_appointments.py ====================
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from appointments.archive import ARCHIVABLE_STATUSES, CHUNK_SIZE, archivable, archive_before
+
+
+class Command(BaseCommand):
+    help = 'Move completed and cancelled appointments dated before --before into the archive table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', required=True, help='YYYY-MM-DD; appointments before this date are moved')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Rows moved per transaction')
+        parser.add_argument('--statuses', default=','.join(ARCHIVABLE_STATUSES),
+                            help='Comma-separated statuses to archive')
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between chunks, to go easy on a busy database')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows that would move')
+
+    def handle(self, *args, **options):
+        try:
+            before = parse_date(options['before'])
+        except ValueError:
+            before = None
+        if before is None:
+            raise CommandError('--before must be in YYYY-MM-DD format')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+        statuses = [value.strip() for value in options['statuses'].split(',') if value.strip()]
+        unknown = set(statuses) - set(ARCHIVABLE_STATUSES)
+        if unknown or not statuses:
+            raise CommandError(f"--statuses must be drawn from {', '.join(ARCHIVABLE_STATUSES)}")
+
+        if options['dry_run']:
+            count = archivable(before, statuses).count()
+            self.stdout.write(f'{count} appointments before {before} would be archived')
+            return
+
+        moved = archive_before(
+            before,
+            chunk_size=options['chunk_size'],
+            statuses=statuses,
+            pause=options['pause'],
+            progress=lambda total: self.stdout.write(f'  {total} moved'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} appointments dated before {before}'))
+
+
+# ==================== appointments/management/commands/benchmark_connections.py ====================
+import statistics
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.db.backends.signals import connection_created
+from django.test import Client
+from appointments.models import Patient
+
+# (label, CONN_MAX_AGE, CONN_HEALTH_CHECKS)
+MODES = [
+    ('new connection per request', 0, False),
+    ('persistent', 600, False),
+    ('persistent + health checks', 600, True),
+]
+
+
+class Command(BaseCommand):
+    help = 'Measure per-request latency with and without persistent database connections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', help='Endpoint to request; defaults to by_email for the first patient')
+        parser.add_argument('--requests', type=int, default=500)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not path:
+            email = Patient.objects.order_by('id').values_list('email', flat=True).first()
+            if email is None:
+                raise CommandError('No patients to look up; pass --path or create a patient first')
+            path = f'/api/patients/by_email/?email={email}'
+
+        client = Client()
+        settings_dict = connection.settings_dict
+        original = settings_dict['CONN_MAX_AGE'], settings_dict['CONN_HEALTH_CHECKS']
+        opened = []
+
+        def count_connection(sender, **kwargs):
+            opened.append(1)
+
+        connection_created.connect(count_connection)
+        self.stdout.write(f"{connection.vendor}: {options['requests']} requests to {path}")
+        try:
+            for label, max_age, health_checks in MODES:
+                settings_dict['CONN_MAX_AGE'] = max_age
+                settings_dict['CONN_HEALTH_CHECKS'] = health_checks
+                connection.close()
+                opened.clear()
+                client.get(path)  # warm up outside the timings
+
+                latencies = []
+                for _ in range(options['requests']):
+                    began = time.perf_counter()
+                    # The test client skips the request_started/finished connection
+                    # handling, so run it here exactly as a real request would
+                    close_old_connections()
+                    response = client.get(path)
+                    close_old_connections()
+                    latencies.append((time.perf_counter() - began) * 1000)
+                if response.status_code != 200:
+                    raise CommandError(f'{path} returned {response.status_code}')
+
+                cuts = statistics.quantiles(latencies, n=100)
+                self.stdout.write(
+                    f'{label:28} mean {statistics.mean(latencies):6.2f} ms  '
+                    f'p50 {cuts[49]:6.2f} ms  p95 {cuts[94]:6.2f} ms  '
+                    f'connections opened {len(opened)}'
+                )
+        finally:
+            connection_created.disconnect(count_connection)
+            settings_dict['CONN_MAX_AGE'], settings_dict['CONN_HEALTH_CHECKS'] = original
+            connection.close()
+
+
+# ==================== appointments/management/commands/benchmark_queries.py ====================
+import json
+import statistics
+import time
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from appointments.models import ACTIVE_STATUSES, Appointment, Doctor, Patient
+from benchmarks.data import generate
+
+
+class Command(BaseCommand):
+    help = 'Seed benchmark data and report EXPLAIN plans and latencies for the hot queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true', help='Insert benchmark data first')
+        parser.add_argument('--doctors', type=int, default=200)
+        parser.add_argument('--patients', type=int, default=50000)
+        parser.add_argument('--appointments', type=int, default=500000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--no-explain', action='store_true')
+        parser.add_argument('--output', help='Write latencies to this JSON file')
+        parser.add_argument('--compare', help='Compare latencies against an earlier --output file')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.seed(options['doctors'], options['patients'], options['appointments'])
+
+        doctor = Doctor.objects.order_by('id').first()
+        patient = Patient.objects.order_by('id').first()
+        if doctor is None or patient is None:
+            raise CommandError('No data to benchmark, run with --seed first')
+        day = Appointment.objects.filter(doctor=doctor).values_list(
+            'appointment_date', flat=True
+        ).first() or date.today()
+
+        # Each case mirrors the query an endpoint issues
+        cases = {
+            'available_slots': Appointment.objects.filter(
+                doctor=doctor, appointment_date=day, status__in=ACTIVE_STATUSES
+            ).values_list('appointment_time', flat=True),
+            'list_by_patient': Appointment.objects.filter(patient_id=patient.id)[:10],
+            'list_by_doctor': Appointment.objects.filter(doctor_id=doctor.id)[:10],
+            'list_by_status': Appointment.objects.filter(status='pending')[:10],
+            'count_by_status': Appointment.objects.filter(status='pending'),
+            'patient_by_email': Patient.objects.filter(email_normalized=patient.email_normalized),
+        }
+
+        results = {}
+        for name, queryset in cases.items():
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                if name.startswith('count_'):
+                    queryset.count()
+                else:
+                    list(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = {
+                'p50_ms': round(statistics.median(timings), 3),
+                'max_ms': round(max(timings), 3),
+            }
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(f"  p50 {results[name]['p50_ms']} ms, max {results[name]['max_ms']} ms")
+            if not options['no_explain']:
+                for line in queryset.explain().splitlines():
+                    self.stdout.write(f'    {line}')
+
+        if options['compare']:
+            with open(options['compare']) as fh:
+                baseline = json.load(fh)
+            self.stdout.write(self.style.MIGRATE_HEADING('Compared to baseline (p50)'))
+            for name, result in results.items():
+                if name in baseline:
+                    before = baseline[name]['p50_ms']
+                    self.stdout.write(f"  {name}: {before} ms -> {result['p50_ms']} ms")
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+
+    def seed(self, n_doctors, n_patients, n_appointments):
+        # Same deterministic dataset as run_benchmarks, so plans and timings line up
+        try:
+            generate(doctors=n_doctors, patients=n_patients, appointments=n_appointments)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {n_doctors} doctors, {n_patients} patients, {n_appointments} appointments'
+        ))
+
+
+# ==================== appointments/management/commands/rebuild_dashboard_counters.py ====================
+from django.core.management.base import BaseCommand
+from appointments.stats import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Recount the dashboard counters from the appointment, doctor and patient tables'
+
+    def handle(self, *args, **options):
+        written = rebuild_counters()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} dashboard counters'))
+
+
+# ==================== appointments/management/commands/export_data.py ====================
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from appointments.exports import EXPORT_FORMATS, appointment_rows, patient_rows, render
+
+
+class Command(BaseCommand):
+    help = 'Stream appointments or patients to CSV or NDJSON with constant memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=['appointments', 'patients'])
+        parser.add_argument('--format', dest='export_format', choices=list(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--output', help='File to write, defaults to stdout')
+        parser.add_argument('--start', help='YYYY-MM-DD')
+        parser.add_argument('--end', help='YYYY-MM-DD')
+        parser.add_argument('--status')
+        parser.add_argument('--doctor-id')
+        parser.add_argument('--patient-id')
+
+    def handle(self, *args, **options):
+        build_rows = appointment_rows if options['dataset'] == 'appointments' else patient_rows
+        try:
+            headers, rows = build_rows(options)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        out = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+        try:
+            for chunk in render(headers, rows, options['export_format']):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+
+# ==================== appointments/management/commands/import_hospital_data.py ====================
+from django.core.management.base import BaseCommand, CommandError
+from appointments.importer import BATCH_SIZE, HospitalImporter
+
+
+class Command(BaseCommand):
+    help = 'Bulk-load doctors, time slots and historical appointments from CSV or JSON-lines files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', help='name, specialty, email, phone, qualification, '
+                                              'experience_years, consultation_fee, is_available')
+        parser.add_argument('--time-slots', help='doctor_email (or doctor_id), time, is_available')
+        parser.add_argument('--appointments', help='patient_name, patient_email, patient_phone, '
+                                                   'doctor_email (or doctor_id), appointment_date, '
+                                                   'appointment_time, status, reason, notes, prescription')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        kinds = [kind for kind in ('doctors', 'time_slots', 'appointments') if options[kind]]
+        if not kinds:
+            raise CommandError('Pass at least one of --doctors, --time-slots or --appointments')
+
+        progress = self._progress if options['verbosity'] > 1 else None
+        importer = HospitalImporter(batch_size=options['batch_size'], progress=progress)
+        # Doctors first, so slots and appointments in the same run can reference them
+        for kind in kinds:
+            try:
+                report = importer.run(kind, options[kind])
+            except (OSError, ValueError) as exc:
+                importer.finish()
+                raise CommandError(str(exc))
+            self.stdout.write(self.style.SUCCESS(
+                f'{kind}: {report.rows} rows in {report.elapsed:.1f}s '
+                f'({report.rows_per_second:,.0f} rows/s), '
+                f'{report.written} written, {report.rejected} rejected'
+            ))
+            for row_number, message in sorted(report.errors):
+                self.stderr.write(f'  row {row_number}: {message}')
+            if report.rejected > len(report.errors):
+                self.stderr.write(f'  ... and {report.rejected - len(report.errors)} more')
+        importer.finish()
+
+    def _progress(self, report):
+        self.stdout.write(f'  {report.kind}: {report.rows} rows read')
+
+
+# ==================== appointments/management/commands/rebuild_patient_search.py ====================
+from django.core.management.base import BaseCommand
+from appointments.models import Patient
+
+
+class Command(BaseCommand):
+    help = 'Backfill the normalized email and phone columns used by patient search'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        batch = []
+        updated = 0
+        for patient in Patient.objects.only('id', 'email', 'phone').order_by('id').iterator(
+            chunk_size=options['batch_size']
+        ):
+            patient.set_search_fields()
+            batch.append(patient)
+            if len(batch) >= options['batch_size']:
+                Patient.objects.bulk_update(batch, ['email_normalized', 'phone_digits'])
+                updated += len(batch)
+                batch = []
+        if batch:
+            Patient.objects.bulk_update(batch, ['email_normalized', 'phone_digits'])
+            updated += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'Updated search columns for {updated} patients'))
+
+
+# ==================== appointments/management/commands/generate_slot_calendar.py ====================
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from appointments.slot_calendar import generate_calendar
+
+
+class Command(BaseCommand):
+    help = 'Fill the slot calendar ahead from doctor schedules, time slots and leave'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First day to generate (YYYY-MM-DD), defaults to today')
+        parser.add_argument('--days', type=int, default=getattr(settings, 'SLOT_CALENDAR_DAYS_AHEAD', 60))
+        parser.add_argument('--doctor', type=int, action='append', help='Only this doctor id (repeatable)')
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Regenerate existing days, e.g. after schedule or leave changes'
+        )
+
+    def handle(self, *args, **options):
+        start = parse_date(options['start']) if options['start'] else timezone.localdate()
+        if start is None:
+            raise CommandError('--start must be in YYYY-MM-DD format')
+        end = start + timedelta(days=options['days'] - 1)
+        created = generate_calendar(start, end, doctor_ids=options['doctor'], rebuild=options['rebuild'])
+        self.stdout.write(self.style.SUCCESS(f'Generated {created} slots from {start} to {end}'))
+
+
+# ==================== appointments/management/commands/load_test_booking.py ====================
+import json
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib import error, request as urlrequest
+from django.core.management.base import BaseCommand, CommandError
+from appointments.models import ACTIVE_STATUSES, Appointment
+
+
+class Command(BaseCommand):
+    help = 'Fire concurrent bookings for one slot at a running server and check exactly one wins'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000', help='Base URL of the running server')
+        parser.add_argument('--doctor', type=int, required=True)
+        parser.add_argument('--date', required=True, help='YYYY-MM-DD')
+        parser.add_argument('--time', required=True, help='One of the doctor\'s time slots, e.g. 10:00')
+        parser.add_argument('--requests', type=int, default=200)
+
+    def handle(self, *args, **options):
+        endpoint = options['url'].rstrip('/') + '/api/appointments/'
+        start = threading.Event()
+
+        def book(i):
+            body = json.dumps({
+                'patient_name': f'Load Test {i}',
+                'email': f'load.test{i}@example.com',
+                'phone': '+1555' + str(i).zfill(7),
+                'doctor_id': options['doctor'],
+                'appointment_date': options['date'],
+                'appointment_time': options['time'],
+                'reason': 'Concurrency load test',
+            }).encode()
+            req = urlrequest.Request(endpoint, data=body, headers={'Content-Type': 'application/json'})
+            start.wait()
+            try:
+                with urlrequest.urlopen(req) as response:
+                    return response.status
+            except error.HTTPError as exc:
+                return exc.code
+            except OSError as exc:
+                return f'connection error ({exc})'
+
+        with ThreadPoolExecutor(max_workers=options['requests']) as pool:
+            futures = [pool.submit(book, i) for i in range(options['requests'])]
+            start.set()
+            statuses = Counter(future.result() for future in futures)
+
+        self.stdout.write(f'Responses: {dict(statuses)}')
+        booked = Appointment.objects.filter(
+            doctor_id=options['doctor'],
+            appointment_date=options['date'],
+            appointment_time=options['time'],
+            status__in=ACTIVE_STATUSES
+        ).count()
+        self.stdout.write(f'Active bookings for the slot: {booked}')
+
+        if statuses.get(201, 0) > 1 or booked > 1:
+            raise CommandError('Slot was double-booked')
+        if set(statuses) - {201, 409}:
+            raise CommandError('Unexpected responses, expected only 201 and 409')
+        self.stdout.write(self.style.SUCCESS('At most one booking won the slot, the rest got 409'))
+
+
+# ==================== appointments/management/commands/load_test_reads.py ====================
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib import error, request as urlrequest
+from django.core.management.base import BaseCommand, CommandError
+
+# The sync DRF endpoint and its async twin for each read scenario
+SCENARIOS = {
+    'available_slots': ('/api/doctors/{doctor}/available_slots/?date={date}',
+                        '/api/async/doctors/{doctor}/available_slots/?date={date}'),
+    'doctors': ('/api/doctors/', '/api/async/doctors/'),
+    'by_email': ('/api/patients/by_email/?email={email}', '/api/async/patients/by_email/?email={email}'),
+    'dashboard_stats': ('/api/dashboard-stats/', '/api/async/dashboard-stats/'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Compare throughput and latency of the read endpoints on a WSGI and an ASGI server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi-url', default='http://localhost:8000',
+                            help='Server started with runserver or gunicorn')
+        parser.add_argument('--asgi-url', default='http://localhost:8001',
+                            help='Server started with uvicorn hospital_appointment.asgi:application')
+        parser.add_argument('--scenario', choices=list(SCENARIOS), action='append',
+                            help='Repeat to pick several; defaults to all')
+        parser.add_argument('--doctor', type=int, default=1)
+        parser.add_argument('--date', default='2025-10-20')
+        parser.add_argument('--email', default='john@email.com')
+        parser.add_argument('--token', help='API token, needed for dashboard_stats')
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        headers = {'Authorization': f"Token {options['token']}"} if options['token'] else {}
+        params = {key: options[key] for key in ('doctor', 'date', 'email')}
+        for name in options['scenario'] or list(SCENARIOS):
+            sync_path, async_path = SCENARIOS[name]
+            for label, base, path in (
+                ('wsgi', options['wsgi_url'], sync_path),
+                ('asgi', options['asgi_url'], async_path),
+            ):
+                url = base.rstrip('/') + path.format(**params)
+                result = self.run_scenario(url, headers, options['concurrency'], options['requests'])
+                self.stdout.write(
+                    f"{name:16} {label}  {result['throughput']:8.1f} req/s  "
+                    f"p50 {result['p50']:7.1f} ms  p99 {result['p99']:7.1f} ms  {result['statuses']}"
+                )
+
+    def run_scenario(self, url, headers, concurrency, total):
+        start = threading.Event()
+
+        def fetch(_):
+            req = urlrequest.Request(url, headers=headers)
+            start.wait()
+            began = time.perf_counter()
+            try:
+                with urlrequest.urlopen(req) as response:
+                    response.read()
+                    code = response.status
+            except error.HTTPError as exc:
+                code = exc.code
+            except OSError as exc:
+                code = f'connection error ({exc.__class__.__name__})'
+            return code, (time.perf_counter() - began) * 1000
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [pool.submit(fetch, i) for i in range(total)]
+            began = time.perf_counter()
+            start.set()
+            results = [future.result() for future in futures]
+            elapsed = time.perf_counter() - began
+
+        statuses = Counter(code for code, _ in results)
+        if set(statuses) == {404} or not any(code == 200 for code in statuses):
+            raise CommandError(f'{url} returned {dict(statuses)}; check the server and the --doctor/--email/--token values')
+        latencies = [ms for code, ms in results if code == 200]
+        cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        return {
+            'throughput': total / elapsed,
+            'p50': cuts[49],
+            'p99': cuts[98],
+            'statuses': dict(statuses),
+        }
+
+
+# ==================== appointments/management/commands/run_benchmarks.py ====================
+import json
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from benchmarks import data, runner
+from benchmarks.rendering import compare_renderers
+from benchmarks.scenarios import build_scenarios
+
+
+class Command(BaseCommand):
+    help = 'Run the scripted endpoint benchmarks and compare them against a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--generate', action='store_true', help='Regenerate the benchmark dataset first')
+        parser.add_argument('--doctors', type=int, default=50)
+        parser.add_argument('--patients', type=int, default=5000)
+        parser.add_argument('--appointments', type=int, default=50000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--anchor', default=data.DEFAULT_ANCHOR.isoformat(),
+                            help='YYYY-MM-DD the dataset is centred on')
+        parser.add_argument('--iterations', type=int, default=50, help='Requests per scenario')
+        parser.add_argument('--scenario', action='append', help='Repeat to pick several; defaults to all')
+        parser.add_argument('--list', action='store_true', help='List the scenarios and exit')
+        parser.add_argument('--rendering', type=int, metavar='ROWS',
+                            help='Also compare list serializers and JSON renderers on this many appointments')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='Flag regressions against an earlier --output file')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed p95 slowdown before flagging, as a fraction')
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        try:
+            anchor = date.fromisoformat(options['anchor'])
+        except ValueError:
+            raise CommandError('Anchor must be in YYYY-MM-DD format')
+
+        if options['generate']:
+            try:
+                counts = data.generate(
+                    doctors=options['doctors'], patients=options['patients'],
+                    appointments=options['appointments'], seed=options['seed'], anchor=anchor,
+                )
+            except ValueError as exc:
+                raise CommandError(str(exc))
+            self.stdout.write(self.style.SUCCESS(
+                'Generated ' + ', '.join(f'{count} {name}' for name, count in counts.items())
+            ))
+
+        try:
+            dataset = data.Dataset(anchor)
+        except LookupError as exc:
+            raise CommandError(f'{exc} (run with --generate)')
+        scenarios = build_scenarios(dataset, options['iterations'])
+        if options['list']:
+            for scenario in scenarios:
+                self.stdout.write(f"{scenario.name:26} {scenario.method.upper():5} {scenario.path(0)}")
+            return
+        if options['scenario']:
+            unknown = set(options['scenario']) - {scenario.name for scenario in scenarios}
+            if unknown:
+                raise CommandError(f"Unknown scenario: {', '.join(sorted(unknown))}")
+            scenarios = [scenario for scenario in scenarios if scenario.name in options['scenario']]
+
+        def progress(name, result):
+            self.stdout.write(
+                f"{name:26} {result['throughput_rps']:8.1f} req/s  p50 {result['p50_ms']:7.1f}  "
+                f"p95 {result['p95_ms']:7.1f}  p99 {result['p99_ms']:7.1f} ms  "
+                f"queries {result['max_queries']}  {result['statuses']}"
+            )
+
+        report = runner.run(scenarios, dataset.token, options['iterations'], meta={
+            'seed': options['seed'],
+            'anchor': anchor.isoformat(),
+        }, progress=progress)
+
+        if options['rendering']:
+            report['rendering'] = compare_renderers(options['rendering'])
+            for name, result in report['rendering'].items():
+                self.stdout.write(
+                    f"{name:26} {result['rows']} rows  p50 {result['p50_ms']:8.1f} ms  {result['bytes']} bytes"
+                )
+
+        failed = [name for name, result in report['scenarios'].items() if result['errors']]
+        if failed:
+            self.stdout.write(self.style.WARNING(f"Unexpected responses in: {', '.join(failed)}"))
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(report, fh, indent=2)
+
+        if options['compare']:
+            with open(options['compare']) as fh:
+                baseline = json.load(fh)
+            regressions = runner.compare(report, baseline, options['tolerance'])
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+                return
+            self.stdout.write(self.style.ERROR('Regressions against the baseline:'))
+            for line in regressions:
+                self.stdout.write(f'  {line}')
+            if options['fail_on_regression']:
+                raise CommandError(f'{len(regressions)} regression(s)')
+
+
+# ==================== appointments/management/commands/run_workers.py ====================
+import multiprocessing
+import os
+import signal
+import socket
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from appointments.jobs import prune, queue_stats, work
+
+
+def _run(worker_id, options, stop):
+    # Forked children must not share the parent's database connections
+    connections.close_all()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        work(worker_id, options['batch_size'], options['poll_interval'], stop, options['once'])
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Run background job workers: notifications and other side effects queued by requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2)
+        parser.add_argument('--batch-size', type=int, default=100, help='Jobs claimed per round trip')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when idle')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+        parser.add_argument('--prune-days', type=int, default=7,
+                            help='Delete finished jobs older than this on start; 0 keeps them')
+        parser.add_argument('--stats', action='store_true', help='Print job counts by status and exit')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            for job_status, count in queue_stats().items():
+                self.stdout.write(f'{job_status:8} {count}')
+            return
+        if options['processes'] < 1:
+            raise CommandError('--processes must be at least 1')
+        if options['prune_days']:
+            self.stdout.write(f"Pruned {prune(options['prune_days'])} finished jobs")
+
+        host = f'{socket.gethostname()}-{os.getpid()}'
+        if options['processes'] == 1:
+            processed = work(host, options['batch_size'], options['poll_interval'], None, options['once'])
+            self.stdout.write(self.style.SUCCESS(f'Processed {processed} jobs'))
+            return
+
+        # fork keeps the configured Django state; the workers reconnect on their own
+        context = multiprocessing.get_context('fork')
+        stop = context.Event()
+        connections.close_all()
+        workers = [
+            context.Process(target=_run, args=(f'{host}-{index}', options, stop), daemon=True)
+            for index in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        previous = signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        self.stdout.write(f"Started {len(workers)} workers")
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            # Let every worker finish the batch it holds before exiting
+            stop.set()
+            for worker in workers:
+                worker.join()
+        finally:
+            signal.signal(signal.SIGTERM, previous)
+        self.stdout.write(self.style.SUCCESS('Workers stopped'))
+
+
+# ==================== pytest.ini ====================
+"""
+[pytest]
+DJANGO_SETTINGS_MODULE = hospital_appointment.settings
+python_files = tests.py test_*.py
+addopts = --reuse-db
+"""
+
+
+# ==================== appointments/tests/__init__.py ====================
+"""Tests for the appointments app; run ``pytest`` from the project root (see pytest.ini).
+
+Set DB_ENGINE=django.db.backends.sqlite3 to run them without PostgreSQL.
+"""
+
+
+# ==================== appointments/tests/helpers.py ====================
+import csv
+import json
+import os
+import tempfile
+from datetime import timedelta
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from appointments.authentication import token_cache
+from appointments.models import Appointment, Doctor, Patient, TimeSlot
+
+TIMES = [time for time, _ in TimeSlot.TIME_CHOICES]
+
+
+def future_day(offset=0):
+    return timezone.localdate() + timedelta(days=30 + offset)
+
+
+def make_doctor(name='Dr. Grey', specialty='cardiology', email='grey@hospital.test'):
+    doctor = Doctor.objects.create(name=name, specialty=specialty, email=email, phone='+1234567890')
+    TimeSlot.objects.bulk_create(TimeSlot(doctor=doctor, time=time) for time in TIMES)
+    return doctor
+
+
+def make_patient(index=0):
+    return Patient.objects.create(
+        full_name=f'Patient {index}', email=f'patient{index}@example.com', phone='+1234567890'
+    )
+
+
+def make_appointments(doctor, patient, count, status='pending', day_offset=0):
+    """``count`` appointments filling the doctor's slots day by day from ``future_day(day_offset)``."""
+    return Appointment.objects.bulk_create(
+        Appointment(
+            patient=patient, doctor=doctor,
+            appointment_date=future_day(day_offset + index // len(TIMES)),
+            appointment_time=TIMES[index % len(TIMES)],
+            reason='Checkup', status=status,
+        )
+        for index in range(count)
     )
 
 
-@api_view(['GET'])
-def dashboard_stats(request):
-    total_appointments = Appointment.objects.count()
-    pending_appointments = Appointment.objects.filter(status='pending').count()
-    confirmed_appointments = Appointment.objects.filter(status='confirmed').count()
-    total_doctors = Doctor.objects.count()
-    total_patients = Patient.objects.count()
-    
-    return Response({
-        'total_appointments': total_appointments,
-        'pending': pending_appointments,
-        'confirmed': confirmed_appointments,
-        'total_doctors': total_doctors,
-        'total_patients': total_patients
-    })
+class AppointmentsTestCase(APITestCase):
+    """Starts every test with empty process-level caches (directory, token)."""
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+
+    def write_records(self, name, records):
+        """Write ``records`` to a temporary .csv or .jsonl file named ``name``; returns its path."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, name)
+        with open(path, 'w', newline='', encoding='utf-8') as handle:
+            if name.endswith('.csv'):
+                writer = csv.DictWriter(handle, fieldnames=list(records[0]))
+                writer.writeheader()
+                writer.writerows(records)
+            else:
+                handle.writelines(json.dumps(record) + '\n' for record in records)
+        return path
+
+
+# ==================== appointments/tests/test_queries.py ====================
+from appointments.models import Appointment
+from .helpers import AppointmentsTestCase, make_appointments, make_doctor, make_patient
+
+# Query budgets for the hot appointment endpoints. A change that adds a query per
+# row (a missing select_related/only) or per request shows up here as a failure.
+LIST_QUERIES = 2  # COUNT + one joined page
+RETRIEVE_QUERIES = 1
+# Load, conditional UPDATE, savepoint + release (BEGIN/COMMIT outside TestCase), plus a
+# notification job insert for confirm/cancel and the waitlist lookup for cancel
+TRANSITION_QUERIES = {'confirm': 5, 'cancel': 6, 'complete': 4}
+
+
+class AppointmentQueryCountTests(AppointmentsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.doctor = make_doctor()
+        self.patient = make_patient()
+
+    def assert_list_queries(self, rows, params=''):
+        make_appointments(self.doctor, self.patient, rows)
+        with self.assertNumQueries(LIST_QUERIES):
+            response = self.client.get(f'/api/appointments/{params}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_list_small_page(self):
+        data = self.assert_list_queries(2)
+        self.assertEqual(len(data['results']), 2)
+
+    def test_list_full_page(self):
+        data = self.assert_list_queries(25)
+        self.assertEqual(data['count'], 25)
+        self.assertEqual(len(data['results']), 10)
+
+    def test_list_with_fields_does_not_add_queries(self):
+        data = self.assert_list_queries(12, '?fields=id,patient_name,doctor_name,reason')
+        self.assertEqual(set(data['results'][0]), {'id', 'patient_name', 'doctor_name', 'reason'})
+
+    def test_cursor_list_page_sizes(self):
+        make_appointments(self.doctor, self.patient, 25)
+        with self.assertNumQueries(1):
+            first = self.client.get('/api/appointments/?pagination=cursor').json()
+        with self.assertNumQueries(1):
+            second = self.client.get(first['next']).json()
+        self.assertEqual(len(first['results']) + len(second['results']), 20)
+
+    def test_retrieve(self):
+        appointment, = make_appointments(self.doctor, self.patient, 1)
+        with self.assertNumQueries(RETRIEVE_QUERIES):
+            response = self.client.get(f'/api/appointments/{appointment.id}/')
+        self.assertEqual(response.json()['patient_name'], self.patient.full_name)
+
+    def assert_transition_queries(self, verb, status, start='pending'):
+        appointment, = make_appointments(self.doctor, self.patient, 1, status=start)
+        with self.assertNumQueries(TRANSITION_QUERIES[verb]):
+            response = self.client.post(f'/api/appointments/{appointment.id}/{verb}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Appointment.objects.get(pk=appointment.pk).status, status)
+
+    def test_confirm(self):
+        self.assert_transition_queries('confirm', 'confirmed')
+
+    def test_cancel(self):
+        self.assert_transition_queries('cancel', 'cancelled', start='confirmed')
+
+    def test_complete(self):
+        self.assert_transition_queries('complete', 'completed', start='confirmed')
+
+
+# ==================== appointments/tests/test_archive.py ====================
+from io import StringIO
+from django.core.management import CommandError, call_command
+from django.test import override_settings
+from appointments.archive import archive_before
+from appointments.models import Appointment, ArchivedAppointment, DashboardCounter
+from appointments.stats import rebuild_counters
+from .helpers import (
+    TIMES, AppointmentsTestCase, future_day, make_appointments, make_doctor, make_patient,
+)
+
+
+class ArchiveTests(AppointmentsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.patient = make_patient()
+        # Two full days of finished appointments, then some that stay
+        self.finished = make_appointments(make_doctor(), self.patient, 2 * len(TIMES), status='completed')
+        self.finished[0].status = 'cancelled'
+        self.finished[0].save()
+        self.later = make_appointments(
+            make_doctor('Dr. House', 'neurology', 'house@hospital.test'), self.patient, 3,
+            status='completed', day_offset=5,
+        )
+        self.open = make_appointments(
+            make_doctor('Dr. Who', 'general', 'who@hospital.test'), self.patient, 2, status='confirmed',
+        )
+        self.before = future_day(2)
+
+    def test_moves_finished_rows_in_chunks(self):
+        progress = []
+        moved = archive_before(self.before, chunk_size=5, progress=progress.append)
+        total = len(self.finished)
+        self.assertEqual(moved, total)
+        self.assertEqual(progress, list(range(5, total, 5)) + [total])
+        self.assertEqual(
+            sorted(ArchivedAppointment.objects.values_list('id', flat=True)),
+            sorted(appointment.id for appointment in self.finished),
+        )
+        remaining = {appointment.id for appointment in self.later + self.open}
+        self.assertEqual(set(Appointment.objects.values_list('id', flat=True)), remaining)
+        self.assertEqual(archive_before(self.before), 0)
+
+    def test_archived_rows_keep_their_columns(self):
+        archive_before(self.before, statuses=['cancelled'])
+        archived = ArchivedAppointment.objects.get()
+        self.assertEqual(
+            (archived.id, archived.status, archived.patient_id, archived.appointment_time),
+            (self.finished[0].id, 'cancelled', self.patient.id, self.finished[0].appointment_time),
+        )
+
+    @override_settings(DASHBOARD_COUNTER_CACHE=True)
+    def test_counters_follow_archived_rows(self):
+        rebuild_counters()
+        archive_before(self.before, chunk_size=4)
+        counters = dict(DashboardCounter.objects.exclude(value=0).values_list('key', 'value'))
+        rebuild_counters()
+        self.assertEqual(counters, dict(DashboardCounter.objects.exclude(value=0).values_list('key', 'value')))
+        self.assertEqual(counters['appointments'], len(self.later + self.open))
+
+    def test_history_endpoint(self):
+        archive_before(self.before)
+        response = self.client.get(
+            f'/api/appointment-history/?patient_id={self.patient.id}&status=completed&start={future_day(1)}'
+        )
+        self.assertEqual(response.status_code, 200)
+        # The second day's appointments, which fit on one page
+        expected = sorted(appointment.id for appointment in self.finished[len(TIMES):])
+        self.assertEqual(sorted(row['id'] for row in response.json()['results']), expected)
+        self.assertEqual(self.client.get('/api/appointment-history/?start=soon').status_code, 400)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('archive_appointments', before=str(self.before), dry_run=True, stdout=out)
+        self.assertIn(f'{len(self.finished)} appointments', out.getvalue())
+        self.assertFalse(ArchivedAppointment.objects.exists())
+
+        call_command('archive_appointments', before=str(self.before), chunk_size=10, stdout=out)
+        self.assertIn(f'Archived {len(self.finished)} appointments', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('archive_appointments', before='2025-02-30', stdout=out)
+        with self.assertRaises(CommandError):
+            call_command('archive_appointments', before=str(self.before), statuses='pending', stdout=out)
+
+
+# ==================== appointments/tests/test_authentication.py ====================
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from appointments.authentication import token_cache
+from .helpers import AppointmentsTestCase
+
+
+class TokenCacheTests(AppointmentsTestCase):
+    """Cached tokens stop working as soon as they are revoked in this process."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('alice', 'alice@hospital.test', 'secret-pass-123')
+        self.token = self.client.post(
+            '/api/login/', {'username': 'alice', 'password': 'secret-pass-123'}, format='json'
+        ).json()['token']
+
+    def status(self, token, path='/api/dashboard-stats/'):
+        return self.client.get(path, HTTP_AUTHORIZATION=f'Token {token}').status_code
+
+    def warm(self, token):
+        self.assertEqual(self.status(token), 200)
+        self.assertEqual(self.status(token), 200)
+        self.assertGreaterEqual(token_cache.stats()['hits'], 1)
+
+    def test_repeat_requests_skip_the_token_query(self):
+        for expected in (True, False):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.status(self.token), 200)
+            self.assertEqual(any('authtoken_token' in query['sql'] for query in queries), expected)
+
+    def test_logout_revokes_cached_token(self):
+        self.warm(self.token)
+        response = self.client.post('/api/logout/', HTTP_AUTHORIZATION=f'Token {self.token}')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.status(self.token), 401)
+        self.assertEqual(self.status(self.token, '/api/async/dashboard-stats/'), 401)
+
+    def test_rotate_revokes_old_token(self):
+        self.warm(self.token)
+        response = self.client.post('/api/token/rotate/', HTTP_AUTHORIZATION=f'Token {self.token}')
+        new_token = response.json()['token']
+        self.assertNotEqual(new_token, self.token)
+        self.assertEqual(self.status(self.token), 401)
+        self.assertEqual(self.status(new_token), 200)
+
+    def test_deactivated_user_is_rejected(self):
+        self.warm(self.token)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.status(self.token), 401)
+        self.assertEqual(self.status(self.token, '/api/async/dashboard-stats/'), 401)
+
+
+# ==================== appointments/tests/test_benchmarks.py ====================
+from appointments.models import Appointment
+from benchmarks import data
+from benchmarks.runner import compare, run_scenario
+from benchmarks.scenarios import Scenario, build_scenarios
+from .helpers import AppointmentsTestCase
+
+SMALL = {'doctors': 3, 'patients': 20, 'appointments': 120}
+
+
+def snapshot():
+    return list(Appointment.objects.order_by('doctor__email', 'appointment_date', 'appointment_time').values_list(
+        'doctor__email', 'appointment_date', 'appointment_time', 'patient__email', 'status', 'reason'
+    ))
+
+
+class BenchmarkDataTests(AppointmentsTestCase):
+
+    def test_generate_is_deterministic(self):
+        self.assertEqual(data.generate(**SMALL), SMALL)
+        first = snapshot()
+        data.generate(**SMALL)
+        self.assertEqual(snapshot(), first)
+        self.assertEqual(len(first), SMALL['appointments'])
+        data.generate(seed=7, **SMALL)
+        self.assertNotEqual(snapshot(), first)
+
+    def test_scenarios_claim_distinct_targets(self):
+        data.generate(**SMALL)
+        scenarios = {scenario.name: scenario for scenario in build_scenarios(data.Dataset(), iterations=2)}
+        booking, contended = scenarios['booking'], scenarios['booking_contention']
+
+        def slot(body):
+            return body['doctor_id'], body['appointment_date'], body['appointment_time']
+
+        booked = {slot(booking.body(i)) for i in range(booking.iterations)}
+        self.assertEqual(len(booked), 2)
+        self.assertNotIn(slot(contended.body(0)), booked)
+
+    def test_run_scenario_reports_status_and_queries(self):
+        data.generate(**SMALL)
+        dataset = data.Dataset()
+        result = run_scenario(Scenario('doctors', 'get', lambda i: '/api/doctors/'), dataset.token, 3)
+        self.assertEqual((result['requests'], result['statuses'], result['errors']), (3, {'200': 3}, 0))
+        self.assertGreater(result['max_queries'], 0)
+
+
+class BenchmarkCompareTests(AppointmentsTestCase):
+
+    def report(self, p95_ms, max_queries):
+        return {'scenarios': {'list': {'p95_ms': p95_ms, 'max_queries': max_queries}}}
+
+    def test_within_tolerance_is_not_a_regression(self):
+        self.assertEqual(compare(self.report(11.9, 2), self.report(10.0, 2)), [])
+
+    def test_slower_p95_and_extra_queries_are_reported(self):
+        self.assertEqual(compare(self.report(13.0, 3), self.report(10.0, 2)), [
+            'list: p95 10.0 ms -> 13.0 ms',
+            'list: queries 2 -> 3',
+        ])
+
+    def test_new_scenarios_are_skipped(self):
+        self.assertEqual(compare(self.report(50.0, 9), {'scenarios': {}}), [])
+
+
+# ==================== appointments/tests/test_booking.py ====================
+from django.db import IntegrityError, transaction
+from appointments.importer import HospitalImporter
+from appointments.models import Appointment, Patient
+from .helpers import TIMES, AppointmentsTestCase, future_day, make_doctor, make_patient
+
+
+def booking(doctor, email, time=TIMES[0]):
+    return {
+        'patient_name': 'Someone Else', 'email': email, 'phone': '+1234567890',
+        'doctor_id': doctor.id, 'appointment_date': str(future_day()),
+        'appointment_time': time, 'reason': 'Checkup',
+    }
+
+
+class BookingConflictTests(AppointmentsTestCase):
+    """A slot holds one pending or confirmed booking; cancelling it frees the slot again."""
+
+    def setUp(self):
+        super().setUp()
+        self.doctor = make_doctor()
+
+    def book(self, email):
+        return self.client.post('/api/appointments/', booking(self.doctor, email), format='json')
 
+    def test_second_booking_of_a_slot_is_a_conflict(self):
+        self.assertEqual(self.book('first@example.com').status_code, 201)
+        response = self.book('second@example.com')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['error'], 'This time slot is no longer available')
+        self.assertEqual([slot['time'] for slot in response.json()['available_slots']], TIMES[1:])
+        self.assertEqual(Appointment.objects.get().patient.email, 'first@example.com')
 
-# ==================== appointments/urls.py ====================
-from django.urls import path, include
-from rest_framework.routers import DefaultRouter
-from . import views
+    def test_cancelled_slot_can_be_rebooked(self):
+        first = self.book('first@example.com').json()
+        self.assertEqual(self.client.post(f"/api/appointments/{first['id']}/cancel/").status_code, 200)
+        response = self.book('second@example.com')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            sorted(Appointment.objects.values_list('status', flat=True)), ['cancelled', 'pending']
+        )
+        self.assertEqual(self.book('third@example.com').status_code, 409)
 
-router = DefaultRouter()
-router.register(r'doctors', views.DoctorViewSet)
-router.register(r'patients', views.PatientViewSet)
-router.register(r'appointments', views.AppointmentViewSet)
+    def test_constraint_rejects_a_second_active_row(self):
+        # The backstop when two bookings pass the existence check at once
+        self.book('first@example.com')
+        appointment = Appointment.objects.get()
+        appointment.pk = None
+        appointment.status = 'confirmed'
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            appointment.save(force_insert=True)
 
-urlpatterns = [
-    path('', include(router.urls)),
-    path('register/', views.register_user, name='register'),
-    path('login/', views.login_user, name='login'),
-    path('dashboard-stats/', views.dashboard_stats, name='dashboard-stats'),
-]
 
+class PatientMatchingTests(AppointmentsTestCase):
+    """Bookings reuse the oldest patient whose email matches ignoring case and whitespace."""
 
-# ==================== hospital_appointment/urls.py ====================
-from django.contrib import admin
-from django.urls import path, include
-from django.conf import settings
-from django.conf.urls.static import static
+    def setUp(self):
+        super().setUp()
+        self.doctor = make_doctor()
+        self.patient = make_patient()
 
-urlpatterns = [
-    path('admin/', admin.site.urls),
-    path('api/', include('appointments.urls')),
-]
+    def payload(self, email, time=TIMES[0]):
+        return booking(self.doctor, email, time)
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    def test_booking_matches_email_case_insensitively(self):
+        response = self.client.post('/api/appointments/', self.payload('  Patient0@Example.COM'), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Patient.objects.count(), 1)
+        self.assertEqual(Appointment.objects.get().patient_id, self.patient.id)
 
+    def test_batch_matches_and_creates_by_normalized_email(self):
+        payloads = [
+            self.payload('PATIENT0@example.com', TIMES[0]),
+            self.payload('new@example.com', TIMES[1]),
+            self.payload('New@Example.com', TIMES[2]),
+        ]
+        response = self.client.post('/api/appointments/batch/', payloads, format='json')
+        self.assertEqual([result['status_code'] for result in response.json()['results']], [201] * 3)
+        self.assertEqual(Patient.objects.count(), 2)
+        patient_ids = list(Appointment.objects.order_by('appointment_time').values_list('patient_id', flat=True))
+        self.assertEqual(patient_ids[0], self.patient.id)
+        self.assertEqual(patient_ids[1], patient_ids[2])
 
-# ==================== appointments/admin.py ====================
-from django.contrib import admin
-from .models import Doctor, Patient, Appointment, TimeSlot
+    def test_import_matches_and_creates_by_normalized_email(self):
+        rows = [
+            {**self.payload(email, time), 'patient_email': email, 'patient_phone': '+1234567890',
+             'doctor_email': self.doctor.email}
+            for email, time in (('Patient0@Example.com', TIMES[0]), ('new@example.com', TIMES[1]),
+                                ('NEW@example.com ', TIMES[2]))
+        ]
+        report = HospitalImporter().run('appointments', self.write_records('appointments.jsonl', rows))
+        self.assertEqual((report.written, report.rejected), (3, 0))
+        self.assertEqual(Patient.objects.count(), 2)
+        self.assertEqual(Patient.objects.exclude(pk=self.patient.pk).get().email, 'new@example.com')
+        patient_ids = list(Appointment.objects.order_by('appointment_time').values_list('patient_id', flat=True))
+        self.assertEqual(patient_ids[0], self.patient.id)
+        self.assertEqual(patient_ids[1], patient_ids[2])
 
-@admin.register(Doctor)
-class DoctorAdmin(admin.ModelAdmin):
-    list_display = ['name', 'specialty', 'email', 'phone', 'is_available']
-    list_filter = ['specialty', 'is_available']
-    search_fields = ['name', 'email', 'phone']
 
-@admin.register(Patient)
-class PatientAdmin(admin.ModelAdmin):
-    list_display = ['full_name', 'email', 'phone', 'created_at']
-    search_fields = ['full_name', 'email', 'phone']
+# ==================== appointments/tests/test_directory_cache.py ====================
+from appointments.directory_cache import cache_stats
+from appointments.models import Doctor, TimeSlot
+from .helpers import TIMES, AppointmentsTestCase, make_doctor
 
-@admin.register(Appointment)
-class AppointmentAdmin(admin.ModelAdmin):
-    list_display = ['patient', 'doctor', 'appointment_date', 'appointment_time', 'status']
-    list_filter = ['status', 'appointment_date', 'doctor']
-    search_fields = ['patient__full_name', 'doctor__name']
 
-@admin.register(TimeSlot)
-class TimeSlotAdmin(admin.ModelAdmin):
-    list_display = ['doctor', 'time', 'is_available']
-    list_filter = ['doctor', 'is_available']
+class DirectoryCacheTests(AppointmentsTestCase):
+    """Doctor reads come from the versioned directory cache (directory_cache.py)."""
+
+    def setUp(self):
+        super().setUp()
+        self.doctors = [
+            make_doctor(f'Dr. {index}', 'general', f'doctor{index}@hospital.test') for index in range(12)
+        ]
+        self.doctor = self.doctors[0]
+
+    def stats_after(self, *urls, **headers):
+        before = cache_stats()
+        responses = [self.client.get(url, **headers) for url in urls]
+        after = cache_stats()
+        return responses, {event: after[event] - before[event] for event in after}
+
+    def test_repeat_reads_hit_the_cache(self):
+        url = f'/api/doctors/{self.doctor.id}/'
+        responses, stats = self.stats_after(url, url)
+        self.assertEqual([response.status_code for response in responses], [200, 200])
+        self.assertEqual(stats, {'hits': 1, 'misses': 1, 'not_modified': 0})
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+    def test_if_none_match_gets_304(self):
+        response = self.client.get('/api/doctors/')
+        etag = response['ETag']
+        (not_modified,), stats = self.stats_after('/api/doctors/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], etag)
+        self.assertEqual(stats, {'hits': 0, 'misses': 0, 'not_modified': 1})
+
+    def assert_invalidated(self, change):
+        url = f'/api/doctors/{self.doctor.id}/'
+        etag = self.client.get(url)['ETag']
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response.json()
+
+    def test_doctor_save_invalidates(self):
+        def rename():
+            self.doctor.name = 'Dr. Renamed'
+            self.doctor.save()
+        self.assertEqual(self.assert_invalidated(rename)['name'], 'Dr. Renamed')
+
+    def test_doctor_delete_invalidates(self):
+        self.assert_invalidated(self.doctors[-1].delete)
+        self.assertEqual(self.client.get('/api/doctors/').json()['count'], 11)
+
+    def test_time_slot_save_and_delete_invalidate(self):
+        slot = TimeSlot.objects.get(doctor=self.doctor, time=TIMES[0])
+
+        def close():
+            slot.is_available = False
+            slot.save()
+        self.assert_invalidated(close)
+        self.assert_invalidated(slot.delete)
+
+    def test_available_reflects_changes(self):
+        self.assertEqual(len(self.client.get('/api/doctors/available/').json()), 12)
+        Doctor.objects.filter(pk=self.doctor.pk).update(is_available=False)
+        # A queryset update skips the signals, so the cached list stays until something invalidates it
+        self.assertEqual(len(self.client.get('/api/doctors/available/').json()), 12)
+        self.doctor.refresh_from_db()
+        self.doctor.save()
+        self.assertEqual(len(self.client.get('/api/doctors/available/').json()), 11)
+
+    def test_list_key_ignores_host_and_unknown_parameters(self):
+        (first, second), stats = self.stats_after('/api/doctors/?page=2', '/api/doctors/?page=2&utm=x')
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+        response = self.client.get('/api/doctors/?page=2&utm=y', HTTP_HOST='other.test')
+        self.assertEqual(response.json()['results'], first.json()['results'])
+        self.assertEqual(response.json()['previous'], 'http://other.test/api/doctors/?utm=y')
+        self.assertEqual(second.json()['previous'], 'http://testserver/api/doctors/?utm=x')
+        self.assertIsNone(response.json()['next'])
+
+    def test_list_pages_and_fields_are_separate_entries(self):
+        first = self.client.get('/api/doctors/').json()
+        self.assertEqual(first['next'], 'http://testserver/api/doctors/?page=2')
+        self.assertEqual(len(first['results']), 10)
+        self.assertEqual(len(self.client.get('/api/doctors/?page=2').json()['results']), 2)
+        self.assertEqual(len(self.client.get('/api/doctors/?page=last').json()['results']), 2)
+        sparse = self.client.get('/api/doctors/?fields=id,name').json()
+        self.assertEqual(set(sparse['results'][0]), {'id', 'name'})
+
+    async def test_async_list_matches_and_relinks(self):
+        response = await self.async_client.get('/api/async/doctors/', {'page': 2, 'utm': 'x'})
+        payload = response.json()
+        self.assertEqual(len(payload['results']), 2)
+        self.assertEqual(payload['previous'], 'http://testserver/api/async/doctors/?utm=x')
+        self.assertIsNone(payload['next'])
+        again = (await self.async_client.get('/api/async/doctors/', {'page': 2, 'utm': 'z'})).json()
+        self.assertEqual(again['previous'], 'http://testserver/api/async/doctors/?utm=z')
+
+
+# ==================== appointments/tests/test_events.py ====================
+import asyncio
+import json
+from django.test import override_settings
+from appointments import events
+from appointments.events import RESYNC, SLOT_FREED, SLOT_TAKEN, LocalBroker, slot_topic
+from .helpers import TIMES, AppointmentsTestCase, future_day, make_doctor
+
+
+class RecordingBroker(LocalBroker):
+
+    def __init__(self):
+        super().__init__()
+        self.published = []
+
+    def publish(self, topic, event):
+        self.published.append((topic, event))
+        super().publish(topic, event)
+
+
+def use_broker(test, broker):
+    previous, events._broker = events._broker, broker
+    test.addCleanup(setattr, events, '_broker', previous)
+    return broker
+
+
+class LocalBrokerTests(AppointmentsTestCase):
+
+    async def test_publish_reaches_subscribers_of_the_topic(self):
+        broker = LocalBroker()
+        subscription = broker.subscribe(['slots:1:a', 'slots:1:b'], maxsize=10)
+        other = broker.subscribe(['slots:2:a'], maxsize=10)
+        self.assertEqual(broker.stats(), {'topics': 3, 'subscriptions': 2})
+        broker.publish('slots:1:b', {'id': 1})
+        self.assertEqual(await subscription.get(1), {'id': 1})
+        with self.assertRaises(asyncio.TimeoutError):
+            await other.get(0.01)
+        broker.unsubscribe(subscription)
+        broker.publish('slots:1:a', {'id': 2})
+        self.assertEqual(broker.stats(), {'topics': 1, 'subscriptions': 1})
+        self.assertTrue(subscription.queue.empty())
+
+    async def test_slow_subscriber_gets_a_resync(self):
+        broker = LocalBroker()
+        subscription = broker.subscribe(['slots:1:a'], maxsize=2)
+        for event_id in range(5):
+            broker.publish('slots:1:a', {'id': event_id})
+        await asyncio.sleep(0)  # deliveries are scheduled on the loop
+        self.assertIs(await subscription.get(1), RESYNC)
+        broker.publish('slots:1:a', {'id': 5})
+        self.assertEqual(await subscription.get(1), {'id': 5})
+
+
+class SlotEventTests(AppointmentsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.broker = use_broker(self, RecordingBroker())
+        self.doctor = make_doctor()
+        self.day = future_day()
+
+    def book(self):
+        return self.client.post('/api/appointments/', {
+            'patient_name': 'Patient 0', 'email': 'patient0@example.com', 'phone': '+1234567890',
+            'doctor_id': self.doctor.id, 'appointment_date': str(self.day),
+            'appointment_time': TIMES[0], 'reason': 'Checkup',
+        }, format='json')
+
+    def test_booking_and_cancelling_publish_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            appointment_id = self.book().json()['id']
+        self.assertEqual(self.broker.published, [])
+        for callback in callbacks:
+            callback()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/appointments/{appointment_id}/cancel/')
+
+        topic = slot_topic(self.doctor.id, self.day)
+        self.assertEqual(
+            [(published_topic, event['type'], event['doctor_id'], event['date'], event['time'])
+             for published_topic, event in self.broker.published],
+            [(topic, SLOT_TAKEN, self.doctor.id, str(self.day), TIMES[0]),
+             (topic, SLOT_FREED, self.doctor.id, str(self.day), TIMES[0])],
+        )
+        first, second = (event['id'] for _, event in self.broker.published)
+        self.assertLess(first, second)
+
+    def test_stream_requires_asgi(self):
+        response = self.client.get(f'/api/async/doctors/{self.doctor.id}/slot_events/?date={self.day}')
+        self.assertEqual(response.status_code, 501)
+
+    @override_settings(EVENTS_HEARTBEAT=1, EVENTS_STREAM_TIMEOUT=5)
+    async def test_stream_sends_snapshot_then_events(self):
+        response = await self.async_client.get(
+            f'/api/async/doctors/{self.doctor.id}/slot_events/', {'date': str(self.day)}
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+
+        async def chunk():
+            return (await anext(stream)).decode()
+        try:
+            self.assertEqual(await chunk(), 'retry: 3000\n\n')
+            snapshot = await chunk()
+            self.assertTrue(snapshot.startswith('event: snapshot\n'))
+            self.assertIn(TIMES[0], snapshot)
+
+            events._publish(SLOT_TAKEN, [(self.doctor.id, self.day, TIMES[0])])
+            lines = (await chunk()).strip().split('\n')
+            self.assertEqual(lines[0], f'event: {SLOT_TAKEN}')
+            payload = json.loads(lines[2].removeprefix('data: '))
+            self.assertEqual(lines[1], f"id: {payload['id']}")
+            self.assertEqual(
+                (payload['doctor_id'], payload['date'], payload['time']),
+                (self.doctor.id, str(self.day), TIMES[0]),
+            )
+        finally:
+            await stream.aclose()
+
+
+# ==================== appointments/tests/test_exports.py ====================
+import csv
+import io
+import json
+from appointments.exports import APPOINTMENT_COLUMNS, PATIENT_COLUMNS
+from .helpers import AppointmentsTestCase, future_day, make_appointments, make_doctor, make_patient
+
+
+class ExportTests(AppointmentsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.doctor = make_doctor()
+        self.patient = make_patient()
+        self.appointments = make_appointments(self.doctor, self.patient, 12)
+
+    def export(self, path, params=''):
+        response = self.client.get(f'/api/{path}/export/{params}')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_appointments_csv(self):
+        response, body = self.export('appointments')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="appointments.csv"')
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual(list(rows[0]), [header for header, _ in APPOINTMENT_COLUMNS])
+        self.assertEqual([int(row['id']) for row in rows], [appointment.id for appointment in self.appointments])
+        self.assertEqual(rows[0]['patient_name'], self.patient.full_name)
+
+    def test_appointments_ndjson_with_filters(self):
+        self.appointments[0].status = 'cancelled'
+        self.appointments[0].save()
+        response, body = self.export('appointments', f'?output=ndjson&status=pending&start={future_day(1)}')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        expected = [appointment.id for appointment in self.appointments[1:]
+                    if appointment.appointment_date >= future_day(1)]
+        self.assertEqual([row['id'] for row in rows], expected)
+        self.assertTrue(expected)
+        self.assertEqual(rows[0]['doctor_name'], self.doctor.name)
+
+    def test_patients_csv(self):
+        make_patient(1)
+        _, body = self.export('patients')
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(rows[0], [header for header, _ in PATIENT_COLUMNS])
+        self.assertEqual([row[2] for row in rows[1:]], ['patient0@example.com', 'patient1@example.com'])
+
+    def test_bad_parameters_are_rejected(self):
+        for params in ('?output=xml', '?start=yesterday', '?end=2025-13-01'):
+            with self.subTest(params=params):
+                response = self.client.get(f'/api/appointments/export/{params}')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+
+# ==================== appointments/tests/test_fieldsets.py ====================
+from django.core.cache import cache
+from django.test import override_settings
+from appointments.fieldsets import row_plan
+from appointments.serializers import AppointmentListSerializer, DoctorListSerializer, PatientListSerializer
+from .helpers import AppointmentsTestCase, make_appointments, make_doctor, make_patient
+
+
+class FastListTests(AppointmentsTestCase):
+    """The values() list path must return exactly what the serializers return."""
+
+    def setUp(self):
+        super().setUp()
+        doctor = make_doctor()
+        make_doctor('Dr. House', 'neurology', 'house@hospital.test')
+        for index in range(3):
+            patient = make_patient(index)
+            appointments = make_appointments(doctor, patient, 4, day_offset=index)
+        appointments[0].notes = 'Seen'
+        appointments[0].status = 'completed'
+        appointments[0].save()
+
+    def get_both(self, url):
+        responses = []
+        for fast in (False, True):
+            cache.clear()
+            with override_settings(FAST_LIST_RESPONSES=fast):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            responses.append(response.json())
+        return responses
+
+    def assert_same(self, url):
+        slow, fast = self.get_both(url)
+        self.assertTrue(slow['results'])
+        self.assertEqual(fast, slow)
+
+    def test_list_serializers_have_a_plan(self):
+        for serializer in (AppointmentListSerializer, DoctorListSerializer, PatientListSerializer):
+            with self.subTest(serializer=serializer.__name__):
+                self.assertIsNotNone(row_plan(serializer()))
+
+    def test_appointments(self):
+        self.assert_same('/api/appointments/')
+        self.assert_same('/api/appointments/?page=2&status=pending')
+
+    def test_appointments_cursor(self):
+        self.assert_same('/api/appointments/?pagination=cursor')
+
+    def test_appointments_fields(self):
+        self.assert_same('/api/appointments/?fields=id,status,appointment_date,doctor_name,notes')
+
+    def test_doctors(self):
+        self.assert_same('/api/doctors/')
+        self.assert_same('/api/doctors/?fields=id,name,consultation_fee,is_available')
+
+    def test_patients(self):
+        self.assert_same('/api/patients/')
+        self.assert_same('/api/patients/?pagination=cursor&fields=id,full_name,created_at')
+
+
+# ==================== appointments/tests/test_importer.py ====================
+from io import StringIO
+from django.core.management import CommandError, call_command
+from django.test import override_settings
+from appointments.importer import HospitalImporter, read_records
+from appointments.models import Appointment, Doctor, Patient, TimeSlot
+from appointments.stats import get_dashboard_stats, rebuild_counters
+from .helpers import TIMES, AppointmentsTestCase, future_day, make_appointments, make_doctor, make_patient
+
+
+def doctor_row(email='house@hospital.test', name='Dr. House', **fields):
+    return {
+        'name': name, 'specialty': 'neurology', 'email': email, 'phone': '+1234567890',
+        'qualification': 'MD', 'experience_years': '12', 'consultation_fee': '150.00',
+        'is_available': 'yes', **fields,
+    }
+
+
+def appointment_row(doctor, time, status='completed', email='patient0@example.com', **fields):
+    return {
+        'patient_name': 'Patient 0', 'patient_email': email, 'patient_phone': '+1234567890',
+        'doctor_email': doctor.email, 'appointment_date': str(future_day()),
+        'appointment_time': time, 'status': status, 'reason': 'Checkup', **fields,
+    }
+
+
+class ImporterTests(AppointmentsTestCase):
+
+    def run_import(self, kind, name, rows, importer=None):
+        importer = importer or HospitalImporter(batch_size=2)
+        report = importer.run(kind, self.write_records(name, rows))
+        importer.finish()
+        return report
+
+    def test_doctors_from_csv(self):
+        rows = [
+            doctor_row(),
+            doctor_row('bad-phone@hospital.test', phone='555'),
+            doctor_row('grey@hospital.test', 'Dr. Grey', specialty='surgery'),
+        ]
+        report = self.run_import('doctors', 'doctors.csv', rows)
+        self.assertEqual((report.rows, report.written, report.rejected), (3, 1, 2))
+        self.assertEqual([row for row, _ in sorted(report.errors)], [2, 3])
+        self.assertIn('phone:', dict(report.errors)[2])
+        self.assertIn("unknown specialty 'surgery'", dict(report.errors)[3])
+        doctor = Doctor.objects.get()
+        self.assertEqual((doctor.name, doctor.experience_years, doctor.is_available), ('Dr. House', 12, True))
+
+    def test_doctors_upsert_on_email(self):
+        doctor = make_doctor()
+        self.assertEqual(self.client.get('/api/doctors/').json()['count'], 1)
+        report = self.run_import('doctors', 'doctors.jsonl', [
+            doctor_row(doctor.email, 'Dr. Meredith Grey', specialty='cardiology'),
+            doctor_row(),
+        ])
+        self.assertEqual(report.written, 2)
+        doctor.refresh_from_db()
+        self.assertEqual(doctor.name, 'Dr. Meredith Grey')
+        # finish() invalidated the cached directory
+        self.assertEqual(self.client.get('/api/doctors/').json()['count'], 2)
+
+    def test_time_slots(self):
+        doctor = make_doctor()
+        report = self.run_import('time_slots', 'slots.jsonl', [
+            {'doctor_email': doctor.email, 'time': TIMES[0], 'is_available': 'false'},
+            {'doctor_id': doctor.id, 'time': '13:30'},
+            {'doctor_email': 'nobody@hospital.test', 'time': TIMES[1]},
+        ])
+        self.assertEqual((report.written, report.rejected), (1, 2))
+        self.assertFalse(TimeSlot.objects.get(doctor=doctor, time=TIMES[0]).is_available)
+        self.assertEqual(TimeSlot.objects.filter(doctor=doctor).count(), len(TIMES))
+
+    def test_appointments_skip_active_clashes(self):
+        doctor = make_doctor()
+        booked, = make_appointments(doctor, make_patient(), 1, status='confirmed')
+        report = self.run_import('appointments', 'appointments.jsonl', [
+            appointment_row(doctor, TIMES[0], status='pending'),
+            appointment_row(doctor, TIMES[0]),
+            appointment_row(doctor, TIMES[1], status='confirmed', email='new@example.com'),
+            appointment_row(doctor, '9am'),
+            appointment_row(doctor, TIMES[2], patient_phone='call me'),
+        ])
+        self.assertEqual((report.rows, report.written, report.rejected), (5, 2, 2))
+        self.assertEqual(
+            set(Appointment.objects.exclude(pk=booked.pk).values_list('appointment_time', 'status')),
+            {(TIMES[0], 'completed'), (TIMES[1], 'confirmed')},
+        )
+        self.assertEqual(Patient.objects.count(), 2)
+
+    @override_settings(DASHBOARD_COUNTER_CACHE=True)
+    def test_finish_rebuilds_counters_after_doctor_import(self):
+        rebuild_counters()
+        self.run_import('doctors', 'doctors.csv', [doctor_row()])
+        self.assertEqual(get_dashboard_stats()['total_doctors'], 1)
+
+    @override_settings(DASHBOARD_COUNTER_CACHE=True)
+    def test_finish_rebuilds_counters_after_appointment_import(self):
+        doctor = make_doctor()
+        rebuild_counters()
+        self.run_import('appointments', 'appointments.csv', [
+            appointment_row(doctor, TIMES[0], status='pending'),
+            appointment_row(doctor, TIMES[1], email='new@example.com'),
+        ])
+        stats = get_dashboard_stats()
+        self.assertEqual((stats['total_appointments'], stats['pending'], stats['total_patients']), (2, 1, 2))
+
+    def test_unknown_file_type(self):
+        with self.assertRaises(ValueError):
+            list(read_records('doctors.xlsx'))
+
+
+class ImportCommandTests(AppointmentsTestCase):
+
+    def test_imports_in_order(self):
+        out, err = StringIO(), StringIO()
+        call_command(
+            'import_hospital_data',
+            doctors=self.write_records('doctors.csv', [doctor_row(), doctor_row(phone='x')]),
+            time_slots=self.write_records('slots.csv', [{'doctor_email': 'house@hospital.test', 'time': TIMES[0]}]),
+            stdout=out, stderr=err,
+        )
+        self.assertIn('doctors: 2 rows', out.getvalue())
+        self.assertIn('1 written, 1 rejected', out.getvalue())
+        self.assertIn('time_slots: 1 rows', out.getvalue())
+        self.assertIn('row 2: phone:', err.getvalue())
+        self.assertTrue(TimeSlot.objects.filter(doctor__email='house@hospital.test').exists())
+
+    def test_requires_a_file(self):
+        with self.assertRaises(CommandError):
+            call_command('import_hospital_data', stdout=StringIO())
+
+    def test_missing_file(self):
+        with self.assertRaises(CommandError):
+            call_command('import_hospital_data', doctors='/nonexistent/doctors.csv', stdout=StringIO())
+
+
+# ==================== appointments/tests/test_jobs.py ====================
+from datetime import timedelta
+from unittest import mock
+from django.test import override_settings
+from django.utils import timezone
+from appointments import notifications
+from appointments.jobs import HANDLERS, backoff, enqueue, enqueue_appointment_event, work
+from appointments.models import Job
+from .helpers import AppointmentsTestCase, make_appointments, make_doctor, make_patient
+
+
+class FlakyTransport(notifications.LocalTransport):
+    """Fails the send calls whose 1-based numbers are in ``fail_calls``."""
+
+    def __init__(self, fail_calls=()):
+        super().__init__()
+        self.fail_calls = set(fail_calls)
+        self.calls = 0
+
+    def send_many(self, messages):
+        self.calls += 1
+        if self.calls in self.fail_calls:
+            raise ConnectionError('provider unavailable')
+        super().send_many(messages)
+
+
+def fail(jobs):
+    raise RuntimeError('boom')
+
+
+@override_settings(JOB_RETRY_BASE_DELAY=10, JOB_RETRY_MAX_DELAY=60, JOB_MAX_ATTEMPTS=2)
+class JobQueueTests(AppointmentsTestCase):
+
+    def test_backoff_doubles_up_to_the_cap(self):
+        self.assertEqual([backoff(attempts) for attempts in range(1, 6)], [10, 20, 40, 60, 60])
+
+    def test_failed_job_is_retried_later_then_marked_failed(self):
+        job = enqueue('test_fail', {})
+        with mock.patch.dict(HANDLERS, {'test_fail': fail}):
+            before = timezone.now()
+            work('test', once=True)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), ('pending', 1))
+            self.assertIn('boom', job.last_error)
+            self.assertGreaterEqual(job.run_after, before + timedelta(seconds=10))
+
+            # Not due yet, so a second pass leaves it alone
+            work('test', once=True)
+            job.refresh_from_db()
+            self.assertEqual(job.attempts, 1)
+
+            Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+            work('test', once=True)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), ('failed', 2))
+
+    def test_unknown_kind_is_retried(self):
+        job = enqueue('nobody_handles_this', {})
+        work('test', once=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'pending')
+        self.assertIn('No handler registered', job.last_error)
+
+
+@override_settings(NOTIFICATION_BATCH_SIZE=2)
+class NotificationRetryTests(AppointmentsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        appointments = make_appointments(make_doctor(), make_patient(), 3)
+        for appointment in appointments:
+            enqueue_appointment_event('booked', [appointment.id])
+        self.jobs = list(Job.objects.order_by('id'))
+
+    def run_workers(self, transport):
+        with mock.patch.object(notifications, '_transport', transport):
+            work('test', once=True)
+
+    def test_only_jobs_in_a_failed_send_are_retried(self):
+        # Two messages (email + SMS) per job and batches of two: one send per job
+        transport = FlakyTransport(fail_calls={2})
+        self.run_workers(transport)
+        statuses = list(Job.objects.order_by('id').values_list('status', flat=True))
+        self.assertEqual(statuses, ['done', 'pending', 'done'])
+        self.assertEqual(len(transport.sent), 4)
+
+        Job.objects.filter(status='pending').update(run_after=timezone.now())
+        self.run_workers(transport)
+        self.assertEqual(Job.objects.filter(status='done').count(), 3)
+        keys = [message['key'] for message in transport.sent]
+        self.assertEqual(len(keys), 6)
+        self.assertEqual(len(set(keys)), 6)
+
+    def test_message_keys_survive_retries(self):
+        transport = FlakyTransport(fail_calls={1})
+        self.run_workers(transport)
+        Job.objects.filter(status='pending').update(run_after=timezone.now())
+        self.run_workers(transport)
+        first = self.jobs[0]
+        self.assertEqual(
+            {message['key'] for message in transport.sent if message['key'].startswith(f'{first.id}:')},
+            {f"{first.id}:{first.payload['appointment_ids'][0]}:email",
+             f"{first.id}:{first.payload['appointment_ids'][0]}:sms"},
+        )
+
+
+# ==================== appointments/tests/test_metrics.py ====================
+import re
+from django.test import override_settings
+from appointments.metrics import PROMETHEUS_CONTENT_TYPE, registry
+from .helpers import AppointmentsTestCase, make_patient
+
+
+def server_timing_queries(response):
+    return int(re.search(r'desc="(\d+) queries"', response['Server-Timing']).group(1))
+
+
+@override_settings(METRICS_SERVER_TIMING=True)
+class RequestMetricsTests(AppointmentsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+        self.patient = make_patient()
+
+    def test_sync_view_queries_are_counted(self):
+        response = self.client.get('/api/patients/by_email/', {'email': self.patient.email})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(server_timing_queries(response), 1)
+
+    async def test_async_view_queries_are_counted(self):
+        # The async ORM runs its queries in a sync_to_async thread, not on the event loop
+        response = await self.async_client.get('/api/async/patients/by_email/', {'email': self.patient.email})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(server_timing_queries(response), 1)
+        self.assertIn('http_request_db_queries_sum{view="async-patient-by-email"} 1', registry.render())
+
+
+class MetricsAccessTests(AppointmentsTestCase):
+
+    def test_loopback_can_scrape(self):
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], PROMETHEUS_CONTENT_TYPE)
+
+    def test_other_addresses_are_forbidden(self):
+        self.assertEqual(self.client.get('/api/metrics/', REMOTE_ADDR='203.0.113.9').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_bearer_token(self):
+        for header, expected in (('Bearer scrape-secret', 200), ('Bearer wrong', 403), ('Token scrape-secret', 403)):
+            with self.subTest(header=header):
+                response = self.client.get('/api/metrics/', REMOTE_ADDR='203.0.113.9', HTTP_AUTHORIZATION=header)
+                self.assertEqual(response.status_code, expected)
+
+    def test_empty_token_never_matches(self):
+        response = self.client.get('/api/metrics/', REMOTE_ADDR='203.0.113.9', HTTP_AUTHORIZATION='Bearer ')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_SERVER_TIMING=False)
+    def test_server_timing_can_be_turned_off(self):
+        response = self.client.get('/api/doctors/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response)
+
+
+# ==================== appointments/tests/test_routing.py ====================
+import asyncio
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITransactionTestCase
+from appointments.models import Appointment
+from appointments.routing import ReplicaRoutingMiddleware, current_read_alias, use_replica
+from .helpers import make_appointments, make_doctor, make_patient
+
+REPLICA = 'replica_test'
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRoutingTests(APITransactionTestCase):
+    """Requests read from a replica alias until they write (routing.py).
+
+    The replica is a second connection to the test database, like the TEST
+    MIRROR aliases settings.py builds from DB_REPLICAS. Rows must be committed
+    for it to see them, hence a transaction test case.
+    """
+
+    def setUp(self):
+        cache.clear()
+        connections.settings[REPLICA] = dict(connections[DEFAULT_DB_ALIAS].settings_dict)
+        self.addCleanup(self.drop_replica)
+        self.appointment, = make_appointments(make_doctor(), make_patient(), 1)
+
+    def drop_replica(self):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+
+    def queries(self, method, url):
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary, \
+                CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = getattr(self.client, method)(url)
+        self.assertEqual(response.status_code, 200)
+        return len(primary), len(replica)
+
+    def test_safe_replica_actions_read_from_the_replica(self):
+        for url in ('/api/appointments/', f'/api/appointments/{self.appointment.id}/', '/api/doctors/'):
+            with self.subTest(url=url):
+                primary, replica = self.queries('get', url)
+                self.assertEqual(primary, 0)
+                self.assertGreater(replica, 0)
+
+    def test_writes_stay_on_the_primary(self):
+        primary, replica = self.queries('post', f'/api/appointments/{self.appointment.id}/confirm/')
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def run_request(self, view):
+        return ReplicaRoutingMiddleware(lambda request: view())(None)
+
+    def test_write_pins_the_rest_of_the_request(self):
+        def view():
+            use_replica()
+            aliases = [router.db_for_read(Appointment)]
+            Appointment.objects.filter(pk=self.appointment.pk).update(notes='Called')
+            aliases.append(router.db_for_read(Appointment))
+            return aliases
+        self.assertEqual(self.run_request(view), [REPLICA, DEFAULT_DB_ALIAS])
+        # The next request starts unpinned
+        self.assertEqual(self.run_request(lambda: use_replica()), REPLICA)
+
+    def test_reads_in_a_transaction_use_the_primary(self):
+        def view():
+            use_replica()
+            with transaction.atomic():
+                return router.db_for_read(Appointment)
+        self.assertEqual(self.run_request(view), DEFAULT_DB_ALIAS)
+
+    def test_outside_a_request_reads_use_the_primary(self):
+        self.assertIsNone(use_replica())
+        self.assertEqual(router.db_for_read(Appointment), DEFAULT_DB_ALIAS)
+
+    def test_async_requests_have_their_own_state(self):
+        written = asyncio.Event()
+
+        async def writer(request):
+            use_replica()
+            router.db_for_write(Appointment)
+            written.set()
+            return current_read_alias()
+
+        async def reader(request):
+            use_replica()
+            await written.wait()
+            return current_read_alias()
+
+        async def both():
+            return await asyncio.gather(
+                ReplicaRoutingMiddleware(reader)(None), ReplicaRoutingMiddleware(writer)(None)
+            )
+        self.assertEqual(asyncio.run(both()), [REPLICA, DEFAULT_DB_ALIAS])
+
+
+# ==================== appointments/tests/test_transitions.py ====================
+from django.test import override_settings
+from appointments.models import Appointment, ScheduledSlot
+from .helpers import AppointmentsTestCase, make_appointments, make_doctor, make_patient
+
+
+class StatusTransitionTests(AppointmentsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.appointment, = make_appointments(make_doctor(), make_patient(), 1)
+
+    def url(self, suffix=''):
+        return f'/api/appointments/{self.appointment.id}/{suffix}'
+
+    def test_patch_cannot_change_status(self):
+        self.client.post(self.url('cancel/'))
+        response = self.client.patch(self.url(), {'status': 'pending', 'notes': 'Called'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'cancelled')
+        self.appointment.refresh_from_db()
+        self.assertEqual((self.appointment.status, self.appointment.notes), ('cancelled', 'Called'))
+
+    def test_put_cannot_change_status(self):
+        data = self.client.get(self.url()).json()
+        data['status'] = 'completed'
+        response = self.client.put(self.url(), data, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Appointment.objects.get(pk=self.appointment.pk).status, 'pending')
+
+    def test_illegal_transition_is_a_conflict(self):
+        self.client.post(self.url('complete/'))
+        response = self.client.post(self.url('confirm/'))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['error'], 'Cannot confirm a completed appointment')
+
+
+@override_settings(SLOT_CALENDAR_ENABLED=True)
+class CalendarReleaseTests(AppointmentsTestCase):
+    """The calendar frees a slot on exactly the moves that publish slot_freed."""
+
+    def setUp(self):
+        super().setUp()
+        self.appointment, = make_appointments(make_doctor(), make_patient(), 1)
+        self.slot = ScheduledSlot.objects.create(
+            doctor_id=self.appointment.doctor_id, date=self.appointment.appointment_date,
+            time=self.appointment.appointment_time, is_booked=True,
+        )
+
+    def assert_released(self, verb, released, bulk=False):
+        if bulk:
+            self.client.post(f'/api/appointments/bulk_{verb}/', {'ids': [self.appointment.id]}, format='json')
+        else:
+            self.client.post(f'/api/appointments/{self.appointment.id}/{verb}/')
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.is_booked, not released)
+
+    def test_confirm_keeps_slot(self):
+        self.assert_released('confirm', False)
+
+    def test_cancel_releases_slot(self):
+        self.assert_released('cancel', True)
+
+    def test_complete_releases_slot(self):
+        self.assert_released('complete', True)
+
+    def test_bulk_complete_releases_slot(self):
+        self.assert_released('complete', True, bulk=True)
+
+
+# ==================== appointments/tests/test_waitlist.py ====================
+from appointments.models import Appointment, WaitlistEntry
+from .helpers import AppointmentsTestCase, make_appointments, make_doctor, make_patient
+
+
+class WaitlistBackfillTests(AppointmentsTestCase):
+    """Cancelling an appointment books the freed slot for the waitlist (waitlist.py)."""
+
+    def setUp(self):
+        super().setUp()
+        self.doctor = make_doctor()
+        self.owner = make_patient(0)
+        self.appointment, = make_appointments(self.doctor, self.owner, 1, status='confirmed')
+        self.day = self.appointment.appointment_date
+        self.time = self.appointment.appointment_time
+
+    def wait(self, index, **fields):
+        return WaitlistEntry.objects.create(
+            patient=make_patient(index), doctor=self.doctor, date=self.day, **fields
+        )
+
+    def cancel(self, appointment, bulk=False):
+        if bulk:
+            response = self.client.post(
+                '/api/appointments/bulk_cancel/', {'ids': [appointment.id]}, format='json'
+            )
+        else:
+            response = self.client.post(f'/api/appointments/{appointment.id}/cancel/')
+        self.assertEqual(response.status_code, 200)
+
+    def offer(self, entry):
+        entry.refresh_from_db()
+        return entry.appointment if entry.status == 'offered' else None
+
+    def test_highest_priority_then_oldest_is_offered(self):
+        first = self.wait(1)
+        urgent = self.wait(2, priority=5)
+        self.cancel(self.appointment)
+        offer = self.offer(urgent)
+        self.assertIsNotNone(offer)
+        self.assertEqual((offer.appointment_date, offer.appointment_time, offer.status),
+                         (self.day, self.time, 'pending'))
+        self.assertIsNone(self.offer(first))
+
+    def test_entry_outside_window_is_skipped(self):
+        late = self.wait(1, window_start='15:00', window_end='16:00')
+        fits = self.wait(2, window_start='08:00', window_end=self.time)
+        self.cancel(self.appointment)
+        self.assertIsNone(self.offer(late))
+        self.assertIsNotNone(self.offer(fits))
+
+    def test_declined_offer_passes_on(self):
+        first = self.wait(1, priority=1)
+        second = self.wait(2)
+        self.cancel(self.appointment)
+        self.cancel(self.offer(first))
+        offer = self.offer(second)
+        self.assertIsNotNone(offer)
+        self.assertEqual(offer.appointment_time, self.time)
+
+    def test_cancelling_patient_is_not_offered_their_own_slot(self):
+        WaitlistEntry.objects.create(patient=self.owner, doctor=self.doctor, date=self.day)
+        self.cancel(self.appointment)
+        self.assertEqual(Appointment.objects.filter(status='pending').count(), 0)
+
+    def test_bulk_cancel_backfills(self):
+        entry = self.wait(1)
+        self.cancel(self.appointment, bulk=True)
+        self.assertIsNotNone(self.offer(entry))
+
+    def test_completion_does_not_backfill(self):
+        entry = self.wait(1)
+        self.client.post(f'/api/appointments/{self.appointment.id}/complete/')
+        self.assertIsNone(self.offer(entry))
+
+
+class WaitlistFilterTests(AppointmentsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        appointment, = make_appointments(make_doctor(), make_patient(0), 1)
+        self.entry = WaitlistEntry.objects.create(
+            patient=make_patient(1), doctor=appointment.doctor, date=appointment.appointment_date
+        )
+
+    def test_filters(self):
+        params = (f'?patient_id={self.entry.patient_id}&doctor_id={self.entry.doctor_id}'
+                  f'&date={self.entry.date}&status=waiting')
+        response = self.client.get(f'/api/waitlist/{params}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.json()['results']], [self.entry.id])
+
+    def test_bad_filters_are_rejected(self):
+        for param, value in (('patient_id', 'abc'), ('doctor_id', '-1'), ('date', 'foo'), ('status', 'gone')):
+            with self.subTest(param=param):
+                response = self.client.get(f'/api/waitlist/?{param}={value}')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(param, response.json())
 
 
 # ==================== SETUP INSTRUCTIONS ====================
@@ -631,21 +7685,46 @@ class TimeSlotAdmin(admin.ModelAdmin):
    - GET  /api/doctors/{id}/ - Get doctor details
    - GET  /api/doctors/available/ - Get available doctors
    - GET  /api/doctors/{id}/available_slots/?date=2025-10-20 - Get available slots
+   - GET  /api/doctors/{id}/available_slots/?start=2025-10-20&end=2025-10-26 - Get available slots per day
+   - GET  /api/doctors/availability/?specialty=cardiology&date=2025-10-20 - Get available slots for many doctors
    
    - GET  /api/patients/ - List all patients
+   - GET  /api/patients/?pagination=cursor - List patients with cursor pagination
    - POST /api/patients/ - Create patient
-   - GET  /api/patients/by_email/?email=john@email.com - Get patient by email
+   - GET  /api/patients/by_email/?email=john@email.com - Get patient by email (case-insensitive)
+   - GET  /api/patients/search/?q=jo&limit=20 - Typeahead search by name, email prefix or phone digits
+   - GET  /api/patients/export/?output=ndjson - Stream all patients as CSV (default) or NDJSON
    
    - GET  /api/appointments/ - List all appointments
+   - GET  /api/appointments/?pagination=cursor - List appointments with cursor pagination
    - POST /api/appointments/ - Book appointment
    - GET  /api/appointments/{id}/ - Get appointment details
    - POST /api/appointments/{id}/confirm/ - Confirm appointment
    - POST /api/appointments/{id}/cancel/ - Cancel appointment
    - POST /api/appointments/{id}/complete/ - Complete appointment
+   - GET  /api/appointments/export/?start=2025-10-01&end=2025-10-31&output=csv - Stream appointments
+   - POST /api/appointments/batch/ - Book a list of appointments
+   - POST /api/appointments/bulk_confirm/ - Confirm appointments by id ({"ids": [1, 2]})
+   - POST /api/appointments/bulk_cancel/ - Cancel appointments by id
+   - POST /api/appointments/bulk_complete/ - Complete appointments by id
+   - GET  /api/appointment-history/ - List archived appointments (same filters plus start/end)
+   - POST /api/waitlist/ - Wait for a slot with a doctor on a day (optional time window)
    
    - POST /api/register/ - Register user
    - POST /api/login/ - Login user
    - GET  /api/dashboard-stats/ - Get dashboard statistics
+   - GET  /api/dashboard-stats/?breakdown=doctor - Add per-doctor status counts
+   - GET  /api/dashboard-stats/?breakdown=day&start=2025-10-01&end=2025-10-31 - Add per-day status counts
+   - GET  /api/cache-stats/ - Doctor directory cache hits and misses
+   - GET  /api/metrics/ - Per-view latency, query and payload histograms (Prometheus format;
+     METRICS_ALLOWED_IPS or a METRICS_TOKEN bearer)
+   
+   Async variants of the read-heavy endpoints (same responses, best served under ASGI):
+   - GET  /api/async/doctors/
+   - GET  /api/async/doctors/{id}/available_slots/?date=2025-10-20
+   - GET  /api/async/patients/by_email/?email=john@email.com
+   - GET  /api/async/dashboard-stats/
+   - GET  /api/async/doctors/{id}/slot_events/?date=2025-10-20 (Server-Sent Events)
 
 9. Example POST request to book appointment:
    {
@@ -657,4 +7736,92 @@ class TimeSlotAdmin(admin.ModelAdmin):
      "appointment_time": "10:00",
      "reason": "Regular checkup"
    }
-"""
\ No newline at end of file
+
+10. Benchmark the hot queries (run before and after migrating to compare):
+   python manage.py benchmark_queries --seed --output before.json
+   python manage.py migrate
+   python manage.py benchmark_queries --compare before.json
+
+11. Optional pre-generated slot calendar (set SLOT_CALENDAR_ENABLED = True first,
+   then schedule the command daily, e.g. from cron):
+   python manage.py generate_slot_calendar --days 60
+
+12. Check that concurrent bookings cannot double-book a slot (server must be running):
+   python manage.py load_test_booking --doctor 1 --date 2025-10-20 --time 10:00 --requests 200
+
+13. Export or bulk-import data (CSV or JSON lines):
+   python manage.py export_data appointments --format ndjson --start 2025-01-01 --output appts.ndjson
+   python manage.py import_hospital_data --doctors doctors.csv --time-slots slots.csv \\
+       --appointments history.ndjson --batch-size 5000
+
+14. Serve over ASGI next to WSGI and compare read throughput and p99 latency:
+   python manage.py runserver 8000
+   uvicorn hospital_appointment.asgi:application --port 8001 --workers 2
+   python manage.py load_test_reads --token <token> --concurrency 100 --requests 2000
+
+15. Database connections are configured from the environment (or a .env file):
+   DB_ENGINE, DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+   DB_CONN_MAX_AGE=60          # seconds to reuse a connection; 0 = per request, none = forever
+   DB_CONN_HEALTH_CHECKS=True  # ping a reused connection before its first query in a request
+   DB_DISABLE_SERVER_SIDE_CURSORS=True  # when behind PgBouncer in transaction mode
+   Compare per-request latency with and without persistent connections:
+   python manage.py benchmark_connections --requests 500
+
+16. After upgrading an existing database, fill the patient search columns
+   (migrate also creates the PostgreSQL trigram indexes for name/phone search):
+   python manage.py migrate
+   python manage.py rebuild_patient_search
+
+17. Benchmark every endpoint against a generated dataset (throughput, p50/p95/p99
+    and queries per request) and flag regressions against a saved baseline:
+   python manage.py run_benchmarks --generate --output baseline.json
+   python manage.py run_benchmarks --compare baseline.json --fail-on-regression
+   python manage.py run_benchmarks --list
+   python manage.py run_benchmarks --scenario appointments_list --rendering 1000
+
+18. List endpoints return compact rows (no reason/notes/prescription or
+    medical_history); any read takes ?fields= to pick exactly the fields it needs:
+   GET /api/appointments/?fields=id,status,doctor_name
+   GET /api/appointments/<id>/?fields=id,reason,notes
+   pip install orjson  (optional, faster JSON rendering)
+
+19. Token lookups are cached per process (AUTH_TOKEN_CACHE_SIZE / _TTL). Revoke or
+    replace a token with:
+   POST /api/logout/        POST /api/token/rotate/
+   For stateless JWT auth with no per-request queries, set JWT_AUTHENTICATION=True,
+   then use POST /api/token/ (or /api/login/) and send "Authorization: Bearer <access>"
+
+20. Booking, confirmation and cancellation queue patient notifications; run the
+    workers next to the web server (messages land in outbox.jsonl by default):
+   python manage.py run_workers --processes 2
+   python manage.py run_workers --stats
+
+21. Move finished appointments out of the hot table (chunked, short transactions;
+    on PostgreSQL the archive is range-partitioned by year on appointment_date):
+   python manage.py archive_appointments --before 2025-01-01 --dry-run
+   python manage.py archive_appointments --before 2025-01-01 --chunk-size 5000 --pause 0.1
+   GET /api/appointment-history/?patient_id=1&start=2023-01-01 - Read archived appointments
+
+22. Serve list/detail reads, dashboard-stats and available doctors from read replicas
+    (writes and read-after-write stay on the primary):
+   DB_REPLICAS=replica1.internal,replica2.internal:6432
+   Try it locally with two SQLite files standing in for primary and replica:
+   export DB_ENGINE=django.db.backends.sqlite3 DB_NAME=primary.sqlite3 DB_REPLICAS=replica.sqlite3
+   python manage.py migrate && cp primary.sqlite3 replica.sqlite3
+
+23. Join the waitlist instead of polling available_slots; a cancelled slot that fits is
+    booked for the highest-priority waiting patient, who gets a notification to confirm it:
+   POST   /api/waitlist/ {"patient": 1, "doctor": 2, "date": "2025-10-20",
+                          "window_start": "09:00", "window_end": "12:00", "priority": 0}
+   GET    /api/waitlist/?patient_id=1
+   DELETE /api/waitlist/{id}/ - Leave the waitlist
+
+24. Booking pages can follow a doctor's slots over one Server-Sent Events connection
+    instead of polling available_slots (ASGI server only, e.g. the uvicorn command above):
+   GET /api/async/doctors/{id}/slot_events/?date=2025-10-20
+   new EventSource('/api/async/doctors/1/slot_events/?date=2025-10-20')
+   Events: snapshot (free slots per day), slot_taken and slot_freed ({"date", "time"})
+
+25. Run the test suite (query-count budgets and behaviour tests) without PostgreSQL:
+   DB_ENGINE=django.db.backends.sqlite3 pytest
+"""